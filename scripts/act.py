@@ -1,45 +1,140 @@
+import base64
+import hashlib
+import sys
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
+import zlib
+from urllib.parse import quote
+from xml.sax.saxutils import escape
 from pathlib import Path
 
-class DrawIOBuilder:
+import instrument
+from styles import STYLES
+
+# Attributs du <mxGraphModel> de chaque page
+PAGE_MODEL_ATTRS = {
+    "dx": "1600", "dy": "900", "grid": "1", "gridSize": "10",
+    "page": "1", "pageWidth": "1600", "pageHeight": "900", "math": "0", "background": "#ffffff"
+}
+
+# Mêmes échappements que ElementTree pour les valeurs d'attributs
+_ATTR_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"}
+
+def _attrs_xml(attrib: dict) -> str:
+    return "".join(f' {k}="{escape(str(v), _ATTR_ENTITIES)}"' for k, v in attrib.items())
+
+# Caractères laissés tels quels par encodeURIComponent (en plus des alphanumériques et de _.-~)
+_URI_SAFE = "!*'()"
+
+class DeflateSink:
+    """
+    File-like object compressing a <diagram> payload the way draw.io does
+    (encodeURIComponent, raw deflate, base64) as text is written to it: only the
+    compressor state and a 0-2 byte base64 remainder are kept, never the page XML.
+    """
+    def __init__(self, out):
+        self._out = out
+        self._z = zlib.compressobj(9, zlib.DEFLATED, -15)
+        self._rest = b""
+
+    def write(self, text: str):
+        self._emit(self._z.compress(quote(text, safe=_URI_SAFE).encode("ascii")))
+        return len(text)
+
+    def _emit(self, data: bytes):
+        data = self._rest + data
+        cut = len(data) - len(data) % 3  # base64 par blocs de 3 octets: pas de padding intermédiaire
+        if cut:
+            self._out.write(base64.b64encode(data[:cut]).decode("ascii"))
+        self._rest = data[cut:]
+
+    def close(self):
+        self._emit(self._z.flush())
+        if self._rest:
+            self._out.write(base64.b64encode(self._rest).decode("ascii"))
+            self._rest = b""
+
+def write_mxfile(mxfile: ET.Element, path, compressed=False):
+    """
+    Write an ElementTree <mxfile>; `compressed` is a bool for all pages or a
+    collection of page indexes (0-based) to compress. Uncompressed pages are indented.
+    """
+    with instrument.span("write", path=str(path), compressed=compressed if isinstance(compressed, bool) else sorted(compressed)):
+        with DrawIOStreamWriter(path, mxfile_attrs=mxfile.attrib) as writer:
+            for i, diagram in enumerate(mxfile.findall("diagram")):
+                writer.write_diagram(diagram, compressed if isinstance(compressed, bool) else i in compressed)
+    instrument.count_file("bytes_written", path)
+    return path
+
+class StableIds:
+    """
+    Content-derived cell ids: a hash of the page name (without its "NN - " rank),
+    the cell kind, its key (label, or style when unlabelled, for vertices; source,
+    target and label for edges) and its rank among the cells sharing that key.
+    Regenerating a slightly different model keeps the ids of unchanged cells.
+    """
     def __init__(self):
+        self._seen: dict[tuple[str, str, str], int] = {}
+
+    def _make(self, page: str, kind: str, key: str) -> str:
+        k = (page, kind, key)
+        rank = self._seen.get(k, 0)
+        self._seen[k] = rank + 1
+        data = "\x1f".join((page, kind, key, str(rank))).encode("utf-8")
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+    def vertex(self, page: str, label: str, style: str) -> str:
+        return self._make(page, "vertex", label or style)
+
+    def edge(self, page: str, source_id: str, target_id: str, label: str) -> str:
+        return self._make(page, "edge", f"{source_id}>{target_id}:{label}")
+
+class DrawIOBuilder:
+    def __init__(self, compressed: bool = False, stable_ids: bool = False, route: bool = False):
+        self.compressed = compressed  # défaut des pages pour save()
+        self.route = route  # router les arêtes (router.py) avant d'écrire
         self.mxfile = ET.Element("mxfile", attrib={"host": "app.diagrams.net"})
         self.id_counter = 2  # 0=root, 1=layer reserved
         self.page_index = 0
+        self.page_compression: list[bool | None] = []  # par page; None = défaut de save()
+        self.stable_ids = StableIds() if stable_ids else None
+        self._page_names: dict[ET.Element, str] = {}
 
     def _next_id(self) -> str:
         self.id_counter += 1
         return str(self.id_counter)
 
-    def _pretty_xml(self, elem: ET.Element) -> str:
-        rough = ET.tostring(elem, encoding="utf-8")
-        return minidom.parseString(rough).toprettyxml(indent="  ", encoding="utf-8").decode("utf-8")
-
-    def add_page(self, name: str):
+    def add_page(self, name: str, compressed: bool | None = None):
         self.page_index += 1
+        self.page_compression.append(compressed)
         diagram = ET.SubElement(self.mxfile, "diagram", attrib={"name": f"{self.page_index:02d} - {name}"})
-        model = ET.SubElement(diagram, "mxGraphModel", attrib={
-            "dx": "1600", "dy": "900", "grid": "1", "gridSize": "10",
-            "page": "1", "pageWidth": "1600", "pageHeight": "900", "math": "0", "background": "#ffffff"
-        })
+        model = ET.SubElement(diagram, "mxGraphModel", attrib=PAGE_MODEL_ATTRS)
         root = ET.SubElement(model, "root")
+        self._page_names[root] = name
         # Root + Layer
         ET.SubElement(root, "mxCell", attrib={"id": "0"})
         ET.SubElement(root, "mxCell", attrib={"id": "1", "parent": "0"})
         return root
 
-    def add_vertex(self, root, x, y, w, h, label, style):
-        vid = self._next_id()
+    def append_page(self, diagram: ET.Element, name: str, compressed: bool | None = None) -> ET.Element:
+        """Append an already built <diagram> (e.g. a cached page), numbered like add_page()."""
+        self.page_index += 1
+        self.page_compression.append(compressed)
+        diagram.set("name", f"{self.page_index:02d} - {name}")
+        self.mxfile.append(diagram)
+        return diagram
+
+    def add_vertex(self, root, x, y, w, h, label, style, parent="1"):
+        # parent: id d'un conteneur (composite...), x/y étant alors relatifs à lui
+        vid = self._next_id() if self.stable_ids is None else self.stable_ids.vertex(self._page_names[root], label, style)
         cell = ET.SubElement(root, "mxCell", attrib={
-            "id": vid, "value": label, "style": style, "vertex": "1", "parent": "1"
+            "id": vid, "value": label, "style": style, "vertex": "1", "parent": parent
         })
         geo = ET.SubElement(cell, "mxGeometry", attrib={"x": str(x), "y": str(y), "width": str(w), "height": str(h)})
         geo.set("as", "geometry")
         return vid
 
-    def add_edge(self, root, source_id, target_id, label="", style="edgeStyle=orthogonalEdgeStyle;rounded=0;endArrow=block;endFill=1;"):
-        eid = self._next_id()
+    def add_edge(self, root, source_id, target_id, label="", style=STYLES["flow"]):
+        eid = self._next_id() if self.stable_ids is None else self.stable_ids.edge(self._page_names[root], source_id, target_id, label)
         cell = ET.SubElement(root, "mxCell", attrib={
             "id": eid, "value": label, "style": style, "edge": "1", "parent": "1", "source": source_id, "target": target_id
         })
@@ -47,27 +142,228 @@ class DrawIOBuilder:
         geo.set("as", "geometry")
         return eid
 
-    def save(self, path: str):
-        xml = self._pretty_xml(self.mxfile)
-        Path(path).write_text(xml, encoding="utf-8")
+    def save(self, path: str, compressed: bool | None = None):
+        """
+        compressed=True deflates every page whose add_page() did not choose
+        otherwise (None: the builder's default).
+        """
+        if compressed is None:
+            compressed = self.compressed
+        if self.route:
+            import router
+            router.route(self)
+        if instrument.enabled():
+            for diagram in self.mxfile.iter("diagram"):
+                instrument.count("cells", len(diagram.find("mxGraphModel/root")), page=diagram.get("name"))
+        pages = {i for i, c in enumerate(self.page_compression) if (compressed if c is None else c)}
+        if pages:
+            return write_mxfile(self.mxfile, path, pages)
+        # Indentation en place puis écriture directe: pas de copie sérialisée ni de re-parsing
+        with instrument.span("serialize"):
+            ET.indent(self.mxfile, space="  ", level=0)
+        with instrument.span("write", path=str(path)), open(path, "wb") as f:
+            ET.ElementTree(self.mxfile).write(f, encoding="utf-8", xml_declaration=True)
+            f.write(b"\n")   # fin de ligne finale, comme DrawIOStreamWriter
+        instrument.count_file("bytes_written", path)
         return path
 
-def build_pages():
-    d = DrawIOBuilder()
-
-    # Common styles
-    style_action = "shape=rect;rounded=1;whiteSpace=wrap;html=1;fillColor=#e3f2fd;strokeColor=#1565c0;"
-    style_object = "shape=rect;rounded=1;whiteSpace=wrap;html=1;fillColor=#fffde7;strokeColor=#f9a825;"
-    style_start = "shape=ellipse;whiteSpace=wrap;html=1;fillColor=#111111;strokeColor=#111111;"
-    style_flow_final = "shape=ellipse;whiteSpace=wrap;html=1;fillColor=#ffffff;strokeColor=#c62828;strokeWidth=2;"
-    style_final_inner = "shape=ellipse;whiteSpace=wrap;html=1;fillColor=#c62828;strokeColor=#c62828;"
-    style_decision = "shape=rhombus;whiteSpace=wrap;html=1;fillColor=#f3e5f5;strokeColor=#6a1b9a;"
-    style_merge = "shape=rhombus;whiteSpace=wrap;html=1;fillColor=#ede7f6;strokeColor=#4527a0;dashed=1;"
-    style_bar = "shape=rect;rounded=0;whiteSpace=wrap;html=1;fillColor=#212121;strokeColor=#212121;"
-    style_swimlane = "swimlane;strokeColor=#616161;fontStyle=1;align=center;horizontal=1;startSize=26;"
-    style_interruptible = "shape=rect;rounded=1;dashed=1;dashPattern=8 4;strokeColor=#ef6c00;fillColor=#fff3e0;"
-    style_signal = "shape=hexagon;perimeter=hexagonPerimeter2;whiteSpace=wrap;html=1;fillColor=#e8f5e9;strokeColor=#2e7d32;"
-    style_note = "shape=note;whiteSpace=wrap;html=1;fillColor=#fffde7;strokeColor=#f9a825;"
+class DrawIOStreamWriter:
+    """
+    Streaming counterpart of DrawIOBuilder: pages and mxCells are written to `out`
+    as soon as they are added, so memory stays flat whatever the diagram size.
+    `out` is a path or a text file handle; `indent=None` writes compact XML.
+    Pages are written in order: cells can only be added to the latest page.
+    With `compressed`, pages are deflated on the fly (see DeflateSink).
+    """
+    def __init__(self, out, indent: str | None = "  ", compressed: bool = False, mxfile_attrs: dict | None = None,
+                 stable_ids: bool = False):
+        if isinstance(out, (str, Path)):
+            self.path = str(out)
+            self._fh = open(out, "w", encoding="utf-8")
+            self._owns_fh = True
+        else:
+            self.path = getattr(out, "name", None)
+            self._fh = out
+            self._owns_fh = False
+        self.indent = indent
+        self.compressed = compressed
+        self.id_counter = 2  # 0=root, 1=layer reserved
+        self.page_index = 0
+        self._page_open = False
+        self._sink: DeflateSink | None = None
+        self.stable_ids = StableIds() if stable_ids else None
+        self._page_names: dict[int, str] = {}
+        self._closed = False
+        self._line(0, "<?xml version='1.0' encoding='utf-8'?>")
+        self._line(0, f"<mxfile{_attrs_xml(mxfile_attrs or {'host': 'app.diagrams.net'})}>")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _next_id(self) -> str:
+        self.id_counter += 1
+        return str(self.id_counter)
+
+    def _line(self, level: int, text: str):
+        if self._sink is not None:
+            self._sink.write(text)  # page compressée: XML compact
+        elif self.indent is None:
+            self._fh.write(text)
+        else:
+            self._fh.write(f"{self.indent * level}{text}\n")
+
+    def _open_diagram(self, attrib: dict, compressed: bool):
+        if compressed:
+            self._fh.write(f"{self.indent or ''}<diagram{_attrs_xml(attrib)}>")
+            self._sink = DeflateSink(self._fh)
+        else:
+            self._line(1, f"<diagram{_attrs_xml(attrib)}>")
+
+    def _close_diagram(self):
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+            self._fh.write("</diagram>\n" if self.indent is not None else "</diagram>")
+        else:
+            self._line(1, "</diagram>")
+
+    def _end_page(self):
+        if self._page_open:
+            self._line(3, "</root>")
+            self._line(2, "</mxGraphModel>")
+            self._close_diagram()
+            self._page_open = False
+
+    def begin_page(self, full_name: str, compressed: bool | None = None):
+        """
+        Open a <diagram> named `full_name` as is; its cells (0 and 1 included) are up
+        to the caller. `compressed` overrides the writer's default for this page.
+        """
+        self._end_page()
+        self._open_diagram({"name": full_name}, self.compressed if compressed is None else compressed)
+        self._line(2, f"<mxGraphModel{_attrs_xml(PAGE_MODEL_ATTRS)}>")
+        self._line(3, "<root>")
+        self._page_open = True
+
+    def write_diagram(self, diagram: ET.Element, compressed: bool | None = None):
+        """Write a complete ElementTree <diagram> (e.g. from DrawIOBuilder or state.build_drawio)."""
+        self._end_page()
+        compressed = self.compressed if compressed is None else compressed
+        self._open_diagram(diagram.attrib, compressed)
+        model = diagram.find("mxGraphModel")
+        if model is not None:
+            if compressed:
+                ET.ElementTree(model).write(self._sink, encoding="unicode")
+            elif self.indent is None:
+                ET.ElementTree(model).write(self._fh, encoding="unicode")
+            else:
+                ET.indent(model, space=self.indent, level=2)
+                self._fh.write(self.indent * 2)
+                ET.ElementTree(model).write(self._fh, encoding="unicode")
+                self._fh.write("\n")
+        self._close_diagram()
+
+    def add_page(self, name: str, compressed: bool | None = None):
+        self.page_index += 1
+        self._page_names[self.page_index] = name
+        self.begin_page(f"{self.page_index:02d} - {name}", compressed)
+        # Root + Layer
+        self.write_cell({"id": "0"})
+        self.write_cell({"id": "1", "parent": "0"})
+        return self.page_index
+
+    def write_cell(self, attrib: dict, geometry: dict | None = None, points=None, wrapper=None):
+        """
+        Write one mxCell (and its mxGeometry, with the edge waypoints `points`) of the current page.
+        `wrapper` is an optional (tag, attributes) pair: the cell is then written inside a
+        <UserObject>/<object> carrying its id, its value as `label` and the custom attributes.
+        """
+        if not self._page_open:
+            raise ValueError("Aucune page ouverte: appeler add_page() avant d'ajouter des cellules")
+        level = 4
+        if wrapper is not None:
+            tag, attrs = wrapper
+            self._line(4, f"<{tag}{_attrs_xml({'label': attrib.get('value', ''), **attrs, 'id': attrib['id']})}>")
+            attrib = {k: v for k, v in attrib.items() if k not in ("id", "value")}
+            level = 5
+        if geometry is None:
+            self._line(level, f"<mxCell{_attrs_xml(attrib)} />")
+        else:
+            self._line(level, f"<mxCell{_attrs_xml(attrib)}>")
+            if points:
+                self._line(level + 1, f"<mxGeometry{_attrs_xml(geometry)}>")
+                self._line(level + 2, '<Array as="points">')
+                for x, y in points:
+                    self._line(level + 3, f'<mxPoint x="{x:g}" y="{y:g}" />')
+                self._line(level + 2, "</Array>")
+                self._line(level + 1, "</mxGeometry>")
+            else:
+                self._line(level + 1, f"<mxGeometry{_attrs_xml(geometry)} />")
+            self._line(level, "</mxCell>")
+        if wrapper is not None:
+            self._line(4, f"</{wrapper[0]}>")
+
+    def _check_page(self, root):
+        if root != self.page_index:
+            raise ValueError(f"La page {root} est déjà écrite: seule la page {self.page_index} accepte des cellules")
+
+    def add_vertex(self, root, x, y, w, h, label, style, parent="1"):
+        self._check_page(root)
+        vid = self._next_id() if self.stable_ids is None else self.stable_ids.vertex(self._page_names[root], label, style)
+        self.write_cell(
+            {"id": vid, "value": label, "style": style, "vertex": "1", "parent": parent},
+            {"x": str(x), "y": str(y), "width": str(w), "height": str(h), "as": "geometry"},
+        )
+        return vid
+
+    def add_edge(self, root, source_id, target_id, label="", style=STYLES["flow"]):
+        self._check_page(root)
+        eid = self._next_id() if self.stable_ids is None else self.stable_ids.edge(self._page_names[root], source_id, target_id, label)
+        self.write_cell(
+            {"id": eid, "value": label, "style": style, "edge": "1", "parent": "1", "source": source_id, "target": target_id},
+            {"relative": "1", "as": "geometry"},
+        )
+        return eid
+
+    def close(self):
+        if self._closed:
+            return
+        self._end_page()
+        self._line(0, "</mxfile>")
+        self._closed = True
+        if self._owns_fh:
+            self._fh.close()
+        else:
+            self._fh.flush()
+
+    def save(self, path: str | None = None):
+        # Le flux a déjà sa destination: save() ne fait que terminer le document, écrit dans self.path
+        self.close()
+        return self.path
+
+def build_pages(d=None, out_path="atm_activity_examples.drawio"):
+    # d: DrawIOBuilder (par défaut) ou DrawIOStreamWriter déjà ouvert sur out_path
+    if d is None:
+        d = DrawIOBuilder()
+
+    # Common styles (registre partagé, voir styles.py)
+    style_action = STYLES["action"]
+    style_object = STYLES["object"]
+    style_start = STYLES["start"]
+    style_flow_final = STYLES["flow_final"]
+    style_final_inner = STYLES["final_inner"]
+    style_decision = STYLES["decision"]
+    style_merge = STYLES["merge"]
+    style_bar = STYLES["bar"]
+    style_swimlane = STYLES["swimlane"]
+    style_interruptible = STYLES["interruptible"]
+    style_signal = STYLES["signal"]
+    style_note = STYLES["note"]
+    style_object_flow = STYLES["object_flow"]
+    style_signal_flow = STYLES["signal_flow"]
 
     # 01 - Éléments de base (Start, Action, Activity Final, Flow Final, Control Flow, Decision, Merge, Garde)
     root = d.add_page("Éléments de base — DAB Retrait")
@@ -82,10 +378,10 @@ def build_pages():
     act_final_inner = d.add_vertex(root, 1088, 118, 20, 20, "", style_final_inner)
 
     # Flow Final (cercle avec croix)
-    flow_final = d.add_vertex(root, 680, 260, 36, 36, "", "shape=ellipse;whiteSpace=wrap;html=1;fillColor=#ffffff;strokeColor=#1565c0;strokeWidth=2;")
+    flow_final = d.add_vertex(root, 680, 260, 36, 36, "", STYLES["flow_final_cross"])
     # Add cross for Flow Final via two thin rectangles
-    ff_bar1 = d.add_vertex(root, 696, 260+18-2, 24, 4, "", "shape=line;strokeWidth=3;strokeColor=#1565c0;")
-    ff_bar2 = d.add_vertex(root, 696, 260+18-2, 24, 4, "", "shape=line;strokeWidth=3;strokeColor=#1565c0;rotation=90;")
+    ff_bar1 = d.add_vertex(root, 696, 260+18-2, 24, 4, "", STYLES["cross_bar"])
+    ff_bar2 = d.add_vertex(root, 696, 260+18-2, 24, 4, "", STYLES.get("cross_bar", rotation=90))
 
     # Decision alternate path and Merge
     a_retry = d.add_vertex(root, 500, 260, 200, 50, "Afficher erreur PIN", style_action)
@@ -98,7 +394,7 @@ def build_pages():
     e_ok = d.add_edge(root, dec_pin, a_menu, "[valide]")
     e_bad = d.add_edge(root, dec_pin, a_retry, "[invalide]")
     # from retry to Flow Final (ends only that flow)
-    d.add_edge(root, a_retry, flow_final, "", "endArrow=oval;endFill=0;strokeColor=#1565c0;")
+    d.add_edge(root, a_retry, flow_final, "", STYLES["flow_end"])
     # Merge: menu -> merge -> Activity Final
     d.add_edge(root, a_menu, merge, "")
     d.add_edge(root, merge, act_final, "")
@@ -140,11 +436,11 @@ def build_pages():
 
     d.add_edge(root, start3, a_calc)
     # Object Flow (blue dashed with stereotype label)
-    d.add_edge(root, a_calc, obj_billets, "«objectFlow»", "dashed=1;strokeColor=#1e88e5;endArrow=block;endFill=1;")
-    d.add_edge(root, obj_billets, a_dispense, "«objectFlow»", "dashed=1;strokeColor=#1e88e5;endArrow=block;endFill=1;")
+    d.add_edge(root, a_calc, obj_billets, "«objectFlow»", style_object_flow)
+    d.add_edge(root, obj_billets, a_dispense, "«objectFlow»", style_object_flow)
     d.add_edge(root, a_dispense, final3)
-    d.add_edge(root, a_dispense, obj_recu, "«objectFlow»", "dashed=1;strokeColor=#1e88e5;endArrow=block;endFill=1;")
-    d.add_edge(root, obj_recu, a_impr, "«objectFlow»", "dashed=1;strokeColor=#1e88e5;endArrow=block;endFill=1;")
+    d.add_edge(root, a_dispense, obj_recu, "«objectFlow»", style_object_flow)
+    d.add_edge(root, obj_recu, a_impr, "«objectFlow»", style_object_flow)
 
     # 04 - Partitions (Swimlanes) — Client / DAB / Banque
     root = d.add_page("Partitions — Client / DAB / Banque")
@@ -180,8 +476,8 @@ def build_pages():
     d.add_edge(root, a_lire, a_sess)
     d.add_edge(root, a_sess, a_attente)
     # Exception flow (red with open arrow)
-    d.add_edge(root, a_attente, exc, "", "strokeColor=#d32f2f;endArrow=block;endFill=0;dashed=1;")
-    d.add_edge(root, exc, final5, "", "strokeColor=#d32f2f;endArrow=block;endFill=1;")
+    d.add_edge(root, a_attente, exc, "", STYLES["exception_flow"])
+    d.add_edge(root, exc, final5, "", STYLES["exception_end"])
 
     # 06 - Signal/Événement — Maintenance à distance
     root = d.add_page("Signal/Événement — Maintenance")
@@ -194,18 +490,18 @@ def build_pages():
     fin6i = d.add_vertex(root, 1068, 138, 20, 20, "", style_final_inner)
 
     d.add_edge(root, s6, a_idle)
-    d.add_edge(root, a_idle, sig_recv, "", "strokeColor=#2e7d32;endArrow=block;endFill=1;dashed=1;")
-    d.add_edge(root, sig_recv, a_switch, "", "strokeColor=#2e7d32;endArrow=block;endFill=1;")
+    d.add_edge(root, a_idle, sig_recv, "", style_signal_flow)
+    d.add_edge(root, sig_recv, a_switch, "", STYLES["signal_accept"])
     d.add_edge(root, a_switch, fin6, "")
     # optional outgoing signal
-    d.add_edge(root, a_idle, sig_send, "", "strokeColor=#2e7d32;endArrow=block;endFill=1;dashed=1;")
+    d.add_edge(root, a_idle, sig_send, "", style_signal_flow)
 
     # 07 - Sous-activité (Call Behavior Action) — Vérifier identité
     root = d.add_page("Sous-activité — Appel d’activité")
     s7 = d.add_vertex(root, 80, 140, 30, 30, "", style_start)
-    a_main = d.add_vertex(root, 140, 125, 300, 60, "Vérifier identité\n«callBehavior»", style_action + "strokeWidth=2;")
+    a_main = d.add_vertex(root, 140, 125, 300, 60, "Vérifier identité\n«callBehavior»", STYLES.get("action", strokeWidth=2))
     # Visual cue: small triangle marker (simulate with tiny rotated rectangle)
-    marker = d.add_vertex(root, 410, 150, 14, 14, "", "shape=triangle;direction=east;fillColor=#1565c0;strokeColor=#1565c0;")
+    marker = d.add_vertex(root, 410, 150, 14, 14, "", STYLES["call_marker"])
     a_sub = d.add_vertex(root, 500, 120, 320, 60, "Activité appelée: Vérification KYC", style_action)
     fin7 = d.add_vertex(root, 860, 130, 36, 36, "", style_flow_final)
     fin7i = d.add_vertex(root, 868, 138, 20, 20, "", style_final_inner)
@@ -214,11 +510,47 @@ def build_pages():
     d.add_edge(root, a_main, a_sub)
     d.add_edge(root, a_sub, fin7)
 
-    out_path = "atm_activity_examples.drawio"
     d.save(out_path)
     return out_path
 
-if __name__ == "__main__":
-    path = build_pages()
-    print(f"Fichier .drawio généré: {path}")
+def main(argv: list[str]) -> str:
+    # Reconstruction incrémentale: rien n'est régénéré si act.py/styles.py n'ont pas changé
+    import styles
+    import validate
+    from build_cache import BuildCache
+
+    out = "atm_activity_examples.drawio"
+    stream = "--stream" in argv
+    compressed = "--compressed" in argv
+    stable = "--stable-ids" in argv
+    route = "--route" in argv
+    if stream and route:
+        raise SystemExit("--route n'est pas compatible avec --stream (les arêtes sont déjà écrites)")
+    instrument.from_argv(argv)
+    cache = BuildCache()
+    options = {"stream": stream, "compressed": compressed, "stable_ids": stable, "route": route}
+    # Avec --route, le routeur et les modules qu'il importe font partie des entrées
+    extra = [Path(__file__).with_name(n) for n in ("router.py", "drawio_model.py", "drawio_reader.py")] if route else []
+    key = cache.fingerprint(Path(__file__), Path(styles.__file__), *extra, options)
+    if "--force" not in argv and cache.is_fresh("act", key):
+        print(f"Fichier .drawio à jour: {out}")
+        return out
+    with cache.output(out) as tmp:
+        if stream:
+            d = DrawIOStreamWriter(tmp, compressed=compressed, stable_ids=stable)
+        else:
+            d = DrawIOBuilder(compressed, stable_ids=stable, route=route)
+        with instrument.span("act.build_pages", stream=stream, compressed=compressed):
+            build_pages(d, tmp)
+        # Contrôles UML (références, initiaux, fork/join, gardes...) avant publication
+        if "--no-validate" not in argv:
+            with instrument.span("validate"):
+                invalid = validate.report(validate.validate(tmp))
+            if invalid:
+                raise SystemExit(f"Diagramme invalide: {out} n'est pas mis à jour")
+    cache.record("act", key, [out])
+    print(f"Fichier .drawio généré: {out}")
+    return out
 
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,103 @@
+"""
+Build many diagrams at once from model files (see model_loader.py).
+
+    python batch.py "models/*.yaml" models/extra.jsonl -o build/diagrams -j 8
+
+Inputs are paths, directories (every model file inside) or glob patterns. Each
+model is built in a process pool into <out_dir>/<name>.drawio; the timing or the
+error of every diagram is reported, and the exit status is 1 if any build failed.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+MODEL_SUFFIXES = (".json", ".jsonl", ".yaml", ".yml")
+
+def expand_inputs(items: list[str]) -> list[Path]:
+    """Paths, directories and glob patterns -> sorted, de-duplicated model files."""
+    found: dict[str, Path] = {}
+    for item in items:
+        if glob.has_magic(item):
+            matches = [Path(p) for p in glob.glob(item, recursive=True)]
+        elif Path(item).is_dir():
+            matches = [p for p in Path(item).rglob("*") if p.suffix.lower() in MODEL_SUFFIXES]
+        else:
+            matches = [Path(item)]
+        for p in matches:
+            if p.is_dir() or p.suffix.lower() not in MODEL_SUFFIXES:
+                continue
+            found.setdefault(str(p.resolve()), p)
+    return sorted(found.values())
+
+def _build_one(model_path: str, out_path: str) -> tuple[str, str, float, str | None]:
+    """Worker: build one diagram. Errors are returned, not raised, so one failure never stops the batch."""
+    # Import ici: le travail lourd (modules, styles) se fait une fois par worker
+    from model_loader import ModelError, build_file
+
+    start = time.perf_counter()
+    try:
+        build_file(model_path, out_path)
+        error = None
+    except ModelError as e:
+        error = str(e)
+    except Exception:
+        error = traceback.format_exc(limit=-3).strip()
+    return model_path, out_path, time.perf_counter() - start, error
+
+def run(inputs: list[Path], out_dir: Path, workers: int) -> int:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Deux modèles de même nom écriraient le même fichier
+    by_name: dict[str, Path] = {}
+    for p in inputs:
+        other = by_name.setdefault(p.stem, p)
+        if other is not p:
+            print(f"Conflit de noms de sortie: {other} et {p} -> {p.stem}.drawio", file=sys.stderr)
+            return 2
+
+    failures = 0
+    total = time.perf_counter()
+    jobs = [(str(p), str(out_dir / f"{p.stem}.drawio")) for p in inputs]
+    if workers <= 1:
+        results = (_build_one(*job) for job in jobs)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = (f.result() for f in as_completed([pool.submit(_build_one, *job) for job in jobs]))
+    try:
+        for model_path, out_path, seconds, error in results:
+            if error is None:
+                print(f"ok     {seconds * 1000:8.1f} ms  {model_path} -> {out_path}")
+            else:
+                failures += 1
+                print(f"ÉCHEC  {seconds * 1000:8.1f} ms  {model_path}")
+                for line in error.splitlines():
+                    print(f"       {line}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    elapsed = time.perf_counter() - total
+    print(f"{len(jobs) - failures}/{len(jobs)} diagramme(s) générés en {elapsed:.2f} s ({failures} échec(s))")
+    return 1 if failures else 0
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Génère des fichiers .drawio à partir de modèles JSON/JSONL/YAML.")
+    parser.add_argument("inputs", nargs="+", help="fichiers modèles, dossiers ou motifs glob")
+    parser.add_argument("-o", "--out-dir", default="diagrams", help="dossier de sortie (défaut: diagrams)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="nombre de processus")
+    args = parser.parse_args(argv)
+
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        print("Aucun modèle trouvé.", file=sys.stderr)
+        return 2
+    return run(inputs, Path(args.out_dir), max(1, min(args.jobs, len(inputs))))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+Benchmarks of the diagram generation pipeline.
+
+Synthetic models of 1k to 1M cells are built with each builder and every phase
+is timed on its own: add_vertex / add_edge, ET.indent, tree.write and save()
+(DrawIOBuilder, plain and compressed), the same calls for CompactDrawIOBuilder
+and state.mxcell. A synthetic PDF of several hundred pages (figure captions and
+drawings) times extract_figure_pages (cold and with its cached index) and
+render_pages_as_images; it needs PyMuPDF (fitz) and is skipped without it.
+
+Each case runs in its own process, so the peak memory recorded (max RSS) is the
+case's. Results are written as JSON in benchmarks/ and compared with the previous
+run: phases slower by more than the threshold are reported as regressions.
+
+    python bench.py                                # 1k, 10k, 100k et 1M cellules + PDF
+    python bench.py --sizes 1k,10k --cases builder,compact
+    python bench.py --baseline benchmarks/bench-20261001-120000.json --fail-on-regression
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+RESULTS_DIR = "benchmarks"
+CELLS_PER_PAGE = 10000
+PDF_PAGES = 300
+SIZES = {"1k": 1000, "10k": 10000, "100k": 100000, "1M": 1000000}
+MODEL_CASES = ("builder", "compressed", "compact", "mxcell")
+CASES = MODEL_CASES + ("pdf",)
+
+class _Timer:
+    """Phase name -> elapsed seconds, accumulated over the `with timer(name)` blocks."""
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def __call__(self, name: str):
+        gc.collect()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+def _peak_memory_mb() -> float | None:
+    """Peak resident memory of this process (None where the resource module is missing)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024  # octets sur macOS, Ko ailleurs
+
+def _synthetic_model(builder, cells: int, timer: _Timer):
+    """Pages of CELLS_PER_PAGE cells, half vertices (a grid of actions), half edges between them."""
+    from styles import STYLES
+    action, flow = STYLES["action"], STYLES["flow"]
+    remaining = cells
+    page = 0
+    while remaining > 0:
+        n = min(CELLS_PER_PAGE, remaining)
+        remaining -= n
+        page += 1
+        root = builder.add_page(f"Synthétique {page}")
+        vertices = []
+        with timer("add_vertex"):
+            for i in range((n + 1) // 2):
+                vertices.append(builder.add_vertex(root, 40 + (i % 50) * 160, 40 + (i // 50) * 100, 120, 60,
+                                                   f"Action {page}.{i}", action))
+        with timer("add_edge"):
+            m = len(vertices)
+            for i in range(n // 2):
+                # Chaîne plus quelques arêtes longues, comme un flot avec retours
+                j = i + 1 if i % 7 else i * 31 + 3
+                builder.add_edge(root, vertices[i % m], vertices[j % m], "" if i % 3 else "[garde]", flow)
+
+def _bench_builder(cells: int, workdir: str, compressed: bool) -> dict[str, float]:
+    from act import DrawIOBuilder
+    timer = _Timer()
+    d = DrawIOBuilder()
+    _synthetic_model(d, cells, timer)
+    path = os.path.join(workdir, "builder.drawio")
+    # save() seul: indentation + écriture (ou compression), une seule sérialisation
+    with timer("save"):
+        d.save(path, compressed=compressed)
+    timer.phases["file_mb"] = os.path.getsize(path) / (1 << 20)
+    return timer.phases
+
+def _bench_compact(cells: int, workdir: str) -> dict[str, float]:
+    from drawio_model import CompactDrawIOBuilder
+    timer = _Timer()
+    d = CompactDrawIOBuilder()
+    _synthetic_model(d, cells, timer)
+    path = os.path.join(workdir, "compact.drawio")
+    with timer("save"):
+        d.save(path)
+    timer.phases["file_mb"] = os.path.getsize(path) / (1 << 20)
+    return timer.phases
+
+def _bench_mxcell(cells: int, workdir: str) -> dict[str, float]:
+    from state import mxcell
+    from styles import STYLES
+    timer = _Timer()
+    mxfile = ET.Element("mxfile", host="app.diagrams.net")
+    state, transition = STYLES["state"], STYLES["transition"]
+    remaining, page = cells, 0
+    while remaining > 0:
+        n = min(CELLS_PER_PAGE, remaining)
+        remaining -= n
+        page += 1
+        diagram = ET.SubElement(mxfile, "diagram", name=f"Synthétique {page}")
+        root = ET.SubElement(ET.SubElement(diagram, "mxGraphModel"), "root")
+        ET.SubElement(root, "mxCell", id="0")
+        ET.SubElement(root, "mxCell", id="1", parent="0")
+        states = (n + 1) // 2
+        with timer("add_vertex"):
+            for i in range(states):
+                mxcell(root, f"s{i}", value=f"État {i}", style=state, vertex=True,
+                       x=40 + (i % 50) * 160, y=40 + (i // 50) * 100, w=140, h=60)
+        with timer("add_edge"):
+            for i in range(n // 2):
+                mxcell(root, f"t{i}", value="evt / action()", style=transition, edge=True,
+                       source=f"s{i % states}", target=f"s{(i + 1) % states}")
+    path = os.path.join(workdir, "mxcell.drawio")
+    with timer("ET.indent"):
+        ET.indent(mxfile, space="  ", level=0)
+    with timer("tree.write"):
+        ET.ElementTree(mxfile).write(path, encoding="utf-8", xml_declaration=True)
+    timer.phases["file_mb"] = os.path.getsize(path) / (1 << 20)
+    return timer.phases
+
+PDF_PATTERNS = {f"Figure 9.{k}": rf"Figure\s*9\.?{k}" for k in range(1, 11)}
+
+def _synthetic_pdf(path: str, pages: int):
+    """Text pages with, every few pages, a drawing and its "Figure 9.k" caption."""
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    step = max(1, pages // len(PDF_PATTERNS))
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Chapitre {i // 20 + 1}, page {i + 1}", fontsize=14)
+        page.insert_text((72, 100), "\n".join(f"Texte de remplissage {i}.{line} " * 3 for line in range(30)), fontsize=9)
+        k = i // step + 1
+        if i % step == step // 2 and k <= len(PDF_PATTERNS):
+            page.draw_rect(fitz.Rect(100, 200, 480, 520), color=(0, 0, 0), fill=(0.9, 0.9, 1))
+            page.draw_line((120, 240), (460, 480))
+            page.insert_text((100, 540), f"Figure 9.{k} Diagramme synthétique", fontsize=10)
+    doc.save(path)
+    doc.close()
+
+def _bench_pdf(pages: int, workdir: str) -> dict[str, float]:
+    from demarche_uml import extract_figure_pages, render_pages_as_images
+    timer = _Timer()
+    pdf = Path(workdir) / "synthetique.pdf"
+    with timer("generate_pdf"):
+        _synthetic_pdf(str(pdf), pages)
+    with timer("extract_figure_pages"):
+        page_map = extract_figure_pages(pdf, PDF_PATTERNS)
+    with timer("extract_figure_pages (index en cache)"):
+        extract_figure_pages(pdf, PDF_PATTERNS)
+    with timer("render_pages_as_images"):
+        render_pages_as_images(pdf, page_map, Path(workdir) / "pages", workers=1)
+    workers = os.cpu_count() or 1
+    with timer(f"render_pages_as_images (x{workers})"):
+        render_pages_as_images(pdf, page_map, Path(workdir) / "pages-par", workers=workers)
+    with timer("render_pages_as_images (recadrage)"):
+        render_pages_as_images(pdf, page_map, Path(workdir) / "figures", workers=1, crop_patterns=PDF_PATTERNS)
+    return timer.phases
+
+def run_case(case: str, size: int) -> dict:
+    """Run one case in the current process; `size` is a cell count (a page count for "pdf")."""
+    baseline = _peak_memory_mb()
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        if case == "builder":
+            phases = _bench_builder(size, workdir, compressed=False)
+        elif case == "compressed":
+            phases = _bench_builder(size, workdir, compressed=True)
+        elif case == "compact":
+            phases = _bench_compact(size, workdir)
+        elif case == "mxcell":
+            phases = _bench_mxcell(size, workdir)
+        elif case == "pdf":
+            phases = _bench_pdf(size, workdir)
+        else:
+            raise ValueError(f"Cas de benchmark inconnu: {case!r} (attendu: {', '.join(CASES)})")
+    file_mb = phases.pop("file_mb", None)
+    peak = _peak_memory_mb()
+    return {"phases": phases, "total_s": sum(phases.values()), "peak_rss_mb": peak,
+            "case_rss_mb": None if peak is None or baseline is None else peak - baseline, "file_mb": file_mb}
+
+def _isolated(case: str, size: int) -> dict:
+    # Un processus neuf par cas: le pic mémoire mesuré est celui du cas seul
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(run_case, case, size).result()
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).parent, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+def run(cases=CASES, sizes=tuple(SIZES), pdf_pages: int = PDF_PAGES, isolate: bool = True, log=print) -> dict:
+    """Run the selected cases; return the results document (see compare())."""
+    results: dict[str, dict] = {}
+    runner = _isolated if isolate else run_case
+    for case in cases:
+        if case == "pdf":
+            try:
+                import fitz  # noqa: F401  PyMuPDF
+            except Exception:
+                log("pdf: PyMuPDF (fitz) absent, benchmark PDF ignoré")
+                continue
+            targets = [(f"pdf/{pdf_pages}p", pdf_pages)]
+        else:
+            targets = [(f"{case}/{label}", SIZES[label]) for label in sizes]
+        for name, size in targets:
+            result = runner(case, size)
+            results[name] = result
+            peak = result["peak_rss_mb"]
+            log(f"{name:<22} {result['total_s']:8.3f} s" + (f"  pic {peak:8.1f} Mo" if peak is not None else ""))
+            for phase, seconds in result["phases"].items():
+                log(f"    {phase:<40} {seconds:8.3f} s")
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+
+def compare(current: dict, previous: dict, threshold: float = 0.15) -> list[str]:
+    """Phases of `current` slower than in `previous` by more than `threshold` (relative)."""
+    regressions = []
+    for name, result in current["results"].items():
+        before = previous.get("results", {}).get(name)
+        if before is None:
+            continue
+        for phase, seconds in result["phases"].items():
+            old = before["phases"].get(phase)
+            # En dessous de 50 ms, le bruit de mesure domine
+            if old and seconds > 0.05 and seconds > old * (1 + threshold):
+                regressions.append(f"{name} {phase}: {old:.3f} s -> {seconds:.3f} s (+{seconds / old - 1:.0%})")
+        old_peak, peak = before.get("peak_rss_mb"), result.get("peak_rss_mb")
+        if old_peak and peak and peak > old_peak * (1 + threshold):
+            regressions.append(f"{name} mémoire: {old_peak:.1f} Mo -> {peak:.1f} Mo (+{peak / old_peak - 1:.0%})")
+    return regressions
+
+def _latest(results_dir: Path, exclude: Path | None = None) -> Path | None:
+    runs = sorted(p for p in results_dir.glob("bench-*.json") if p != exclude)
+    return runs[-1] if runs else None
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de génération des diagrammes.")
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"tailles de modèle ({', '.join(SIZES)})")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"cas à exécuter ({', '.join(CASES)})")
+    parser.add_argument("--pdf-pages", type=int, default=PDF_PAGES)
+    parser.add_argument("--out", default=RESULTS_DIR, help="dossier des résultats JSON")
+    parser.add_argument("--baseline", help="résultats de référence (défaut: exécution précédente dans --out)")
+    parser.add_argument("--threshold", type=float, default=0.15, help="ralentissement toléré (défaut: 0.15)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="code de sortie 1 en cas de régression")
+    parser.add_argument("--no-isolate", action="store_true", help="tous les cas dans ce processus")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    for label in sizes:
+        if label not in SIZES:
+            parser.error(f"taille inconnue: {label} (attendu: {', '.join(SIZES)})")
+    for case in cases:
+        if case not in CASES:
+            parser.error(f"cas inconnu: {case} (attendu: {', '.join(CASES)})")
+
+    doc = run(cases, sizes, args.pdf_pages, isolate=not args.no_isolate)
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    path.write_text(json.dumps(doc, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"Résultats: {path}")
+
+    baseline = Path(args.baseline) if args.baseline else _latest(out_dir, exclude=path)
+    if baseline is None:
+        return 0
+    regressions = compare(doc, json.loads(baseline.read_text(encoding="utf-8")), args.threshold)
+    print(f"Comparaison avec {baseline}: {len(regressions)} régression(s)")
+    for line in regressions:
+        print(f"  {line}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Incremental, content-addressed rebuilds for the generators.
+
+Each target (act, state, demarche_uml...) is keyed by a fingerprint of its inputs
+(sources, PDF bytes, dpi, styles). The manifest remembers the key and the state of
+every output; when nothing changed the build is skipped, and when it runs, outputs
+are written to a temporary file and only moved into place if their bytes differ,
+so unchanged files keep their mtime.
+
+LRUCache is the in-memory counterpart for long-running processes
+(render_service.py, layout.enable_cache).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import secrets
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+MANIFEST = ".build-manifest.json"
+
+def _temp_file(directory: Path, prefix: str) -> str:
+    """
+    New empty file in `directory`, created like mkstemp (O_EXCL) but with mode
+    0o666 filtered by the umask, i.e. the rights of an ordinary file (mkstemp
+    gives 0600), without reading or changing the process umask.
+    """
+    for _ in range(100):
+        path = directory / f"{prefix}{secrets.token_hex(4)}"
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return str(path)
+    raise FileExistsError(f"Aucun nom de fichier temporaire libre dans {directory}")
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _stat_sig(path: Path) -> list[int]:
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+class BuildCache:
+    def __init__(self, manifest_path: str | Path = MANIFEST):
+        self.path = Path(manifest_path)
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        self.targets: dict[str, dict] = data.get("targets", {})
+        # Empreintes de fichiers d'entrée, réutilisées tant que (taille, mtime) ne bouge pas
+        self.files: dict[str, dict] = data.get("files", {})
+        self._written: dict[str, str] = {}
+
+    def file_digest(self, path: str | Path) -> str:
+        path = Path(path)
+        sig = _stat_sig(path)
+        known = self.files.get(str(path))
+        if known is not None and known["sig"] == sig:
+            return known["sha256"]
+        digest = _sha256_file(path)
+        self.files[str(path)] = {"sig": sig, "sha256": digest}
+        return digest
+
+    def fingerprint(self, *parts) -> str:
+        """
+        Hash of the inputs of a target: Paths are hashed by content, bytes/str as is,
+        anything else (dpi, patterns, options) through its canonical JSON form.
+        """
+        h = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, Path):
+                chunk = f"file:{part.name}:{self.file_digest(part)}".encode()
+            elif isinstance(part, bytes):
+                chunk = part
+            elif isinstance(part, str):
+                chunk = part.encode("utf-8")
+            else:
+                chunk = json.dumps(part, sort_keys=True, ensure_ascii=False).encode("utf-8")
+            h.update(len(chunk).to_bytes(8, "little"))
+            h.update(chunk)
+        return h.hexdigest()
+
+    def is_fresh(self, target: str, key: str) -> bool:
+        """True if `target` was last built with `key` and its outputs are untouched since."""
+        entry = self.targets.get(target)
+        if entry is None or entry["key"] != key:
+            return False
+        for out, recorded in entry["outputs"].items():
+            p = Path(out)
+            if not p.exists() or _stat_sig(p) != recorded["sig"]:
+                return False
+        return True
+
+    def publish(self, tmp_path: str | Path, final_path: str | Path) -> bool:
+        """
+        Move a freshly built file into place unless `final_path` already has the same
+        bytes (the temporary file is then dropped). Returns True if the file changed.
+        """
+        tmp_path, final_path = Path(tmp_path), Path(final_path)
+        digest = _sha256_file(tmp_path)
+        self._written[str(final_path)] = digest
+        if final_path.exists() and _sha256_file(final_path) == digest:
+            tmp_path.unlink()
+            return False
+        if final_path.exists():
+            os.chmod(tmp_path, final_path.stat().st_mode & 0o7777)
+        os.replace(tmp_path, final_path)
+        return True
+
+    @contextmanager
+    def output(self, final_path: str | Path):
+        """Yield a temporary path (same directory) to write `final_path` to, then publish() it."""
+        final_path = Path(final_path)
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = _temp_file(final_path.parent, f".{final_path.name}.")
+        try:
+            yield tmp
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.publish(tmp, final_path)
+
+    def record(self, target: str, key: str, outputs) -> None:
+        """
+        Remember that `target` produced `outputs` from `key`, and save the manifest.
+        Outputs of the previous build that are no longer produced (a figure dropped
+        from the patterns...) are deleted, unless they were modified since.
+        """
+        entry = {"key": key, "outputs": {}}
+        for out in outputs:
+            p = Path(out)
+            digest = self._written.get(str(p)) or _sha256_file(p)
+            entry["outputs"][str(p)] = {"sha256": digest, "sig": _stat_sig(p)}
+        previous = self.targets.get(target, {}).get("outputs", {})
+        for out, recorded in previous.items():
+            p = Path(out)
+            if out in entry["outputs"] or not p.is_file():
+                continue
+            if _stat_sig(p) == recorded["sig"] or _sha256_file(p) == recorded["sha256"]:
+                p.unlink()
+        self.targets[target] = entry
+        self.save()
+
+    def save(self) -> None:
+        tmp = _temp_file(self.path.parent, f".{self.path.name}.")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"targets": self.targets, "files": self.files}, f, indent=1)
+        os.replace(tmp, self.path)
+
+class LRUCache:
+    """Bounded in-memory map: the least recently used entry goes first; hits and misses are counted."""
+    __slots__ = ("maxsize", "data", "hits", "misses")
+
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 1:
+            raise ValueError(f"Taille de cache invalide: {maxsize}")
+        self.maxsize = maxsize
+        self.data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key) -> bool:
+        return key in self.data
+
+    def get(self, key, default=None):
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self.data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,276 @@
+"""
+Geometric containment of draw.io vertices in swimlanes, regions and composites.
+
+The generators place actions "in" a lane or an interruptible region by
+coordinates only: the parent stays the layer, so moving the lane in draw.io
+leaves its content behind and nothing says which partition an action belongs
+to. contain_table() derives the tree from the geometry, for a whole page:
+
+- containers (swimlanes, interruptible regions, composite states, system
+  boundaries, any style with container=1) are kept in a uniform grid index
+  (router.GridIndex); a vertex only looks at the containers listed in the grid
+  cells it overlaps;
+- each vertex goes to the smallest container that encloses it entirely and is
+  drawn before it (a container drawn above a shape hides it: reported, not
+  used); containers nest the same way, the others go back to their layer;
+- parent and x/y are rewritten, relative to the new parent; absolute positions,
+  edges and edge labels are unchanged.
+
+The same indexes report layout problems, as validate.Issue warnings: shapes
+overlapping each other, shapes sticking out of a container, shapes hidden
+under a container drawn after them.
+
+    python containment.py diagrammes/atm_activity_examples.drawio            # en place
+    python containment.py entree.drawio -o sortie.drawio
+    python containment.py diagrammes/*.drawio --check                        # rapport seul
+
+    from containment import contain
+    contain(builder)   # DrawIOBuilder ou CompactDrawIOBuilder, avant save()
+"""
+from __future__ import annotations
+
+import shutil
+import sys
+import xml.etree.ElementTree as ET
+from math import isnan
+from pathlib import Path
+
+import instrument
+from drawio_model import KIND_EDGE, KIND_VERTEX, NO_REF, CellTable
+from drawio_reader import WRAPPER_TAGS, page_tables, table_from_diagram
+from router import GridIndex
+from styles import STYLES
+from validate import WARNING, Issue, cell_style_names, report
+
+CONTAINER_STYLES = {"swimlane", "interruptible", "composite", "system_boundary"}
+# Cadres de fragments et croix de destruction: posés sur les lignes de vie par construction
+IGNORED_STYLES = {"fragment", "fragment_separator", "destroy"}
+IGNORED_SHAPES = {"line"}   # traits (barres de croix...): pas une surface
+EPSILON = 0.5       # tolérance (px) des tests d'inclusion et de chevauchement
+
+class _Shapes:
+    """Absolute boxes of the vertices of a page, split into containers and plain shapes."""
+
+    def __init__(self, table: CellTable):
+        self.table = table
+        self.ax, self.ay = table.absolute()
+        names = cell_style_names(table)
+        kind, parent = table.kind, table.parent
+        self.boxes: dict[int, tuple[float, float, float, float]] = {}
+        self.pos: dict[int, int] = {}     # rang dans l'ordre de dessin
+        self.containers: list[int] = []
+        self.shapes: list[int] = []
+        kinds: dict[int, bool | None] = {}   # style -> conteneur (True), ignoré (None), forme (False)
+        for i, r in enumerate(table.order):
+            if kind[r] != KIND_VERTEX:
+                continue
+            w, h = table.w[r], table.h[r]
+            if isnan(w) or isnan(h) or w <= 0 or h <= 0:
+                continue
+            p = parent[r]
+            if p != NO_REF and kind[p] == KIND_EDGE:
+                continue   # libellé d'arête
+            sid = table.style[r]
+            role = kinds.get(sid)
+            if sid not in kinds:
+                role = kinds[sid] = self._kind(names[r], table.style_of(r))
+            if role is None:
+                continue
+            self.boxes[r] = (self.ax[r], self.ay[r], self.ax[r] + w, self.ay[r] + h)
+            self.pos[r] = i
+            (self.containers if role else self.shapes).append(r)
+
+    @staticmethod
+    def _kind(name: str | None, style: str) -> bool | None:
+        if name in IGNORED_STYLES:
+            return None
+        if name in CONTAINER_STYLES:
+            return True
+        entries = STYLES.parsed(style)
+        if entries.get("shape") in IGNORED_SHAPES:
+            return None
+        return entries.get("container") == "1" or ("swimlane" in entries and entries["swimlane"] is None)
+
+    def index(self, rows: list[int]) -> GridIndex:
+        """Grid index of the boxes of `rows` (key i = rows[i]), cells twice their mean width."""
+        # Côté le plus court: un couloir très haut ne doit pas agrandir toute la grille
+        size = 100.0
+        if rows:
+            size = 2 * sum(min(b[2] - b[0], b[3] - b[1]) for b in map(self.boxes.get, rows)) / len(rows)
+        grid = GridIndex(max(size, 40.0))
+        for r in rows:
+            grid.insert(*self.boxes[r])
+        return grid
+
+def _encloses(outer, inner) -> bool:
+    e = EPSILON
+    return outer[0] - e <= inner[0] and outer[1] - e <= inner[1] and inner[2] <= outer[2] + e and inner[3] <= outer[3] + e
+
+def _overlap(a, b) -> bool:
+    e = EPSILON
+    return a[0] + e < b[2] and b[0] + e < a[2] and a[1] + e < b[3] and b[1] + e < a[3]
+
+def _area(box) -> float:
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+def _layer(table: CellTable, r: int) -> int:
+    """First non-vertex ancestor of `r` (its layer), NO_REF if there is none."""
+    kind, parent = table.kind, table.parent
+    p = parent[r]
+    for _ in range(len(table.ids)):
+        if p == NO_REF or kind[p] != KIND_VERTEX:
+            break
+        p = parent[p]
+    return p
+
+@instrument.traced("contain")
+def contain_table(table: CellTable, page: str | None = None) -> tuple[int, list[Issue]]:
+    """Re-parent every vertex of the page in its smallest enclosing container; returns (moved, issues)."""
+    page = table.name if page is None else page
+    shapes = _Shapes(table)
+    boxes, pos, containers = shapes.boxes, shapes.pos, shapes.containers
+    ids, labels = table.ids, table.labels
+    issues: list[Issue] = []
+
+    def warn(r, code, message):
+        issues.append(Issue(WARNING, page, ids[r], code, message))
+
+    def name(r):
+        return repr(labels[r] or ids[r])
+
+    # Conteneur le plus petit qui englobe chaque sommet et est dessiné avant lui
+    grid = shapes.index(containers)
+    is_container = set(containers)
+    kind, parent = table.kind, table.parent
+    new_parent: dict[int, int] = {}
+    for r in containers + shapes.shapes:
+        box = boxes[r]
+        p = parent[r]
+        # Un sommet attaché à une forme simple (activation sur sa ligne de vie...) garde son parent
+        free = p == NO_REF or kind[p] != KIND_VERTEX or p in is_container
+        best = None
+        for key in grid.query(box[0], box[1], box[2], box[3]):
+            c = containers[key]
+            if c == r:
+                continue
+            outer = boxes[c]
+            if _encloses(outer, box):
+                if _encloses(box, outer):
+                    continue   # mêmes limites: pas d'inclusion
+                if pos[c] > pos[r]:
+                    warn(r, "masque", f"{name(r)} dessiné sous le conteneur {name(c)}")
+                elif best is None or (_area(outer), -pos[c]) < (_area(boxes[best]), -pos[best]):
+                    best = c
+            elif _overlap(outer, box) and not _encloses(box, outer) and _area(box) <= _area(outer):
+                warn(r, "debordement", f"{name(r)} déborde du conteneur {name(c)}")
+        if free:
+            new_parent[r] = _layer(table, r) if best is None else best
+
+    # Formes qui se chevauchent (une forme entièrement dans une autre est un décor: anneau, marque)
+    plain = shapes.shapes
+    grid = shapes.index(plain)
+    for i, r in enumerate(plain):
+        box = boxes[r]
+        for key in grid.query(box[0], box[1], box[2], box[3]):
+            if key <= i:
+                continue
+            other = boxes[plain[key]]
+            if _overlap(box, other) and not _encloses(box, other) and not _encloses(other, box):
+                warn(r, "chevauchement", f"{name(r)} chevauche {name(plain[key])}")
+
+    # Réécriture: coordonnées relatives au nouveau parent, position absolue inchangée
+    moved = 0
+    ax, ay = shapes.ax, shapes.ay
+    for r, p in new_parent.items():
+        if p == parent[r]:
+            continue
+        ox, oy = (ax[p], ay[p]) if p != NO_REF and kind[p] == KIND_VERTEX else (0.0, 0.0)
+        parent[r] = p
+        table.x[r] = ax[r] - ox
+        table.y[r] = ay[r] - oy
+        moved += 1
+    instrument.count("cells_reparented", moved, page=table.name)
+    return moved, issues
+
+def contain_diagram(diagram: ET.Element) -> tuple[int, list[Issue]]:
+    """Apply contain_table() to an ElementTree <diagram> (DrawIOBuilder, state.build_drawio()) in place."""
+    table = table_from_diagram(diagram)
+    before = list(table.parent)
+    moved, issues = contain_table(table, diagram.get("name"))
+    if not moved:
+        return moved, issues
+    root = diagram if diagram.tag == "root" else diagram.find(".//root")
+    if root is None:
+        raise ValueError(f"Page compressée non modifiable en place: {diagram.get('name')!r}")
+    for elem in root:
+        r = table.index.get(elem.get("id"))
+        if r is None or table.parent[r] == before[r]:
+            continue
+        cell = elem.find("mxCell") if elem.tag in WRAPPER_TAGS else elem
+        attrib, geometry = table.cell_xml(r)
+        cell.set("parent", attrib["parent"])
+        geo = cell.find("mxGeometry")
+        for key in ("x", "y"):
+            if key in geometry:
+                geo.set(key, geometry[key])
+            else:
+                geo.attrib.pop(key, None)
+    return moved, issues
+
+def contain(source) -> tuple[int, list[Issue]]:
+    """Apply contain_table() to every page of a builder, CellTable or <mxfile>/<diagram> Element."""
+    moved, issues = 0, []
+    if isinstance(source, CellTable):
+        pages = [source]
+    elif hasattr(source, "pages"):      # CompactDrawIOBuilder
+        pages = source.pages
+    else:
+        mxfile = source.mxfile if hasattr(source, "mxfile") else source
+        pages = [mxfile] if mxfile.tag != "mxfile" else mxfile.findall("diagram")
+    for page in pages:
+        n, found = contain_table(page) if isinstance(page, CellTable) else contain_diagram(page)
+        moved += n
+        issues.extend(found)
+    return moved, issues
+
+def contain_file(path, out_path=None, check: bool = False) -> tuple[int, list[Issue]]:
+    """Contain a .drawio file, patching only the cells that moved (diagram_diff.apply_patch)."""
+    from diagram_diff import apply_patch, diff_tables
+
+    moved, issues = 0, []
+    ops = []
+    for old, table in zip(page_tables(path), page_tables(path)):
+        n, found = contain_table(table)
+        moved += n
+        issues.extend(found)
+        ops.extend(diff_tables(old, table))
+    if check:
+        return moved, issues
+    if not apply_patch(path, ops, out_path) and out_path is not None and Path(out_path) != Path(path):
+        shutil.copyfile(path, out_path)   # rien à déplacer: copie telle quelle
+    return moved, issues
+
+def main(argv: list[str]) -> int:
+    out = None
+    if "-o" in argv:
+        i = argv.index("-o")
+        if i + 1 >= len(argv):
+            print("-o attend un fichier de sortie")
+            return 2
+        out = argv[i + 1]
+        argv = argv[:i] + argv[i + 2:]
+    check = "--check" in argv
+    instrument.from_argv(argv)
+    paths = [a for i, a in enumerate(argv) if not a.startswith("--") and (i == 0 or argv[i - 1] != "--trace")]
+    if not paths or (out and (len(paths) != 1 or check)):
+        print("Usage: python containment.py <fichier.drawio>... [-o sortie.drawio | --check] [--trace trace.json]")
+        return 2
+    for path in paths:
+        moved, issues = contain_file(path, out, check)
+        verb = "à rattacher" if check else "rattachée(s)"
+        print(f"{path}{'' if check else ' -> ' + (out or path)}: {moved} cellule(s) {verb}, {len(issues)} avertissement(s)")
+        report(issues)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,35 +1,242 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
 import re
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def extract_figure_pages(pdf_path: Path, patterns: dict[str, str]) -> dict[str, int | None]:
+import instrument
+
+# Regex robustes pour repérer les légendes de figures dans le texte extrait
+FIGURE_PATTERNS = {
+    "Figure 9.1": r"Figure\s*9\.?1",
+    "Figure 9.2": r"Figure\s*9\.?2",
+    "Figure 9.3": r"Figure\s*9\.?3",
+    "Figure 9.4": r"Figure\s*9\.?4",
+    "Figure 9.6": r"Figure\s*9\.?6",
+    "Figure 9.7": r"Figure\s*9\.?7",
+    "Figure 9.8": r"Figure\s*9\.?8",
+    "Figure 9.9": r"Figure\s*9\.?9",
+    "Figure 9.10": r"Figure\s*9\.?10",
+}
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _caption_regex(patterns: dict[str, str]) -> re.Pattern:
     """
-    Return a mapping "Figure 9.x" -> page index (0-based) where the label is found,
-    or None if not found. Uses PyMuPDF (fitz) if available.
+    All figure patterns in one regex, so a page's text is scanned once. (?!\d)
+    stops "Figure 9.1" from matching inside "Figure 9.10". Each pattern sits in its
+    own optional lookahead behind a guard alternation: a match position reports
+    every pattern found there (named groups f0, f1...), overlapping ones included.
+    """
+    alternatives = [f"(?:{regex})(?!\\d)" for regex in patterns.values()]
+    groups = [f"(?:(?=(?P<f{i}>{alt})))?" for i, alt in enumerate(alternatives)]
+    return re.compile(f"(?=(?:{'|'.join(alternatives)}))" + "".join(groups), flags=re.IGNORECASE)
+
+def _caption_keys(regex: re.Pattern, keys: list[str], text: str) -> set[str]:
+    """Keys of the patterns of _caption_regex() found anywhere in `text`."""
+    return {keys[int(name[1:])] for m in regex.finditer(text) for name, value in m.groupdict().items() if value is not None}
+
+def index_figure_captions(pdf_path: Path, patterns: dict[str, str], cache_path: Path | None = None) -> dict[int, list[str]] | None:
     """
+    Return a mapping page index (0-based) -> figure keys whose caption appears on
+    that page. Each page's text is extracted once; the index is cached on disk
+    (default: "<pdf>.figindex.json") keyed by the PDF's sha256 and mtime, so a
+    later run with the same PDF and patterns skips extraction entirely.
+    Returns None if the index is not cached and PyMuPDF (fitz) is unavailable.
+    """
+    if cache_path is None:
+        cache_path = pdf_path.with_name(pdf_path.name + ".figindex.json")
+    stat = pdf_path.stat()
+    digest = None
+    try:
+        cached = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        cached = None
+    if cached is not None and cached.get("patterns") == patterns:
+        # mtime identique: on fait confiance au cache; sinon le hash tranche (fichier seulement "touché")
+        if cached.get("mtime_ns") == stat.st_mtime_ns:
+            return {int(k): v for k, v in cached["pages"].items()}
+        digest = _file_sha256(pdf_path)
+        if cached.get("sha256") == digest:
+            cached["mtime_ns"] = stat.st_mtime_ns
+            _write_json(cache_path, cached)
+            return {int(k): v for k, v in cached["pages"].items()}
+
     try:
         import fitz  # PyMuPDF
-    except Exception as e:
+    except Exception:
+        return None
+
+    keys = list(patterns.keys())
+    regex = _caption_regex(patterns)
+    index: dict[int, list[str]] = {}
+    with instrument.span("pdf text extraction", pdf=pdf_path.name), fitz.open(pdf_path) as doc:
+        for page_index in range(len(doc)):
+            text = doc[page_index].get_text("text")
+            found = _caption_keys(regex, keys, text)
+            if found:
+                index[page_index] = sorted(found, key=keys.index)
+        instrument.count("pdf_pages_read", len(doc))
+
+    _write_json(cache_path, {
+        "sha256": digest or _file_sha256(pdf_path),
+        "mtime_ns": stat.st_mtime_ns,
+        "patterns": patterns,
+        "pages": {str(k): v for k, v in index.items()},
+    })
+    return index
+
+def _write_json(path: Path, data) -> None:
+    # Cache au mieux: un PDF dans un dossier en lecture seule reste indexable, sans cache
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Index des légendes non enregistré ({path}): {e}")
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+@instrument.traced("extract_figure_pages")
+def extract_figure_pages(pdf_path: Path, patterns: dict[str, str]) -> dict[str, int | None]:
+    """
+    Return a mapping "Figure 9.x" -> page index (0-based) where the label is first
+    found, or None if not found. Uses the cached caption index (PyMuPDF if needed).
+    """
+    index = index_figure_captions(pdf_path, patterns)
+    if index is None:
         print("PyMuPDF (fitz) is required to extract images. Install it if available in this environment.")
         return {k: None for k in patterns.keys()}
 
-    pages = {}
-    with fitz.open(pdf_path) as doc:
-        for fig_key, regex in patterns.items():
-            pages[fig_key] = None
-            pat = re.compile(regex, flags=re.IGNORECASE)
-            for page_index in range(len(doc)):
-                text = doc[page_index].get_text("text")
-                if pat.search(text):
-                    pages[fig_key] = page_index
-                    break
+    pages: dict[str, int | None] = {k: None for k in patterns.keys()}
+    for page_index in sorted(index):
+        for fig_key in index[page_index]:
+            if pages[fig_key] is None:
+                pages[fig_key] = page_index
     return pages
 
-def render_pages_as_images(pdf_path: Path, page_map: dict[str, int | None], out_dir: Path, dpi: int = 144) -> dict[str, Path | None]:
+def _figure_filename(fig_key: str) -> str:
+    return fig_key.lower().replace(" ", "_").replace(".", "_") + ".png"
+
+# Écart vertical max (points PDF) entre deux éléments graphiques d'une même figure
+FIGURE_GAP = 18.0
+CLIP_MARGIN = 4.0
+
+def _figure_clip(page, caption_regex: re.Pattern):
+    """
+    Locate a figure on its page: find the caption's text block, then grow a box from
+    the image/drawing rects closest to it (above first, below if nothing is above),
+    merging rects separated by less than FIGURE_GAP. Returns (clip rect, image xref)
+    where the xref is set when the figure is a single embedded raster image, or None
+    if the caption or the graphics cannot be found.
+    The caption is a block starting with the pattern when there is one (body text
+    cites "comme le montre la Figure 9.1"), the matching block nearest the
+    graphics among those.
+    """
+    import fitz  # PyMuPDF
+
+    matches = [(fitz.Rect(x0, y0, x1, y1), text) for x0, y0, x1, y1, text, *_ in page.get_text("blocks")
+               if caption_regex.search(text)]
+    if not matches:
+        return None
+
+    graphics = [(fitz.Rect(info["bbox"]), info.get("xref", 0)) for info in page.get_image_info(xrefs=True)]
+    graphics += [(fitz.Rect(d["rect"]), 0) for d in page.get_drawings()]
+    graphics = [(r, xref) for r, xref in graphics if not r.is_empty and r.width < page.rect.width * 0.98]
+
+    matches = [m for m in matches if caption_regex.match(m[1].lstrip())] or matches
+
+    def distance(rect):
+        # Écart vertical au graphique le plus proche
+        return min((max(g.y0 - rect.y1, rect.y0 - g.y1, 0.0) for g, _ in graphics), default=0.0)
+
+    caption = min((rect for rect, _ in matches), key=distance)
+
+    above = sorted((g for g in graphics if g[0].y1 <= caption.y0 + 2), key=lambda g: -g[0].y1)
+    below = sorted((g for g in graphics if g[0].y0 >= caption.y1 - 2), key=lambda g: g[0].y0)
+    for candidates, upward in ((above, True), (below, False)):
+        if not candidates:
+            continue
+        box = fitz.Rect(candidates[0][0])
+        members = [candidates[0]]
+        for rect, xref in candidates[1:]:
+            gap = box.y0 - rect.y1 if upward else rect.y0 - box.y1
+            if gap > FIGURE_GAP:
+                break
+            box |= rect
+            members.append((rect, xref))
+        xref = members[0][1] if len(members) == 1 else 0
+        clip = (box | caption) + (-CLIP_MARGIN, -CLIP_MARGIN, CLIP_MARGIN, CLIP_MARGIN)
+        return clip & page.rect, xref
+    return None
+
+def _save_embedded_image(doc, xref: int, out_path: str) -> None:
+    """Write an embedded raster image as PNG without rasterizing the page."""
+    import fitz  # PyMuPDF
+
+    info = doc.extract_image(xref)
+    if info.get("ext") == "png":
+        Path(out_path).write_bytes(info["image"])
+        return
+    pix = fitz.Pixmap(doc, xref)
+    if pix.n - pix.alpha >= 4:  # CMYK & co -> RGB
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    pix.save(out_path)
+
+def _render_jobs(pdf_path: str, jobs: list[tuple[int, list[tuple[str, str]]]], dpi: int, crop_patterns: dict[str, str] | None = None) -> None:
+    """
+    Render a slice of the page map. Each (page index, [(figure, output path)]) job
+    either renders the page once and copies it to the other figures of that page, or,
+    with crop_patterns, renders each figure's clip region (or saves its embedded
+    image directly), falling back to the full page when the figure is not found
+    or has no pattern.
+    Runs in a worker process, which opens its own fitz document.
+    """
+    import fitz  # PyMuPDF
+
+    # Zoom factor from dpi (default display matrix ~72 dpi)
+    zoom = dpi / 72.0
+    mat = fitz.Matrix(zoom, zoom)
+    with fitz.open(pdf_path) as doc:
+        for page_index, figures in jobs:
+            page = doc[page_index]
+            if crop_patterns is None:
+                pix = page.get_pixmap(matrix=mat, alpha=False)
+                pix.save(figures[0][1])
+                for _, alias in figures[1:]:
+                    shutil.copyfile(figures[0][1], alias)
+                continue
+            for fig_key, out_path in figures:
+                pattern = crop_patterns.get(fig_key)
+                found = None if pattern is None else _figure_clip(page, _caption_regex({fig_key: pattern}))
+                if found is None:
+                    page.get_pixmap(matrix=mat, alpha=False).save(out_path)
+                elif found[1]:
+                    _save_embedded_image(doc, found[1], out_path)
+                else:
+                    page.get_pixmap(matrix=mat, clip=found[0], alpha=False).save(out_path)
+
+def render_pages_as_images(pdf_path: Path, page_map: dict[str, int | None], out_dir: Path, dpi: int = 144, workers: int = 1,
+                           crop_patterns: dict[str, str] | None = None) -> dict[str, Path | None]:
     """
     Render each located page to a PNG and return mapping "Figure 9.x" -> image path.
     If a page is None, returns None for that figure. Uses PyMuPDF (fitz).
+    Pages shared by several figures are rendered once; with workers > 1 the pages
+    are split across a process pool, each worker writing its PNGs to out_dir.
+    With crop_patterns (the caption regexes), only each figure's region is kept.
     """
     try:
         import fitz  # PyMuPDF
@@ -39,21 +246,37 @@ def render_pages_as_images(pdf_path: Path, page_map: dict[str, int | None], out_
     out_dir.mkdir(parents=True, exist_ok=True)
     images: dict[str, Path | None] = {}
     with fitz.open(pdf_path) as doc:
-        # Zoom factor from dpi (default display matrix ~72 dpi)
-        zoom = dpi / 72.0
-        mat = fitz.Matrix(zoom, zoom)
-        for fig_key, page_index in page_map.items():
-            if page_index is None or page_index < 0 or page_index >= len(doc):
-                images[fig_key] = None
-                continue
-            page = doc[page_index]
-            pix = page.get_pixmap(matrix=mat, alpha=False)
-            safe_name = fig_key.lower().replace(" ", "_").replace(".", "_")
-            out_path = out_dir / f"{safe_name}.png"
-            pix.save(out_path.as_posix())
-            images[fig_key] = out_path
+        page_count = len(doc)
+
+    by_page: dict[int, list[tuple[str, str]]] = {}
+    for fig_key, page_index in page_map.items():
+        if page_index is None or page_index < 0 or page_index >= page_count:
+            images[fig_key] = None
+            continue
+        out_path = out_dir / _figure_filename(fig_key)
+        by_page.setdefault(page_index, []).append((fig_key, out_path.as_posix()))
+        images[fig_key] = out_path
+
+    jobs = sorted(by_page.items())
+    workers = max(1, min(workers, len(jobs)))
+    with instrument.span("rasterization", pages=len(jobs), dpi=dpi, workers=workers):
+        if workers == 1:
+            if jobs:
+                _render_jobs(str(pdf_path), jobs, dpi, crop_patterns)
+        else:
+            # Répartition entrelacée: les pages voisines (souvent de coût proche) vont à des workers différents
+            slices = [jobs[i::workers] for i in range(workers)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_render_jobs, str(pdf_path), part, dpi, crop_patterns) for part in slices]
+                for fut in futures:
+                    fut.result()
+    if instrument.enabled():
+        for path in images.values():
+            if path is not None:
+                instrument.count_file("bytes_written", path, figure=path.name)
     return images
 
+@instrument.traced("build_markdown")
 def build_markdown(md_path: Path, figure_images: dict[str, Path | None]) -> None:
     """
     Write the markdown file with a concise introduction to UML based on the supplied PDF excerpts.
@@ -178,33 +401,50 @@ def build_markdown(md_path: Path, figure_images: dict[str, Path | None]) -> None
 
     md_path.write_text("\n".join(lines), encoding="utf-8")
 
-def main():
+def main(force: bool = False):
+    from build_cache import BuildCache
+
     pdf_filename = "uml2-apprentissage-pratique-124-134.pdf"
     pdf_path = Path(pdf_filename)
+    md_path = Path("demarche_uml.md")
+    cache = BuildCache()
     if not pdf_path.exists():
         print(f"Fichier PDF introuvable: {pdf_path}. Placez '{pdf_filename}' dans le répertoire courant.")
         # On génère malgré tout un markdown squelette.
-        figure_images = {k: None for k in ["Figure 9.1","Figure 9.2","Figure 9.3","Figure 9.4","Figure 9.6","Figure 9.7","Figure 9.8","Figure 9.9","Figure 9.10"]}
-        build_markdown(Path("demarche_uml.md"), figure_images)
+        figure_images = {k: None for k in FIGURE_PATTERNS}
+        with cache.output(md_path) as tmp:
+            build_markdown(Path(tmp), figure_images)
         return
 
-    # Regex robustes pour repérer les légendes de figures dans le texte extrait
-    patterns = {
-        "Figure 9.1": r"Figure\s*9\.?1",
-        "Figure 9.2": r"Figure\s*9\.?2",
-        "Figure 9.3": r"Figure\s*9\.?3",
-        "Figure 9.4": r"Figure\s*9\.?4",
-        "Figure 9.6": r"Figure\s*9\.?6",
-        "Figure 9.7": r"Figure\s*9\.?7",
-        "Figure 9.8": r"Figure\s*9\.?8",
-        "Figure 9.9": r"Figure\s*9\.?9",
-        "Figure 9.10": r"Figure\s*9\.?10",
-    }
+    patterns = FIGURE_PATTERNS
+    dpi = 144
+
+    # Entrées: ce script, les octets du PDF, la résolution et les motifs de légendes
+    key = cache.fingerprint(Path(__file__), pdf_path, {"dpi": dpi, "patterns": patterns, "crop": True})
+    if not force and cache.is_fresh("demarche_uml", key):
+        print(f"{md_path} et figures à jour.")
+        return
 
     page_map = extract_figure_pages(pdf_path, patterns)
     figures_dir = Path("figures")
-    figure_images = render_pages_as_images(pdf_path, page_map, figures_dir, dpi=144)
-    build_markdown(Path("demarche_uml.md"), figure_images)
+    figures_dir.mkdir(parents=True, exist_ok=True)
+    # Rendu dans un dossier temporaire, puis publication des seuls PNG modifiés
+    with tempfile.TemporaryDirectory(dir=figures_dir) as tmp_dir:
+        rendered = render_pages_as_images(pdf_path, page_map, Path(tmp_dir), dpi=dpi, workers=os.cpu_count() or 1,
+                                          crop_patterns=patterns)
+        figure_images: dict[str, Path | None] = {}
+        for fig_key, tmp_png in rendered.items():
+            if tmp_png is None:
+                figure_images[fig_key] = None
+                continue
+            final_png = figures_dir / tmp_png.name
+            cache.publish(tmp_png, final_png)
+            figure_images[fig_key] = final_png
+    with cache.output(md_path) as tmp:
+        build_markdown(Path(tmp), figure_images)
+    outputs = [md_path] + [p for p in figure_images.values() if p is not None]
+    cache.record("demarche_uml", key, outputs)
 
 if __name__ == "__main__":
-    main()
+    instrument.from_argv(sys.argv[1:])
+    main(force="--force" in sys.argv[1:])
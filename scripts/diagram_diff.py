@@ -0,0 +1,389 @@
+"""
+Structural diff and incremental patching of .drawio files.
+
+Two versions of a diagram are compared page by page through an id index (one
+dict per page) and the geometry columns of their CellTables, in a single pass
+over each version. The result is a minimal patch: cells added (with the cell
+they follow, to keep z-order), removed or updated (only the changed attributes,
+geometry or edge points). apply_patch() edits the existing file in place of a
+full rewrite: pages without changes, compressed ones included, are copied as is
+and unchanged cells keep their exact serialization.
+
+Ids must be stable across regenerations for the diff to stay small: build the
+models with DrawIOBuilder(stable_ids=True) (see act.StableIds).
+
+    python diagram_diff.py ancien.drawio nouveau.drawio            # affiche le diff
+    python diagram_diff.py ancien.drawio nouveau.drawio --apply    # patche ancien.drawio
+"""
+from __future__ import annotations
+
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from act import DeflateSink, PAGE_MODEL_ATTRS
+from drawio_model import KIND_EDGE, KIND_VERTEX, CellTable
+from drawio_reader import WRAPPER_TAGS, decompress_diagram, page_tables
+
+def _cell_state(table: CellTable, r: int) -> tuple[dict, dict | None, list | None]:
+    attrib, geometry = table.cell_xml(r)
+    points = table.points.get(r)
+    return attrib, geometry, ([list(p) for p in points] if points else None)
+
+def diff_tables(old: CellTable, new: CellTable, page: str | None = None) -> list[dict]:
+    """Operations turning page `old` into page `new`, in new z-order."""
+    page = new.name if page is None else page
+    ops: list[dict] = []
+    old_index = old.index
+    old_kind = old.kind
+    seen = set()
+    anchor = None  # dernière cellule (existante ou ajoutée) dans l'ordre de `new`
+    for r in new.order:
+        id_ = new.ids[r]
+        seen.add(id_)
+        o = old_index.get(id_)
+        if o is None or old_kind[o] < 0:
+            attrib, geometry, points = _cell_state(new, r)
+            op = {"op": "add", "page": page, "id": id_, "after": anchor, "cell": attrib, "geometry": geometry}
+            if points:
+                op["points"] = points
+            if r in new.wrappers:
+                op["wrapper"] = list(new.wrappers[r])
+            ops.append(op)
+        else:
+            # Comparaison rapide des colonnes avant de reconstruire les attributs
+            same_geo = (old.x[o], old.y[o], old.w[o], old.h[o]) == (new.x[r], new.y[r], new.w[r], new.h[r]) or (
+                new.kind[r] not in (KIND_VERTEX, KIND_EDGE))
+            if (same_geo and old.labels[o] == new.labels[r] and old.style_of(o) == new.style_of(r)
+                    and old.kind[o] == new.kind[r] and old.ref_id(old.parent[o]) == new.ref_id(new.parent[r])
+                    and old.ref_id(old.source[o]) == new.ref_id(new.source[r])
+                    and old.ref_id(old.target[o]) == new.ref_id(new.target[r])
+                    and old.extra.get(o) == new.extra.get(r) and old.points.get(o) == new.points.get(r)
+                    and old.wrappers.get(o) == new.wrappers.get(r)):
+                anchor = id_
+                continue
+            old_attrib, old_geo, old_points = _cell_state(old, o)
+            attrib, geometry, points = _cell_state(new, r)
+            changed = {k: v for k, v in attrib.items() if old_attrib.get(k) != v}
+            changed.update({k: None for k in old_attrib if k not in attrib})
+            op = {"op": "update", "page": page, "id": id_}
+            if changed:
+                op["cell"] = changed
+            if geometry != old_geo:
+                op["geometry"] = geometry
+            if points != old_points:
+                op["points"] = points
+            if old.wrappers.get(o) != new.wrappers.get(r):
+                op["wrapper"] = list(new.wrappers[r]) if r in new.wrappers else None
+            if len(op) > 3:
+                ops.append(op)
+        anchor = id_
+    for o in old.order:
+        id_ = old.ids[o]
+        if id_ not in seen:
+            ops.append({"op": "remove", "page": page, "id": id_})
+    return ops
+
+_RANK = re.compile(r"^\d+ - ")
+
+def _page_keys(tables: list[CellTable]) -> list[tuple[str, int]]:
+    """Page identity: name without its "NN - " rank (see act.StableIds), and its rank among homonyms."""
+    seen: dict[str, int] = {}
+    keys = []
+    for table in tables:
+        title = _RANK.sub("", table.name, count=1)
+        keys.append((title, seen.get(title, 0)))
+        seen[title] = keys[-1][1] + 1
+    return keys
+
+def diff(old_source, new_source) -> list[dict]:
+    """
+    Patch from `old_source` to `new_source` (anything accepted by
+    drawio_reader.page_tables). Pages are matched by name without their
+    "NN - " rank: inserting or moving a page gives rename_page/order_pages
+    operations, not a rewrite of the following pages. Cell operations name
+    pages as in `new_source`.
+    """
+    old_tables = page_tables(old_source)
+    new_tables = page_tables(new_source)
+    old_pages = dict(zip(_page_keys(old_tables), old_tables))
+    new_keys = _page_keys(new_tables)
+    ops: list[dict] = []
+    page_ops: list[dict] = []
+    order = [t.name for t in old_tables]
+    for key, table in zip(new_keys, new_tables):
+        old = old_pages.get(key)
+        if old is None:
+            page_ops.append({"op": "add_page", "page": table.name})
+            order.append(table.name)
+            old = CellTable(table.name)
+        elif old.name != table.name:
+            page_ops.append({"op": "rename_page", "page": old.name, "name": table.name})
+            order[order.index(old.name)] = table.name
+        ops.extend(diff_tables(old, table))
+    kept = set(new_keys)
+    for key, table in old_pages.items():
+        if key not in kept:
+            page_ops.append({"op": "remove_page", "page": table.name})
+            order.remove(table.name)
+    wanted = [t.name for t in new_tables]
+    if order != wanted:
+        page_ops.append({"op": "order_pages", "pages": wanted})
+    return page_ops + ops
+
+# --- Application ----------------------------------------------------------------------
+
+def _set_geometry(cell: ET.Element, geometry: dict | None, points):
+    geo = cell.find("mxGeometry")
+    if geometry is None:
+        if geo is not None:
+            cell.remove(geo)
+        return
+    if geo is None:
+        geo = ET.SubElement(cell, "mxGeometry")
+    array = geo.find("Array")
+    geo.attrib.clear()
+    geo.attrib.update(geometry)
+    if points is not None:
+        if array is not None:
+            geo.remove(array)
+            array = None
+        if points:
+            array = ET.SubElement(geo, "Array", attrib={"as": "points"})
+            for x, y in points:
+                ET.SubElement(array, "mxPoint", attrib={"x": f"{x:g}", "y": f"{y:g}"})
+
+def _wrap(cell: ET.Element, wrapper) -> ET.Element:
+    """Put `cell` inside a (tag, attributes) <UserObject>/<object>, which takes its id and value."""
+    tag, attrs = wrapper
+    elem = ET.Element(tag, attrib={"label": cell.attrib.pop("value", ""), **attrs, "id": cell.attrib.pop("id")})
+    elem.append(cell)
+    return elem
+
+def _rewrap(elem: ET.Element, wrapper) -> ET.Element:
+    """Change, add or (wrapper None) remove the <UserObject>/<object> of an existing cell."""
+    if elem.tag not in WRAPPER_TAGS:
+        return elem if wrapper is None else _wrap(elem, wrapper)
+    cell = elem.find("mxCell")
+    if wrapper is None:
+        attrib = {"id": elem.get("id"), "value": elem.get("label", ""), **cell.attrib}
+        cell.attrib.clear()
+        cell.attrib.update(attrib)
+        cell.tail = elem.tail
+        return cell
+    tag, attrs = wrapper
+    attrib = {"label": elem.get("label", ""), **attrs, "id": elem.get("id")}
+    elem.tag = tag
+    elem.attrib.clear()
+    elem.attrib.update(attrib)
+    return elem
+
+def _new_cell(op: dict) -> ET.Element:
+    cell = ET.Element("mxCell", attrib=op["cell"])
+    _set_geometry(cell, op.get("geometry"), op.get("points", ()))
+    return _wrap(cell, op["wrapper"]) if op.get("wrapper") else cell
+
+def _update_cell(elem: ET.Element, op: dict) -> ET.Element:
+    """Apply an update op to a cell element; returns the element to keep (it differs if the wrapper changed)."""
+    if "wrapper" in op:
+        elem = _rewrap(elem, op["wrapper"])
+    cell = elem.find("mxCell") if elem.tag in WRAPPER_TAGS else elem
+    for key, value in op.get("cell", {}).items():
+        # Cellule enveloppée par un UserObject: le libellé et l'id vivent sur l'enveloppe
+        target = elem if elem is not cell and key in ("id", "value") else cell
+        key = "label" if target is elem and elem is not cell and key == "value" else key
+        if value is None:
+            target.attrib.pop(key, None)
+        else:
+            target.set(key, value)
+    if "geometry" in op or "points" in op:
+        old_geo = cell.find("mxGeometry")
+        geometry = op["geometry"] if "geometry" in op else (dict(old_geo.attrib) if old_geo is not None else None)
+        _set_geometry(cell, geometry, op.get("points"))
+    return elem
+
+def _patch_root(root: ET.Element, ops: list[dict], indent: str | None = None):
+    """
+    Apply the cell operations of one page to its <root>, in one pass over its
+    children. With `indent`, only the new and modified cells are (re)indented.
+    """
+    removed = {op["id"] for op in ops if op["op"] == "remove"}
+    updates = {op["id"]: op for op in ops if op["op"] == "update"}
+    after: dict[str | None, list[ET.Element]] = {}
+    for op in ops:
+        if op["op"] == "add":
+            after.setdefault(op["after"], []).append(_new_cell(op))
+
+    children: list[ET.Element] = []
+
+    def place(anchor):
+        # Itératif: une longue suite d'ajouts s'ancre chacun sur le précédent
+        stack = list(reversed(after.pop(anchor, ())))
+        while stack:
+            cell = stack.pop()
+            children.append(cell)
+            stack.extend(reversed(after.pop(cell.get("id"), ())))
+
+    place(None)
+    for elem in list(root):
+        id_ = elem.get("id")
+        if id_ in removed:
+            continue
+        if id_ in updates:
+            elem = _update_cell(elem, updates[id_])
+            if indent is not None:
+                ET.indent(elem, space=indent, level=4)
+        children.append(elem)
+        place(id_)
+    for cells in after.values():  # ancre introuvable: en fin de page
+        children.extend(cells)
+    if indent is not None:
+        sep = "\n" + indent * 4
+        for cell in children:
+            if cell.tail is None and len(cell):
+                ET.indent(cell, space=indent, level=4)  # cellule ajoutée
+            if cell.tail != sep:
+                cell.tail = sep
+        if children:
+            children[-1].tail = "\n" + indent * 3
+    root[:] = children
+
+def apply_patch(path: str | Path, ops: list[dict], out_path: str | Path | None = None) -> bool:
+    """
+    Apply `ops` to the .drawio file `path` (written to `out_path`, by default in
+    place and atomically). Returns False, without writing, for an empty patch.
+    """
+    if not ops:
+        return False
+    path = Path(path)
+    out_path = path if out_path is None else Path(out_path)
+    tree = ET.parse(path)
+    mxfile = tree.getroot()
+    by_page: dict[str, list[dict]] = {}
+    for op in ops:
+        by_page.setdefault(op.get("page"), []).append(op)
+
+    # Pages: retraits et renommages désignent les pages d'origine (les renommages peuvent s'échanger)
+    pages = {diagram.get("name"): diagram for diagram in mxfile.findall("diagram")}
+    added = []
+    for op in ops:
+        if op["op"] == "remove_page":
+            mxfile.remove(pages[op["page"]])
+        elif op["op"] == "rename_page":
+            pages[op["page"]].set("name", op["name"])
+        elif op["op"] == "add_page":
+            diagram = ET.Element("diagram", attrib={"name": op["page"]})
+            model = ET.SubElement(diagram, "mxGraphModel", attrib=PAGE_MODEL_ATTRS)
+            ET.SubElement(model, "root")
+            _append_page(mxfile, diagram)
+            added.append(diagram)
+    for op in ops:
+        if op["op"] == "order_pages":
+            _order_pages(mxfile, op["pages"])
+
+    for diagram in mxfile.findall("diagram"):
+        page_ops = [op for op in by_page.get(diagram.get("name"), ()) if op["op"] in ("add", "remove", "update")]
+        if not page_ops:
+            continue  # page inchangée: recopiée telle quelle, compressée ou non
+        model = diagram.find("mxGraphModel")
+        compressed = model is None
+        if compressed:
+            model = ET.fromstring(decompress_diagram(diagram.text or ""))
+        root = model.find("root")
+        _patch_root(root, page_ops, None if compressed else "  ")
+        if compressed:
+            diagram.text = _compress(model)
+    for diagram in added:
+        ET.indent(diagram, space="  ", level=1)
+
+    fd, tmp = tempfile.mkstemp(dir=out_path.parent, prefix=f".{out_path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        with open(tmp, "wb") as f:
+            tree.write(f, encoding="utf-8", xml_declaration=True)
+            if _ends_with_newline(path):
+                f.write(b"\n")   # ElementTree n'écrit pas la fin de ligne finale de la source
+        # mkstemp crée en 0600: droits de la cible, ou du fichier source pour une nouvelle sortie
+        os.chmod(tmp, (out_path if out_path.exists() else path).stat().st_mode & 0o777)
+        os.replace(tmp, out_path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return True
+
+def _ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if not f.tell():
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+def _append_page(mxfile: ET.Element, diagram: ET.Element):
+    children = list(mxfile)
+    if children:
+        # Même indentation que les pages existantes
+        diagram.tail = children[-1].tail
+        children[-1].tail = children[-2].tail if len(children) > 1 else mxfile.text
+    mxfile.append(diagram)
+
+def _order_pages(mxfile: ET.Element, names: list[str]):
+    children = list(mxfile)
+    by_name = {c.get("name"): c for c in children if c.tag == "diagram"}
+    ordered = [by_name.pop(name) for name in names]
+    ordered += [c for c in children if c.tag != "diagram" or c.get("name") in by_name]
+    tails = [c.tail for c in children]
+    mxfile[:] = ordered
+    for c, tail in zip(ordered, tails):
+        c.tail = tail
+
+def _compress(model: ET.Element) -> str:
+    out = io.StringIO()
+    sink = DeflateSink(out)
+    ET.ElementTree(model).write(sink, encoding="unicode")
+    sink.close()
+    return out.getvalue()
+
+def update_file(path: str | Path, new_source) -> list[dict]:
+    """Bring the .drawio file `path` up to date with `new_source`, writing only if something changed."""
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(path)
+    ops = diff(path, new_source)
+    apply_patch(path, ops)
+    return ops
+
+def summary(ops: list[dict]) -> str:
+    counts: dict[str, int] = {}
+    for op in ops:
+        counts[op["op"]] = counts.get(op["op"], 0) + 1
+    if not counts:
+        return "aucune différence"
+    return ", ".join(f"{n} {kind}" for kind, n in sorted(counts.items()))
+
+def main(argv: list[str]) -> int:
+    args = [a for a in argv if not a.startswith("--")]
+    if len(args) != 2:
+        print("Usage: python diagram_diff.py <ancien.drawio> <nouveau.drawio> [--apply] [--json]")
+        return 2
+    ops = diff(args[0], args[1])
+    if "--json" in argv:
+        json.dump(ops, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    else:
+        for op in ops:
+            fields = ", ".join(k for k in ("cell", "geometry", "points") if k in op)
+            target = op.get("id") or op.get("name", "")
+            print(f"{op['op']:<12} {op.get('page', '')}  {target}  {fields}".rstrip())
+        print(summary(ops))
+    if "--apply" in argv and apply_patch(args[0], ops):
+        print(f"Fichier patché: {args[0]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,275 @@
+"""
+Compact, column-oriented cell store for draw.io pages.
+
+CellTable keeps one row per mxCell in parallel arrays (kind, parent/source/target
+row references, interned style ids, numeric geometry) instead of one ElementTree
+Element pair per shape. XML is only produced when a page is written.
+"""
+from __future__ import annotations
+
+from array import array
+from math import isnan
+
+from act import DrawIOStreamWriter, StableIds
+from styles import NAMED_STYLES_ATTR, STYLES
+
+KIND_MISSING = -1  # id referenced (parent/source/target) but not defined (yet)
+KIND_CELL = 0      # root, layer or group without geometry
+KIND_VERTEX = 1
+KIND_EDGE = 2
+
+NO_REF = -1
+NAN = float("nan")
+
+def _num(v: float) -> str:
+    # 80.0 -> "80" pour retrouver la sortie de DrawIOBuilder (str(int))
+    return str(int(v)) if v.is_integer() else repr(v)
+
+class StylePool:
+    """Interned style strings, shared by every page of a builder."""
+    __slots__ = ("strings", "index")
+
+    def __init__(self):
+        self.strings: list[str] = [""]
+        self.index: dict[str, int] = {"": 0}
+
+    def intern(self, style: str) -> int:
+        sid = self.index.get(style)
+        if sid is None:
+            sid = len(self.strings)
+            self.strings.append(style)
+            self.index[style] = sid
+        return sid
+
+class CellTable:
+    """
+    One draw.io page as parallel columns. Rows are allocated the first time an id
+    is seen, so forward references (an edge written before its target) resolve in
+    a single pass; `order` keeps the definition order used when writing.
+    """
+    __slots__ = (
+        "name", "pool", "ids", "index", "order", "kind", "parent", "source", "target",
+        "style", "labels", "x", "y", "w", "h", "extra", "wrappers", "points", "compressed", "named_styles",
+    )
+
+    def __init__(self, name: str = "", pool: StylePool | None = None):
+        self.name = name
+        self.pool = pool if pool is not None else StylePool()
+        self.ids: list[str] = []
+        self.index: dict[str, int] = {}
+        self.order = array("q")
+        self.kind = array("b")
+        self.parent = array("q")
+        self.source = array("q")
+        self.target = array("q")
+        self.style = array("q")
+        self.labels: list[str] = []
+        self.x = array("d")
+        self.y = array("d")
+        self.w = array("d")
+        self.h = array("d")
+        self.extra: dict[int, dict[str, str]] = {}  # attributs hors schéma, rares
+        # <UserObject>/<object> englobant la cellule: (balise, attributs hors id/label)
+        self.wrappers: dict[int, tuple[str, dict[str, str]]] = {}
+        # Points de passage des arêtes (mxGeometry/Array as="points")
+        self.points: dict[int, list[tuple[float, float]]] = {}
+        self.compressed: bool | None = None  # None: défaut du writer
+        # Styles en références "nom;surcharges;" du registre (fichier marqué NAMED_STYLES_ATTR)
+        self.named_styles = False
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def row(self, id_: str) -> int:
+        """Row of `id_`, allocating a KIND_MISSING placeholder if it is unknown."""
+        r = self.index.get(id_)
+        if r is None:
+            r = len(self.ids)
+            self.ids.append(id_)
+            self.index[id_] = r
+            self.kind.append(KIND_MISSING)
+            for col in (self.parent, self.source, self.target):
+                col.append(NO_REF)
+            self.style.append(0)
+            self.labels.append("")
+            for col in (self.x, self.y, self.w, self.h):
+                col.append(NAN)
+        return r
+
+    def _ref(self, id_: str | None) -> int:
+        return NO_REF if id_ is None else self.row(id_)
+
+    def add(self, id_: str, kind: int, value: str = "", style: str = "", parent: str | None = None,
+            source: str | None = None, target: str | None = None, geometry=None, extra=None) -> int:
+        r = self.row(id_)
+        if self.kind[r] != KIND_MISSING:
+            raise ValueError(f"Identifiant de cellule en double: {id_!r}")
+        self.kind[r] = kind
+        self.labels[r] = value
+        self.style[r] = self.pool.intern(style)
+        self.parent[r] = self._ref(parent)
+        self.source[r] = self._ref(source)
+        self.target[r] = self._ref(target)
+        if geometry is not None:
+            self.set_geometry(r, *geometry)
+        if extra:
+            self.extra[r] = dict(extra)
+        self.order.append(r)
+        return r
+
+    def set_geometry(self, r: int, x, y, w, h):
+        self.x[r] = x
+        self.y[r] = y
+        self.w[r] = w
+        self.h[r] = h
+
+    def geometry(self, r: int) -> tuple[float, float, float, float]:
+        return self.x[r], self.y[r], self.w[r], self.h[r]
+
+    def style_of(self, r: int) -> str:
+        return self.pool.strings[self.style[r]]
+
+    def ref_id(self, ref: int) -> str | None:
+        return None if ref == NO_REF else self.ids[ref]
+
+    def absolute(self) -> tuple[list[float], list[float]]:
+        """Absolute x/y of every row: vertex coordinates are relative to their parent vertex."""
+        n = len(self.ids)
+        ax = [0.0] * n
+        ay = [0.0] * n
+        done = bytearray(n)
+        kind, parent, xs, ys = self.kind, self.parent, self.x, self.y
+        for r in range(n):
+            chain = []
+            p = r
+            while p != NO_REF and not done[p]:
+                chain.append(p)
+                p = parent[p]
+                if len(chain) > n:
+                    raise ValueError(f"Cycle de parents autour de la cellule {self.ids[r]!r}")
+            for c in reversed(chain):
+                p = parent[c]
+                ox, oy = (ax[p], ay[p]) if p != NO_REF and kind[p] == KIND_VERTEX else (0.0, 0.0)
+                x, y = xs[c], ys[c]
+                ax[c] = ox + (0.0 if isnan(x) else x)
+                ay[c] = oy + (0.0 if isnan(y) else y)
+                done[c] = 1
+        return ax, ay
+
+    def missing(self) -> list[str]:
+        """Ids referenced by some cell but never defined."""
+        return [self.ids[r] for r in range(len(self.ids)) if self.kind[r] == KIND_MISSING]
+
+    def cell_xml(self, r: int) -> tuple[dict, dict | None]:
+        """Attributes of row `r` as (mxCell attrib, mxGeometry attrib or None)."""
+        kind = self.kind[r]
+        attrib = {"id": self.ids[r]}
+        if kind in (KIND_VERTEX, KIND_EDGE):
+            attrib["value"] = self.labels[r]
+            attrib["style"] = self.style_of(r)
+            attrib["vertex" if kind == KIND_VERTEX else "edge"] = "1"
+        else:
+            if self.labels[r]:
+                attrib["value"] = self.labels[r]
+            if self.style[r]:
+                attrib["style"] = self.style_of(r)
+        for key, col in (("parent", self.parent), ("source", self.source), ("target", self.target)):
+            if col[r] != NO_REF:
+                attrib[key] = self.ids[col[r]]
+        if r in self.extra:
+            attrib.update(self.extra[r])
+        if kind == KIND_EDGE:
+            geometry = {"relative": "1"}
+        elif kind == KIND_VERTEX:
+            geometry = {}
+        else:
+            return attrib, None
+        for key, col in (("x", self.x), ("y", self.y), ("width", self.w), ("height", self.h)):
+            if not isnan(col[r]):
+                geometry[key] = _num(col[r])
+        geometry["as"] = "geometry"
+        return attrib, geometry
+
+    def write(self, writer: DrawIOStreamWriter, style_map=None):
+        """
+        Write the page (cells 0 and 1 included) through a stream writer; cells read
+        from a <UserObject>/<object> are written back inside it (see wrappers).
+        `style_map` optionally rewrites style strings, e.g. STYLES.to_ref.
+        """
+        writer.begin_page(self.name, self.compressed)
+        for r in self.order:
+            attrib, geometry = self.cell_xml(r)
+            if style_map is not None and "style" in attrib:
+                attrib["style"] = style_map(attrib["style"])
+            writer.write_cell(attrib, geometry, self.points.get(r), self.wrappers.get(r))
+
+class CompactDrawIOBuilder:
+    """
+    Drop-in replacement for act.DrawIOBuilder backed by CellTables: same
+    add_page/add_vertex/add_edge signatures and ids, XML built only by save().
+    """
+    def __init__(self, stable_ids: bool = False, route: bool = False):
+        self.id_counter = 2  # 0=root, 1=layer reserved
+        self.page_index = 0
+        self.route = route  # router les arêtes (router.py) avant d'écrire
+        self.pool = StylePool()
+        self.pages: list[CellTable] = []
+        self.stable_ids = StableIds() if stable_ids else None
+        self._page_names: dict[CellTable, str] = {}
+
+    def _next_id(self) -> str:
+        self.id_counter += 1
+        return str(self.id_counter)
+
+    def add_page(self, name: str, compressed: bool | None = None) -> CellTable:
+        self.page_index += 1
+        table = CellTable(f"{self.page_index:02d} - {name}", self.pool)
+        table.compressed = compressed
+        self._page_names[table] = name
+        # Root + Layer
+        table.add("0", KIND_CELL)
+        table.add("1", KIND_CELL, parent="0")
+        self.pages.append(table)
+        return table
+
+    def add_vertex(self, root: CellTable, x, y, w, h, label, style, parent="1"):
+        vid = self._next_id() if self.stable_ids is None else self.stable_ids.vertex(self._page_names[root], label, style)
+        root.add(vid, KIND_VERTEX, label, style, parent=parent, geometry=(x, y, w, h))
+        return vid
+
+    def add_edge(self, root: CellTable, source_id, target_id, label="", style=STYLES["flow"]):
+        eid = self._next_id() if self.stable_ids is None else self.stable_ids.edge(self._page_names[root], source_id, target_id, label)
+        root.add(eid, KIND_EDGE, label, style, parent="1", source=source_id, target=target_id)
+        return eid
+
+    def save(self, path: str, indent: str | None = "  ", named_styles: bool = False, compressed: bool = False):
+        """
+        named_styles=True writes "name;overrides;" references to the shared
+        stylesheet (STYLES.write_stylesheet) instead of full style strings, and
+        marks <mxfile> with NAMED_STYLES_ATTR so readers know to expand them.
+        compressed=True deflates the pages whose add_page() did not choose otherwise.
+        """
+        style_map = STYLES.to_ref if named_styles else None
+        attrs = {"host": "app.diagrams.net", NAMED_STYLES_ATTR: "1"} if named_styles else None
+        if self.route:
+            import router
+            router.route(self)
+        with DrawIOStreamWriter(path, indent, compressed=compressed, mxfile_attrs=attrs) as writer:
+            for table in self.pages:
+                table.write(writer, style_map)
+        return path
+
+    def flush(self, writer: DrawIOStreamWriter, style_map=None):
+        """
+        Write the pages added so far through `writer`, then drop them: a
+        generator producing many pages keeps only the current one in memory.
+        Ids keep counting, so later pages do not reuse them.
+        """
+        if self.route:
+            import router
+            router.route(self)
+        for table in self.pages:
+            table.write(writer, style_map)
+        self.pages.clear()
+        self._page_names.clear()
+        self.pool = StylePool()   # styles propres à ces pages (ancrages des messages...)
@@ -0,0 +1,231 @@
+"""
+Streaming reader for .drawio files.
+
+Pages and cells are read with iterparse into the CellTables used by the builders
+(drawio_model.py), clearing each element once consumed, so no full DOM is built.
+<UserObject>/<object> wrappers are unwrapped: their id and label become the cell's,
+their other attributes go to CellTable.wrappers. Compressed pages (deflate + base64
+<diagram> text, draw.io's default on save) are only inflated and parsed when their
+cells are first accessed.
+
+    python drawio_reader.py diagrammes/*.drawio   # résumé par page
+"""
+from __future__ import annotations
+
+import base64
+import sys
+import xml.etree.ElementTree as ET
+import zlib
+from pathlib import Path
+from urllib.parse import unquote
+
+from drawio_model import KIND_CELL, KIND_EDGE, KIND_VERTEX, CellTable, StylePool
+from styles import NAMED_STYLES_ATTR
+
+WRAPPER_TAGS = ("UserObject", "object")
+_CELL_KEYS = {"id", "value", "style", "vertex", "edge", "parent", "source", "target"}
+
+def decompress_diagram(text: str) -> str:
+    """<diagram> payload -> mxGraphModel XML (base64, raw deflate, then URI-decoding)."""
+    data = base64.b64decode(text.strip())
+    return unquote(zlib.decompress(data, -15).decode("utf-8"))
+
+def _float(value: str | None, default: float) -> float:
+    return default if value is None else float(value)
+
+class _CellCollector:
+    """Turns end events of mxCell / wrapper elements into CellTable rows."""
+
+    def __init__(self, table: CellTable):
+        self.table = table
+        self.wrapper: ET.Element | None = None
+
+    def start(self, elem: ET.Element):
+        if elem.tag in WRAPPER_TAGS:
+            self.wrapper = elem
+
+    def end(self, elem: ET.Element) -> bool:
+        """Return True when `elem` has been consumed and can be cleared."""
+        if elem.tag == "mxCell":
+            if self.wrapper is None:
+                self._add(elem, elem.attrib, None)
+                return True
+            return False  # consommé avec son UserObject
+        if elem.tag in WRAPPER_TAGS:
+            cell = elem.find("mxCell")
+            attrib = dict(cell.attrib) if cell is not None else {}
+            wrapper_attrs = {k: v for k, v in elem.attrib.items() if k not in ("id", "label")}
+            attrib["id"] = elem.get("id", attrib.get("id", ""))
+            attrib["value"] = elem.get("label", "")
+            self._add(cell, attrib, (elem.tag, wrapper_attrs))
+            self.wrapper = None
+            return True
+        return False
+
+    def _add(self, cell: ET.Element | None, attrib, wrapper):
+        t = self.table
+        kind = KIND_VERTEX if attrib.get("vertex") == "1" else KIND_EDGE if attrib.get("edge") == "1" else KIND_CELL
+        extra = {k: v for k, v in attrib.items() if k not in _CELL_KEYS}
+        r = t.add(attrib["id"], kind, attrib.get("value", ""), attrib.get("style", ""), attrib.get("parent"),
+                  attrib.get("source"), attrib.get("target"), extra=extra)
+        if wrapper is not None:
+            t.wrappers[r] = wrapper
+        geo = cell.find("mxGeometry") if cell is not None else None
+        if geo is None:
+            return
+        if kind == KIND_VERTEX:
+            t.set_geometry(r, _float(geo.get("x"), 0.0), _float(geo.get("y"), 0.0),
+                           _float(geo.get("width"), 0.0), _float(geo.get("height"), 0.0))
+        else:
+            t.set_geometry(r, _float(geo.get("x"), t.x[r]), _float(geo.get("y"), t.y[r]),
+                           _float(geo.get("width"), t.w[r]), _float(geo.get("height"), t.h[r]))
+        array = geo.find("Array")
+        if array is not None:
+            t.points[r] = [(_float(p.get("x"), 0.0), _float(p.get("y"), 0.0)) for p in array.iter("mxPoint")]
+
+class DiagramPage:
+    """One <diagram>: `cells` is a CellTable, parsed on first access for compressed pages."""
+    __slots__ = ("name", "id", "compressed", "named_styles", "_table", "_payload", "_pool")
+
+    def __init__(self, name: str, id_: str | None, pool: StylePool, named_styles: bool = False):
+        self.name = name
+        self.id = id_
+        self.compressed = False
+        self.named_styles = named_styles
+        self._table: CellTable | None = None
+        self._payload: str | None = None
+        self._pool = pool
+
+    def _new_table(self) -> CellTable:
+        table = CellTable(self.name, self._pool)
+        table.named_styles = self.named_styles
+        return table
+
+    @property
+    def cells(self) -> CellTable:
+        if self._table is None:
+            table = self._new_table()
+            if self._payload:
+                _parse_model_xml(decompress_diagram(self._payload), table)
+            self._table = table
+            self._payload = None
+        return self._table
+
+def _parse_model_xml(xml: str, table: CellTable):
+    parser = ET.XMLPullParser(events=("start", "end"))
+    collector = _CellCollector(table)
+    parser.feed(xml)
+    parser.close()
+    for event, elem in parser.read_events():
+        if event == "start":
+            collector.start(elem)
+        elif collector.end(elem):
+            elem.clear()
+
+def iter_pages(path, pool: StylePool | None = None):
+    """
+    Yield the DiagramPages of a .drawio file as they are read. Uncompressed pages
+    are filled while streaming; compressed ones keep their payload until `.cells`.
+    """
+    pool = pool if pool is not None else StylePool()
+    page: DiagramPage | None = None
+    collector: _CellCollector | None = None
+    root: ET.Element | None = None
+    depth_in_root = 0
+    named_styles = False
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if tag == "mxfile":
+                named_styles = elem.get(NAMED_STYLES_ATTR) == "1"
+            elif tag == "diagram":
+                page = DiagramPage(elem.get("name", ""), elem.get("id"), pool, named_styles)
+                collector = None
+            elif tag == "mxGraphModel" and page is not None:
+                page._table = page._new_table()
+                collector = _CellCollector(page._table)
+            elif tag == "root" and collector is not None:
+                root = elem
+            elif collector is not None:
+                if elem.tag in WRAPPER_TAGS or elem.tag == "mxCell":
+                    depth_in_root += 1
+                collector.start(elem)
+            continue
+        if tag == "diagram":
+            if page is not None and page._table is None:
+                page._payload = (elem.text or "").strip()
+                page.compressed = bool(page._payload)
+            elem.clear()
+            if page is not None:
+                yield page
+            page, collector, root = None, None, None
+        elif collector is not None and root is not None:
+            if tag in WRAPPER_TAGS or tag == "mxCell":
+                depth_in_root -= 1
+            if collector.end(elem) and depth_in_root == 0:
+                # Cellule de premier niveau consommée: on vide <root> pour ne pas garder le DOM
+                root.clear()
+
+def read_drawio(path, pool: StylePool | None = None) -> list[DiagramPage]:
+    return list(iter_pages(path, pool))
+
+def table_from_diagram(diagram: ET.Element, pool: StylePool | None = None) -> CellTable:
+    """CellTable of an ElementTree <diagram> (or <mxGraphModel> / <root>) already in memory."""
+    table = CellTable(diagram.get("name", ""), pool)
+    root = diagram if diagram.tag == "root" else diagram.find(".//root")
+    if root is None and (diagram.text or "").strip():
+        _parse_model_xml(decompress_diagram(diagram.text), table)
+        return table
+    collector = _CellCollector(table)
+    for elem in root if root is not None else ():
+        if elem.tag in WRAPPER_TAGS:
+            collector.start(elem)
+        collector.end(elem)
+    return table
+
+def page_tables(source) -> list[CellTable]:
+    """
+    Pages of `source`: DrawIOBuilder / CompactDrawIOBuilder, an <mxfile> or
+    <diagram> Element (state.build_drawio()), a CellTable or a .drawio path.
+    """
+    if isinstance(source, CellTable):
+        return [source]
+    if isinstance(source, (str, Path)):
+        return [page.cells for page in read_drawio(source)]
+    if hasattr(source, "pages"):      # CompactDrawIOBuilder
+        return list(source.pages)
+    if hasattr(source, "mxfile"):     # DrawIOBuilder
+        source = source.mxfile
+    if isinstance(source, ET.Element):
+        pool = StylePool()
+        diagrams = [source] if source.tag != "mxfile" else source.findall("diagram")
+        tables = [table_from_diagram(d, pool) for d in diagrams]
+        for table in tables:
+            table.named_styles = source.get(NAMED_STYLES_ATTR) == "1"
+        return tables
+    raise TypeError(f"Source de diagramme non supportée: {type(source).__name__}")
+
+def main(paths: list[str]) -> int:
+    status = 0
+    for path in paths:
+        try:
+            pages = read_drawio(path)
+        except (OSError, ET.ParseError, ValueError, zlib.error) as e:
+            print(f"{path}: illisible ({e})")
+            status = 1
+            continue
+        print(f"{path}: {len(pages)} page(s)")
+        for page in pages:
+            t = page.cells
+            vertices = sum(1 for r in t.order if t.kind[r] == KIND_VERTEX)
+            edges = sum(1 for r in t.order if t.kind[r] == KIND_EDGE)
+            flag = " (compressée)" if page.compressed else ""
+            print(f"  {page.name}{flag}: {len(t)} cellules, {vertices} sommets, {edges} arêtes, {len(t.wrappers)} UserObject")
+            missing = t.missing()
+            if missing:
+                print(f"    ids référencés mais absents: {', '.join(missing[:10])}")
+                status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
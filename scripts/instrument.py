@@ -0,0 +1,229 @@
+"""
+Opt-in timing and profiling instrumentation.
+
+Disabled by default: span() then returns a shared no-op context manager and
+count() returns at once, so the hooks left in the generators cost one global
+lookup. Once enabled (enable(), the UML_TRACE environment variable or --trace on
+act.py, state.py and demarche_uml.py), the trace records:
+
+- spans: named, nested phases (model build, layout, serialize, write, PDF text
+  extraction, rasterization...) with their arguments;
+- counters: cells per page, bytes written, pages read...;
+- memory samples: resident memory at the end of every span, and every
+  `interval` seconds from a background thread if requested.
+
+It is dumped as JSON (spans, counter totals, per-phase summary) or in Chrome's
+trace-event format (chrome://tracing, https://ui.perfetto.dev).
+
+    UML_TRACE=trace.json python act.py --force
+    python state.py --force --trace trace.chrome.json   # format Chrome d'après l'extension
+"""
+from __future__ import annotations
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+ENV_VAR = "UML_TRACE"
+
+_NULL = nullcontext()
+_tracer: Tracer | None = None
+
+def _rss_bytes() -> int | None:
+    """Current resident memory (Linux /proc), else the peak one (resource), else None."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start", "depth")
+
+    def __init__(self, tracer: Tracer, name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.depth = 0
+
+    def __enter__(self):
+        self.depth = self.tracer._depth
+        self.tracer._depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        t = self.tracer
+        t._depth -= 1
+        t.spans.append((self.name, self.start - t.origin, end - self.start, self.depth, threading.get_ident(), self.args))
+        if t.memory:
+            t._sample(end)
+        return False
+
+class Tracer:
+    def __init__(self, memory: bool = True, interval: float | None = None):
+        self.origin = time.perf_counter()
+        self.memory = memory
+        self.spans: list[tuple] = []      # (nom, début, durée, profondeur, thread, args)
+        self.counters: list[tuple] = []   # (nom, instant, valeur, args)
+        self.samples: list[tuple[float, int]] = []
+        self._depth = 0
+        self._stop: threading.Event | None = None
+        if memory and interval:
+            self._stop = threading.Event()
+            thread = threading.Thread(target=self._sampler, args=(interval,), name="instrument-memory", daemon=True)
+            thread.start()
+
+    def _sample(self, now: float | None = None):
+        rss = _rss_bytes()
+        if rss is not None:
+            self.samples.append(((time.perf_counter() if now is None else now) - self.origin, rss))
+
+    def _sampler(self, interval: float):
+        while not self._stop.wait(interval):
+            self._sample()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    def span(self, name: str, args: dict) -> _Span:
+        return _Span(self, name, args)
+
+    def count(self, name: str, value, args: dict):
+        self.counters.append((name, time.perf_counter() - self.origin, value, args))
+
+    def summary(self) -> dict:
+        """Per span name: calls, total and max seconds; per counter name: total."""
+        phases: dict[str, dict] = {}
+        for name, _, duration, *_ in self.spans:
+            p = phases.setdefault(name, {"calls": 0, "total_s": 0.0, "max_s": 0.0})
+            p["calls"] += 1
+            p["total_s"] += duration
+            p["max_s"] = max(p["max_s"], duration)
+        totals: dict[str, float] = {}
+        for name, _, value, _ in self.counters:
+            totals[name] = totals.get(name, 0) + value
+        result = {"phases": phases, "counters": totals}
+        if self.samples:
+            result["peak_rss_mb"] = max(rss for _, rss in self.samples) / (1 << 20)
+        return result
+
+    def to_json(self) -> dict:
+        return {
+            "summary": self.summary(),
+            "spans": [{"name": n, "start_s": s, "duration_s": d, "depth": depth, "thread": tid, "args": a}
+                      for n, s, d, depth, tid, a in sorted(self.spans, key=lambda sp: sp[1])],
+            "counters": [{"name": n, "at_s": t, "value": v, "args": a} for n, t, v, a in self.counters],
+            "memory": [{"at_s": t, "rss_bytes": rss} for t, rss in self.samples],
+        }
+
+    def to_chrome(self) -> dict:
+        """Trace-event format: complete events ("X") for spans, counter events ("C") for the rest."""
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": os.path.basename(sys.argv[0]) or "python"}}]
+        for name, start, duration, _, tid, args in self.spans:
+            events.append({"name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6,
+                           "pid": pid, "tid": tid, "args": args})
+        for name, at, value, args in self.counters:
+            series = args.get("page", name) if args else name
+            events.append({"name": name, "ph": "C", "ts": at * 1e6, "pid": pid, "args": {str(series): value}})
+        for at, rss in self.samples:
+            events.append({"name": "memory", "ph": "C", "ts": at * 1e6, "pid": pid, "args": {"rss_mb": rss / (1 << 20)}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: str, fmt: str | None = None) -> str:
+        """Write the trace to `path`; fmt "json" or "chrome" (default: chrome if the name contains "chrome")."""
+        if fmt is None:
+            fmt = "chrome" if "chrome" in os.path.basename(path) else "json"
+        if fmt not in ("json", "chrome"):
+            raise ValueError(f"Format de trace inconnu: {fmt!r} (attendu: json ou chrome)")
+        data = self.to_chrome() if fmt == "chrome" else self.to_json()
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+        return path
+
+# --- Interface du module: no-op tant que la trace n'est pas activée ----------------------
+
+def enabled() -> bool:
+    return _tracer is not None
+
+def enable(memory: bool = True, interval: float | None = None, dump_to: str | None = None) -> Tracer:
+    """Start tracing (idempotent); with `dump_to`, the trace is written at interpreter exit."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(memory, interval)
+    if dump_to:
+        atexit.register(_dump_at_exit, _tracer, dump_to)
+    return _tracer
+
+def disable() -> Tracer | None:
+    """Stop tracing and return the trace collected so far."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.stop()
+    return tracer
+
+def _dump_at_exit(tracer: Tracer, path: str):
+    tracer.stop()
+    tracer.dump(path)
+    print(f"Trace écrite: {path}", file=sys.stderr)
+
+def span(name: str, **args):
+    """Context manager timing the phase `name`."""
+    return _NULL if _tracer is None else _tracer.span(name, args)
+
+def count(name: str, value=1, **args):
+    """Record `value` for counter `name` (e.g. count("cells", 120, page="01 - ..."))."""
+    if _tracer is not None:
+        _tracer.count(name, value, args)
+
+def traced(name: str):
+    """Decorator: every call of the function is a span `name`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count_file(name: str, path, **args):
+    """Counter `name` with the size in bytes of the file `path` (if tracing and it exists)."""
+    if _tracer is not None:
+        try:
+            size = os.path.getsize(path)
+        except (OSError, TypeError):
+            return
+        _tracer.count(name, size, args)
+
+def from_argv(argv: list[str]) -> str | None:
+    """Enable tracing for "--trace <path>" in `argv`; returns the path."""
+    if "--trace" not in argv:
+        return None
+    i = argv.index("--trace")
+    if i + 1 >= len(argv):
+        raise SystemExit("--trace attend un chemin de fichier (trace.json ou trace.chrome.json)")
+    path = argv[i + 1]
+    enable(interval=0.05, dump_to=path)
+    return path
+
+if os.environ.get(ENV_VAR):
+    enable(interval=0.05, dump_to=os.environ[ENV_VAR])
@@ -0,0 +1,357 @@
+"""
+Automatic layout for draw.io pages: given vertices (sizes), edges and optionally
+swimlanes and parent/child nesting, compute positions instead of hard-coding them.
+
+layered_layout() is a Sugiyama-style layout: cycle breaking, longest-path ranks,
+barycenter crossing reduction with a bounded number of
+sweeps, then packed coordinates aligned on neighbours. Every step is linear or
+n log n in the size of the graph. Nodes with a lane are grouped in lane bands
+(page 04 of act.py); nodes with a parent are laid out inside it first and the
+parent is grown to fit (composite states of state.py). Child positions are
+relative to their parent, as draw.io expects.
+
+Long-running processes (render_service.py) can keep results in memory with
+enable_cache(): a graph with the same nodes, sizes, lanes and edges, whatever
+its labels, is then laid out once.
+"""
+from __future__ import annotations
+
+from array import array
+
+import instrument
+from build_cache import LRUCache
+from drawio_model import KIND_EDGE, KIND_VERTEX, NO_REF, CellTable
+
+NO_NODE = -1
+
+_cache: LRUCache | None = None
+
+class LayoutGraph:
+    __slots__ = ("ids", "index", "w", "h", "lane", "parent", "edges")
+
+    def __init__(self):
+        self.ids: list[str] = []
+        self.index: dict[str, int] = {}
+        self.w = array("d")
+        self.h = array("d")
+        self.lane: list[str | None] = []
+        self.parent = array("q")
+        self.edges: list[tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add_node(self, id_: str, w: float, h: float, lane: str | None = None, parent: str | None = None) -> int:
+        """Parents must be added before their children."""
+        if id_ in self.index:
+            raise ValueError(f"Nœud en double: {id_!r}")
+        n = len(self.ids)
+        self.ids.append(id_)
+        self.index[id_] = n
+        self.w.append(w)
+        self.h.append(h)
+        self.lane.append(lane)
+        self.parent.append(NO_NODE if parent is None else self.index[parent])
+        return n
+
+    def add_edge(self, source: str, target: str):
+        self.edges.append((self.index[source], self.index[target]))
+
+    def key(self) -> tuple:
+        """Hashable summary of everything the layout depends on."""
+        return (tuple(self.ids), self.w.tobytes(), self.h.tobytes(), tuple(self.lane), self.parent.tobytes(),
+                tuple(self.edges))
+
+class Layout:
+    """Result: positions[id] = (x, y, w, h), relative to the parent; lanes[name] = band rect."""
+    __slots__ = ("positions", "lanes", "width", "height")
+
+    def __init__(self):
+        self.positions: dict[str, tuple[float, float, float, float]] = {}
+        self.lanes: dict[str, tuple[float, float, float, float]] = {}
+        self.width = 0.0
+        self.height = 0.0
+
+def enable_cache(maxsize: int = 128) -> LRUCache:
+    """Keep the last `maxsize` layouts in memory (results are shared: treat them as read-only)."""
+    global _cache
+    if _cache is None or _cache.maxsize != maxsize:
+        _cache = LRUCache(maxsize)
+    return _cache
+
+def disable_cache():
+    global _cache
+    _cache = None
+
+@instrument.traced("layout")
+def layered_layout(graph: LayoutGraph, direction: str = "LR", node_gap: float = 40, rank_gap: float = 60,
+                   sweeps: int = 4, padding: float = 20, header: float = 30, lane_header: float = 26) -> Layout:
+    """
+    Lay out `graph`. direction "LR" places ranks left to right (activity flows of
+    act.py), "TB" top to bottom. Composite nodes are laid out bottom-up: their
+    children first (with `padding` and a `header` band for the title), then the
+    composite is sized to fit and placed like any other node of its level.
+    """
+    options = (direction, node_gap, rank_gap, sweeps, padding, header, lane_header)
+    if _cache is None:
+        return _layered_layout(graph, *options)
+    key = (graph.key(), options)
+    result = _cache.get(key)
+    if result is None:
+        result = _layered_layout(graph, *options)
+        _cache.put(key, result)
+    return result
+
+def _layered_layout(graph: LayoutGraph, direction: str, node_gap: float, rank_gap: float, sweeps: int,
+                    padding: float, header: float, lane_header: float) -> Layout:
+    if direction not in ("LR", "TB"):
+        raise ValueError(f"Direction inconnue: {direction!r} (LR ou TB)")
+    n = len(graph)
+    w, h = array("d", graph.w), array("d", graph.h)
+    children: list[list[int]] = [[] for _ in range(n)]
+    top: list[int] = []
+    depth = array("q", [0]) * n
+    for v in range(n):
+        p = graph.parent[v]
+        if p == NO_NODE:
+            top.append(v)
+        else:
+            children[p].append(v)
+            depth[v] = depth[p] + 1
+
+    # Arêtes ramenées au niveau où leurs extrémités sont sœurs (ancêtres sous le plus proche parent commun)
+    level_edges: dict[int, list[tuple[int, int]]] = {}
+    for s, t in graph.edges:
+        while depth[s] > depth[t]:
+            s = graph.parent[s]
+        while depth[t] > depth[s]:
+            t = graph.parent[t]
+        while graph.parent[s] != graph.parent[t]:
+            s, t = graph.parent[s], graph.parent[t]
+        if s != t:
+            level_edges.setdefault(graph.parent[s], []).append((s, t))
+
+    result = Layout()
+    rel: dict[int, tuple[float, float]] = {}
+    # Post-ordre itératif: un composite est traité après tous ses descendants
+    stack = [(v, False) for v in reversed(top)]
+    order: list[int] = []
+    while stack:
+        v, done = stack.pop()
+        if done:
+            order.append(v)
+        elif children[v]:
+            stack.append((v, True))
+            stack.extend((c, False) for c in children[v])
+    for v in order:
+        placed, lanes, width, height = _layout_level(children[v], level_edges.get(v, []), w, h, graph.lane,
+                                                     direction, node_gap, rank_gap, sweeps, lane_header)
+        for c, (x, y) in placed.items():
+            rel[c] = (x + padding, y + padding + header)
+        w[v] = max(w[v], width + 2 * padding)
+        h[v] = max(h[v], height + 2 * padding + header)
+
+    placed, lanes, width, height = _layout_level(top, level_edges.get(NO_NODE, []), w, h, graph.lane,
+                                                 direction, node_gap, rank_gap, sweeps, lane_header)
+    rel.update(placed)
+    for v in range(n):
+        x, y = rel[v]
+        result.positions[graph.ids[v]] = (x, y, w[v], h[v])
+    result.lanes = lanes
+    result.width, result.height = width, height
+    return result
+
+def _layout_level(nodes, edges, w, h, lanes, direction, node_gap, rank_gap, sweeps, lane_header):
+    """Sugiyama layout of one level (siblings). Returns ({node: (x, y)}, lane bands, width, height)."""
+    if not nodes:
+        return {}, {}, 0.0, 0.0
+    local = {v: i for i, v in enumerate(nodes)}
+    m = len(nodes)
+    # Axe des rangs (r) et axe de l'ordre dans un rang (o) selon la direction
+    r_size = [w[v] if direction == "LR" else h[v] for v in nodes]
+    o_size = [h[v] if direction == "LR" else w[v] for v in nodes]
+    lane_names: list[str] = []
+    lane_of: list[int] = []
+    lane_pos: dict[str | None, int] = {}
+    for v in nodes:
+        name = lanes[v]
+        if name not in lane_pos:
+            lane_pos[name] = len(lane_names)
+            lane_names.append(name)
+        lane_of.append(lane_pos[name])
+    use_lanes = any(name is not None for name in lane_names)
+
+    succ: list[list[int]] = [[] for _ in range(m)]
+    for s, t in edges:
+        succ[local[s]].append(local[t])
+
+    # 1) Suppression des cycles: arcs arrière d'un DFS itératif inversés
+    state = bytearray(m)  # 0 = non vu, 1 = en cours, 2 = fini
+    dag: list[tuple[int, int]] = []
+    for root in range(m):
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, iter(succ[root]))]
+        while stack:
+            u, it = stack[-1]
+            for t in it:
+                if state[t] == 1:
+                    dag.append((t, u))
+                elif state[t] == 0:
+                    dag.append((u, t))
+                    state[t] = 1
+                    stack.append((t, iter(succ[t])))
+                    break
+                else:
+                    dag.append((u, t))
+            else:
+                state[u] = 2
+                stack.pop()
+
+    # 2) Rangs par plus long chemin (ordre topologique de Kahn)
+    out: list[list[int]] = [[] for _ in range(m)]
+    indeg = [0] * m
+    for s, t in dag:
+        if s != t:
+            out[s].append(t)
+            indeg[t] += 1
+    rank = [0] * m
+    queue = [v for v in range(m) if indeg[v] == 0]
+    for u in queue:
+        for t in out[u]:
+            rank[t] = max(rank[t], rank[u] + 1)
+            indeg[t] -= 1
+            if indeg[t] == 0:
+                queue.append(t)
+
+    # 3) Voisinages entre rangs. Pas de nœuds factices: une arête longue relie directement
+    #    ses extrémités pour le calcul des barycentres, ce qui garde un coût en O(V + E)
+    up: list[list[int]] = [[] for _ in range(m)]
+    down: list[list[int]] = [[] for _ in range(m)]
+    for s in range(m):
+        for t in out[s]:
+            down[s].append(t)
+            up[t].append(s)
+
+    layers: list[list[int]] = [[] for _ in range(max(rank) + 1)]
+    # Ordre initial: ordre de parcours (BFS de Kahn), plus stable qu'un ordre arbitraire
+    for v in queue:
+        layers[rank[v]].append(v)
+
+    # 4) Réduction des croisements: barycentres, balayages alternés bornés
+    pos = [0.0] * m
+    for layer in layers:
+        for i, v in enumerate(layer):
+            pos[v] = i
+    for sweep in range(sweeps):
+        downward = sweep % 2 == 0
+        seq = layers[1:] if downward else layers[-2::-1]
+        for layer in seq:
+            for v in layer:
+                nbrs = up[v] if downward else down[v]
+                if nbrs:
+                    pos[v] = sum(pos[u] for u in nbrs) / len(nbrs)
+            layer.sort(key=lambda v: (lane_of[v], pos[v]))
+            for i, v in enumerate(layer):
+                pos[v] = i
+    if use_lanes:
+        layers[0].sort(key=lambda v: (lane_of[v], pos[v]))
+
+    # 5) Coordonnées le long des rangs
+    rank_start = []
+    rank_depth = []
+    acc = 0.0
+    for layer in layers:
+        rank_start.append(acc)
+        rank_depth.append(max((r_size[v] for v in layer), default=0.0))
+        acc += rank_depth[-1] + rank_gap
+    r_extent = acc - rank_gap
+
+    # 6) Coordonnées dans le rang: tassement puis alignement sur les voisins déjà placés
+    n_lanes = len(lane_names)
+    lane_span = [0.0] * n_lanes
+    for layer in layers:
+        used = [0.0] * n_lanes
+        for v in layer:
+            used[lane_of[v]] += o_size[v] + node_gap
+        for k in range(n_lanes):
+            lane_span[k] = max(lane_span[k], used[k])
+    lane_start = [0.0] * n_lanes
+    acc = 0.0
+    for k in range(n_lanes):
+        lane_start[k] = acc + (lane_header if use_lanes else 0.0)
+        acc = lane_start[k] + lane_span[k]
+    o_extent = acc
+
+    center = [0.0] * m
+    for i, layer in enumerate(layers):
+        cursor = {k: lane_start[k] for k in range(n_lanes)}
+        # Place réservée aux nœuds suivants du même couloir: un nœud tiré vers ses voisins
+        # ne doit pas pousser les suivants hors du couloir (ni au-delà de la hauteur)
+        after = [0.0] * m
+        rest = [0.0] * n_lanes
+        for v in reversed(layer):
+            after[v] = rest[lane_of[v]]
+            rest[lane_of[v]] += o_size[v] + node_gap
+        for v in layer:
+            k = lane_of[v]
+            lo = cursor[k]
+            hi = lane_start[k] + lane_span[k] - o_size[v] - node_gap - after[v]
+            want = lo
+            nbrs = up[v] if i else ()
+            if nbrs:
+                want = sum(center[u] for u in nbrs) / len(nbrs) - o_size[v] / 2
+            start = min(max(lo, want), max(lo, hi))
+            center[v] = start + o_size[v] / 2
+            cursor[k] = start + o_size[v] + node_gap
+
+    placed: dict[int, tuple[float, float]] = {}
+    for v in range(m):
+        r = rank_start[rank[v]] + (rank_depth[rank[v]] - r_size[v]) / 2
+        o = center[v] - o_size[v] / 2
+        placed[nodes[v]] = (r, o) if direction == "LR" else (o, r)
+
+    bands: dict[str, tuple[float, float, float, float]] = {}
+    if use_lanes:
+        for k, name in enumerate(lane_names):
+            if name is None:
+                continue
+            o0 = lane_start[k] - lane_header
+            span = lane_span[k] + lane_header
+            bands[name] = (0.0, o0, r_extent, span) if direction == "LR" else (o0, 0.0, span, r_extent)
+    width, height = (r_extent, o_extent) if direction == "LR" else (o_extent, r_extent)
+    return placed, bands, width, height
+
+def layout_table(table: CellTable, direction: str = "LR", **options) -> Layout:
+    """
+    Lay out the vertices of a CellTable in place: vertices whose parent is another
+    vertex are nested in it, edges come from source/target. Returns the Layout.
+    """
+    graph = LayoutGraph()
+    rows = [r for r in table.order if table.kind[r] == KIND_VERTEX]
+    vertex_rows = set(rows)
+    pending = list(rows)
+    # Parents avant enfants: les sommets dont le parent n'est pas encore ajouté attendent un tour
+    while pending:
+        waiting = []
+        for r in pending:
+            p = table.parent[r]
+            if p in vertex_rows and table.ids[p] not in graph.index:
+                waiting.append(r)
+                continue
+            w, h = table.w[r], table.h[r]
+            graph.add_node(table.ids[r], w if w == w else 120.0, h if h == h else 50.0,
+                           parent=table.ids[p] if p in vertex_rows else None)
+        if len(waiting) == len(pending):
+            raise ValueError("Cycle dans les relations parent/enfant")
+        pending = waiting
+    for r in table.order:
+        if table.kind[r] == KIND_EDGE and table.source[r] != NO_REF and table.target[r] != NO_REF:
+            s, t = table.ids[table.source[r]], table.ids[table.target[r]]
+            if s in graph.index and t in graph.index:
+                graph.add_edge(s, t)
+    result = layered_layout(graph, direction, **options)
+    for id_, geo in result.positions.items():
+        table.set_geometry(table.index[id_], *geo)
+    return result
@@ -0,0 +1,921 @@
+"""
+Compile the Mermaid / PlantUML diagrams of the markdown docs into .drawio pages.
+
+Sources scanned:
+
+- ```mermaid blocks: classDiagram, stateDiagram(-v2), sequenceDiagram;
+- ```plantuml blocks, and plain ``` blocks starting with @startuml: use case,
+  sequence, state and class diagrams;
+- the plantUmlData of .drawio files (PlantUML shapes inserted in draw.io).
+
+Each block is parsed into a small Diagram model (nodes, edges, or the events of
+a sequence), then drawn through act.DrawIOBuilder: class, state and use case
+diagrams are placed by layout.layered_layout, sequences are laid out as
+lifelines, messages, activations and combined fragments. Only the common
+subset of each dialect is supported; unknown lines are reported and skipped.
+
+Compiled pages are cached per block, in .md_compile/<hash>.xml, the hash
+covering the block source, its page name and this compiler: a docs build only
+recompiles the blocks that changed, and an output file whose content did not
+change is not rewritten.
+
+    python md_compile.py                          # *.md du dépôt -> diagrammes/<nom>.drawio
+    python md_compile.py class_diagram.md use_case.md diagrammes/atm_sequence.drawio -o diagrammes
+"""
+from __future__ import annotations
+
+import hashlib
+import html
+import json
+import re
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import instrument
+from act import DrawIOBuilder
+from layout import LayoutGraph, layered_layout
+from model_loader import ORIGIN
+from styles import STYLES
+
+CACHE_DIR = ".md_compile"
+OUT_DIR = "diagrammes"
+_ROOT = Path(__file__).resolve().parent.parent
+
+class DiagramError(ValueError):
+    pass
+
+# --- Modèle intermédiaire ---------------------------------------------------------------
+
+class Node:
+    __slots__ = ("id", "label", "kind", "stereotype", "attributes", "methods", "parent")
+
+    def __init__(self, id_: str, label: str, kind: str, parent: str | None = None):
+        self.id = id_
+        self.label = label
+        self.kind = kind   # class, state, initial, final, choice, fork, join, actor, usecase, boundary
+        self.stereotype: str | None = None
+        self.attributes: list[str] = []
+        self.methods: list[str] = []
+        self.parent = parent
+
+class Edge:
+    __slots__ = ("source", "target", "label", "kind", "multiplicity")
+
+    def __init__(self, source: str, target: str, label: str, kind: str, multiplicity=(None, None)):
+        self.source = source
+        self.target = target
+        self.label = label
+        self.kind = kind   # nom de style: association, inheritance, transition, include...
+        self.multiplicity = multiplicity
+
+class Diagram:
+    """A parsed block: nodes and edges, or participants and events for a sequence."""
+
+    def __init__(self, kind: str, direction: str = "TB"):
+        self.kind = kind   # class, state, usecase, sequence
+        self.direction = direction
+        self.title: str | None = None
+        self.nodes: dict[str, Node] = {}
+        self.edges: list[Edge] = []
+        self.events: list[tuple] = []   # séquence: ("message", a, b, texte, style, +b, -a), ("activate", p)...
+        self.warnings: list[str] = []
+
+    def node(self, id_: str, label: str | None = None, kind: str = "class", parent: str | None = None) -> Node:
+        n = self.nodes.get(id_)
+        if n is None:
+            n = self.nodes[id_] = Node(id_, id_ if label is None else label, kind, parent)
+        elif label is not None:
+            n.label = label
+        return n
+
+    def skip(self, line: str):
+        self.warnings.append(line)
+
+# --- Blocs --------------------------------------------------------------------------------
+
+class Block:
+    __slots__ = ("source", "line", "dialect", "text", "name")
+
+    def __init__(self, source: str, line: int, dialect: str, text: str, name: str):
+        self.source = source
+        self.line = line
+        self.dialect = dialect   # mermaid | plantuml
+        self.text = text
+        self.name = name
+
+_FENCE = re.compile(r"^(\s*)(`{3,}|~{3,})\s*(\w*)\s*$")
+_HEADING = re.compile(r"^#{1,6}\s+(.*?)\s*#*\s*$")
+
+def iter_markdown_blocks(path: str | Path):
+    """Mermaid / PlantUML blocks of a markdown file, named after their nearest heading."""
+    path = Path(path)
+    heading = path.stem
+    per_heading: dict[str, int] = {}
+    fence = None
+    for i, line in enumerate(path.read_text(encoding="utf-8").splitlines(), 1):
+        m = _FENCE.match(line)
+        if fence is None:
+            if m:
+                fence, lang, start, body = m.group(2), m.group(3).lower(), i, []
+                continue
+            h = _HEADING.match(line)
+            if h:
+                heading = re.sub(r"[*_`]", "", h.group(1)).strip() or heading
+            continue
+        if m and m.group(2).startswith(fence) and not m.group(3):
+            fence = None
+            text = "\n".join(l[len(m.group(1)):] if l.startswith(m.group(1)) else l for l in body).strip("\n")
+            dialect = lang if lang in ("mermaid", "plantuml", "puml") else (
+                "plantuml" if text.lstrip().startswith("@startuml") else None)
+            if dialect is not None:
+                n = per_heading[heading] = per_heading.get(heading, 0) + 1
+                name = heading if n == 1 else f"{heading} ({n})"
+                yield Block(str(path), start, "plantuml" if dialect == "puml" else dialect, text, name)
+            continue
+        body.append(line)
+
+def iter_drawio_blocks(path: str | Path):
+    """PlantUML sources embedded in a .drawio file (plantUmlData of its shapes)."""
+    path = Path(path)
+    k = 0
+    for elem in ET.parse(path).iter():
+        data = elem.get("plantUmlData")
+        if not data:
+            continue
+        try:
+            text = json.loads(data)["data"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        k += 1
+        yield Block(str(path), 0, "plantuml", text, path.stem if k == 1 else f"{path.stem} ({k})")
+
+def iter_blocks(path: str | Path):
+    return iter_drawio_blocks(path) if str(path).endswith(".drawio") else iter_markdown_blocks(path)
+
+# --- Analyse ------------------------------------------------------------------------------
+
+# Flèche de relation: tête gauche, trait (avec direction PlantUML facultative), tête droite
+_REL = re.compile(r"(?P<left><\||\*|o|<)?(?P<line>-+|\.+)(?:(?:up|down|left|right|u|d|l|r)(?:-+|\.+))?(?P<right>\|>|\*|o|>)?")
+_CLASS_REL = re.compile(
+    r'^(?P<a>[\w.~]+)\s*(?:"(?P<ma>[^"]*)")?\s*(?P<arrow>(?:<\||\*|o|<)?(?:-+|\.+)(?:(?:up|down|left|right|u|d|l|r)(?:-+|\.+))?(?:\|>|\*|o|>)?)'
+    r'\s*(?:"(?P<mb>[^"]*)")?\s*(?P<b>[\w.~]+)\s*(?::\s*(?P<label>.*))?$')
+
+def classify_arrow(arrow: str) -> tuple[str, bool]:
+    """Relation arrow -> (style name, swap): the source of the edge is the child / the whole / the client."""
+    m = _REL.fullmatch(arrow)
+    if m is None:
+        raise DiagramError(f"Flèche inconnue: {arrow!r}")
+    left, right, dashed = m.group("left"), m.group("right"), m.group("line")[0] == "."
+    if right == "|>" or left == "<|":
+        return ("realization" if dashed else "inheritance"), left == "<|"
+    if left == "*" or right == "*":
+        return "composition", left != "*"
+    if left == "o" or right == "o":
+        return "aggregation", left != "o"
+    if right == ">" or left == "<":
+        return ("dependency" if dashed else "association"), right != ">"
+    return ("dependency" if dashed else "link"), False
+
+def _clean(line: str, dialect: str) -> str:
+    line = line.strip()
+    if dialect == "mermaid":
+        return "" if line.startswith("%%") else line
+    return "" if line.startswith("'") else line
+
+def _lines(block_text: str, dialect: str):
+    in_comment = False
+    for raw in block_text.splitlines():
+        line = raw.strip()
+        if dialect == "plantuml":
+            # Commentaires multilignes /' ... '/
+            if in_comment:
+                in_comment = "'/" not in line
+                continue
+            if line.startswith("/'"):
+                in_comment = "'/" not in line[2:]
+                continue
+            if line.lower() in ("@startuml", "@enduml") or line.lower().startswith(("@startuml ", "skinparam", "hide ", "show ")):
+                continue
+        line = _clean(line, dialect)
+        if line:
+            yield line
+
+def detect_kind(text: str, dialect: str) -> str:
+    lines = list(_lines(text, dialect))
+    if dialect == "mermaid":
+        head = lines[0].split()[0] if lines else ""
+        kinds = {"classDiagram": "class", "stateDiagram": "state", "stateDiagram-v2": "state",
+                 "sequenceDiagram": "sequence"}
+        if head not in kinds:
+            raise DiagramError(f"Diagramme Mermaid non supporté: {head or '(vide)'}")
+        return kinds[head]
+    body = "\n".join(lines)
+    if re.search(r"\[\*\]|^state\s", body, re.M):
+        return "state"
+    if re.search(r"^usecase\s|^\(|^:[^:\n]+:|^[\w.\"]+\s*[-.]+(?:\w+[-.]+)?\|?>?\s*\(", body, re.M):
+        return "usecase"
+    if re.search(r"^(abstract\s+class|class|interface|enum)\s", body, re.M):
+        return "class"
+    if re.search(r"^(participant|actor|boundary|control|entity|database|collections|queue)\s|-+>", body, re.M):
+        return "sequence"
+    raise DiagramError("Diagramme PlantUML non reconnu (séquence, cas d'utilisation, états ou classes attendus)")
+
+def parse(text: str, dialect: str) -> Diagram:
+    kind = detect_kind(text, dialect)
+    lines = list(_lines(text, dialect))
+    if dialect == "mermaid":
+        lines = lines[1:]
+    parser = {"class": _parse_class, "state": _parse_state, "usecase": _parse_usecase, "sequence": _parse_sequence}[kind]
+    return parser(lines, dialect)
+
+def _direction(line: str, d: Diagram) -> bool:
+    low = line.lower()
+    if low in ("left to right direction", "direction lr", "direction rl"):
+        d.direction = "LR"
+    elif low in ("top to bottom direction", "direction tb", "direction td", "direction bt"):
+        d.direction = "TB"
+    elif low.startswith("title "):
+        d.title = line[6:].strip()
+    else:
+        return False
+    return True
+
+_CLASS_DECL = re.compile(r'^(?:(abstract)\s+)?(class|interface|enum|abstract)\s+(?:"([^"]+)"\s+as\s+)?([\w.~]+)'
+                         r'(?:\s*<<\s*(\w+)\s*>>)?\s*(\{)?\s*(\})?$')
+
+def _member(n: Node, member: str):
+    member = member.strip()
+    m = re.fullmatch(r"<<\s*(\w+)\s*>>", member)
+    if m:
+        n.stereotype = m.group(1)
+    elif member:
+        (n.methods if "(" in member else n.attributes).append(member)
+
+def _parse_class(lines: list[str], dialect: str) -> Diagram:
+    d = Diagram("class")
+    current: Node | None = None
+    for line in lines:
+        if current is not None:
+            if line.startswith("}"):
+                current = None
+            else:
+                _member(current, line)
+            continue
+        if _direction(line, d):
+            continue
+        m = _CLASS_DECL.match(line)
+        if m:
+            abstract, keyword, label, name, stereotype, opened, closed = m.groups()
+            name = name.replace("~", "<", 1).replace("~", ">", 1) if "~" in name else name
+            n = d.node(m.group(4), label or name)
+            if keyword in ("interface", "enum") or stereotype:
+                n.stereotype = stereotype or ("interface" if keyword == "interface" else "enumeration")
+            elif abstract or keyword == "abstract":
+                n.stereotype = "abstract"
+            current = n if opened and not closed else None
+            continue
+        m = re.match(r"^<<\s*(\w+)\s*>>\s*([\w.]+)$", line)
+        if m:
+            d.node(m.group(2)).stereotype = m.group(1)
+            continue
+        m = _CLASS_REL.match(line)
+        if m and m.group("b"):
+            style, swap = classify_arrow(m.group("arrow"))
+            a, b, ma, mb = m.group("a"), m.group("b"), m.group("ma"), m.group("mb")
+            d.node(a), d.node(b)
+            if swap:
+                a, b, ma, mb = b, a, mb, ma
+            d.edges.append(Edge(a, b, (m.group("label") or "").strip(), style, (ma, mb)))
+            continue
+        m = re.match(r"^([\w.]+)\s*:\s*(.+)$", line)
+        if m:
+            _member(d.node(m.group(1)), m.group(2))
+            continue
+        d.skip(line)
+    return d
+
+_STATE_DECL = re.compile(r'^state\s+(?:"([^"]+)"\s+as\s+([\w.]+)|([\w.]+)(?:\s+as\s+"([^"]+)")?)'
+                         r'(?:\s*<<\s*(\w+)\s*>>)?\s*(\{)?$')
+_TRANSITION = re.compile(r"^(\[\*\]|[\w.]+)\s*(-+(?:\w+-+)?>)\s*(\[\*\]|[\w.]+)\s*(?::\s*(.*))?$")
+_PSEUDO = {"choice": "choice", "fork": "fork", "join": "join", "end": "final", "start": "initial"}
+
+def _parse_state(lines: list[str], dialect: str) -> Diagram:
+    d = Diagram("state", "LR" if dialect == "plantuml" else "TB")
+    scopes: list[str | None] = [None]
+    skipping_note = False
+
+    def endpoint(name: str, initial: bool) -> str:
+        scope = scopes[-1]
+        if name != "[*]":
+            n = d.node(name, kind="state", parent=scope)
+            return n.id
+        id_ = f"[*]{'start' if initial else 'end'}:{scope or ''}"
+        d.node(id_, "", "initial" if initial else "final", scope)
+        return id_
+
+    for line in lines:
+        if skipping_note:
+            skipping_note = not line.lower().startswith("end note")
+            continue
+        if line.lower().startswith("note "):
+            # Note multiligne (sans ":" sur la ligne d'ouverture) jusqu'à "end note"
+            skipping_note = ":" not in line and not line.rstrip().endswith("note")
+            continue
+        if _direction(line, d) or line == "--" or line == "||":
+            continue
+        if line.startswith("}"):
+            if len(scopes) > 1:
+                scopes.pop()
+            continue
+        m = _STATE_DECL.match(line)
+        if m:
+            label_a, id_a, id_b, label_b, stereotype, opened = m.groups()
+            id_ = id_a or id_b
+            kind = _PSEUDO.get(stereotype or "", "state")
+            n = d.node(id_, label_a or label_b or id_, kind, scopes[-1])
+            if kind != "state":
+                n.label = ""
+            if opened:
+                scopes.append(id_)
+            continue
+        m = _TRANSITION.match(line)
+        if m:
+            a, _, b, label = m.groups()
+            d.edges.append(Edge(endpoint(a, True), endpoint(b, False), (label or "").strip(), "transition"))
+            continue
+        m = re.match(r"^([\w.]+)\s*:\s*(.+)$", line)
+        if m:
+            # Description ou activités internes (entry / do / exit)
+            n = d.node(m.group(1), kind="state", parent=scopes[-1])
+            n.attributes.append(m.group(2).strip())
+            continue
+        d.skip(line)
+    return d
+
+_UC_NAME = r'\([^)]+\)|:[^:]+:|"[^"]+"|[\w.]+'
+_UC_LINK = re.compile(rf"^(?P<a>{_UC_NAME})\s*(?P<arrow>(?:<\||\*|o|<)?(?:-+|\.+)(?:(?:up|down|left|right|u|d|l|r)(?:-+|\.+))?(?:\|>|\*|o|>)?)"
+                      rf"\s*(?P<b>{_UC_NAME})\s*(?::\s*(?P<label>.*))?$")
+
+def _parse_usecase(lines: list[str], dialect: str) -> Diagram:
+    d = Diagram("usecase")
+    boundaries: list[str | None] = [None]
+
+    def ref(token: str) -> str:
+        token = token.strip()
+        if token.startswith("("):
+            label = token[1:-1].strip()
+            return d.node(label, label, "usecase", boundaries[-1]).id if label not in d.nodes else label
+        if token.startswith(":"):
+            label = token[1:-1].strip()
+            return d.node(label, label, "actor").id if label not in d.nodes else label
+        name = token.strip('"')
+        if name not in d.nodes:
+            d.node(name, name, "usecase", boundaries[-1])
+        return name
+
+    for line in lines:
+        if _direction(line, d):
+            continue
+        if line.startswith("}"):
+            if len(boundaries) > 1:
+                boundaries.pop()
+            continue
+        m = re.match(r'^(actor|usecase)\s+(?::([^:]+):|\(([^)]+)\)|"([^"]+)"|([\w.]+))(?:\s+as\s+([\w.]+|\([^)]+\)|"[^"]+"))?', line)
+        if m:
+            keyword, label = m.group(1), next(g for g in m.groups()[1:5] if g)
+            alias = (m.group(6) or label).strip('"()')
+            d.node(alias, label, keyword, None if keyword == "actor" else boundaries[-1])
+            continue
+        m = re.match(rf"^(:[^:]+:|\([^)]+\))\s+as\s+([\w.]+)$", line)
+        if m:
+            label = m.group(1)[1:-1].strip()
+            d.node(m.group(2), label, "actor" if m.group(1).startswith(":") else "usecase",
+                   None if m.group(1).startswith(":") else boundaries[-1])
+            continue
+        m = re.match(r'^(rectangle|package)\s+(?:"([^"]+)"|([\w.]+))(?:\s+as\s+([\w.]+))?\s*\{$', line)
+        if m:
+            label = m.group(2) or m.group(3)
+            n = d.node(m.group(4) or label, label, "boundary", boundaries[-1])
+            boundaries.append(n.id)
+            continue
+        m = _UC_LINK.match(line)
+        if m:
+            style, swap = classify_arrow(m.group("arrow"))
+            a, b = ref(m.group("a")), ref(m.group("b"))
+            label = (m.group("label") or "").strip()
+            if "include" in label or "extend" in label:
+                style, label = "dependency", "«" + label.strip("<> ").replace("<<", "").replace(">>", "") + "»"
+            elif style == "realization":
+                style = "inheritance"
+            if swap:
+                a, b = b, a
+            d.edges.append(Edge(a, b, label, style))
+            continue
+        d.skip(line)
+    return d
+
+_PARTICIPANT = re.compile(r'^(?:create\s+)?(participant|actor|boundary|control|entity|database|collections|queue)\s+'
+                          r'(?:"([^"]+)"|([^\s"]+))(?:\s+as\s+(?:"([^"]+)"|(\S+)))?(?:\s*<<\s*([^>]+?)\s*>>)?(?:\s+order\s+\d+)?\s*$')
+_MESSAGE = re.compile(r'^(?P<a>"[^"]+"|[^\s<>:+\-]+)\s*(?P<arrow><?<?-{1,2}(?:>>|>|x|\)|\\\\|//?)?[xo]?)\s*'
+                      r'(?P<pre>[+-])?\s*(?P<b>"[^"]+"|[^\s<>:+\-]+)\s*(?P<post>\+\+|--|\*\*|!!)?\s*(?::\s*(?P<label>.*))?$')
+_FRAGMENTS = ("alt", "opt", "loop", "par", "critical", "break", "group", "rect", "region")
+
+def _parse_sequence(lines: list[str], dialect: str) -> Diagram:
+    d = Diagram("sequence", "LR")
+    ev = d.events
+    autonumber = 0
+    note: list | None = None
+
+    def participant(name: str) -> str:
+        name = name.strip('"')
+        if name not in d.nodes:
+            d.node(name, name, "participant")
+        return name
+
+    for line in lines:
+        low = line.lower()
+        if note is not None:
+            if low.startswith("end note") or low == "end note":
+                ev.append(("note", note[0], note[1], "\n".join(note[2])))
+                note = None
+            else:
+                note[2].append(line)
+            continue
+        if _direction(line, d):
+            continue
+        m = _PARTICIPANT.match(line)
+        if m and dialect == "mermaid":
+            # Mermaid: participant <id> as <libellé>
+            keyword, id_, label = m.group(1), m.group(2) or m.group(3), m.group(4) or m.group(5)
+        elif m:
+            # PlantUML: participant "<libellé>" as <id>, ou participant <id> as <alias>
+            keyword = m.group(1)
+            if m.group(4) or m.group(5):
+                label, id_ = m.group(2) or m.group(3), m.group(4) or m.group(5)
+            else:
+                label = id_ = m.group(2) or m.group(3)
+        if m:
+            n = d.node(id_, label or id_, "actor" if keyword == "actor" else "participant")
+            if m.group(6):
+                n.stereotype = m.group(6)
+            if line.startswith("create") or (dialect == "mermaid" and low.startswith("create")):
+                ev.append(("create", id_))
+            continue
+        if low.startswith("autonumber"):
+            parts = line.split()
+            autonumber = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+            continue
+        m = re.match(r"^(activate|deactivate|destroy|create)\s+(\S+)", line)
+        if m:
+            ev.append((m.group(1), participant(m.group(2))))
+            continue
+        m = re.match(r"^note\s+(over|left of|right of|left|right)\s+([^:]+?)\s*(?::\s*(.*))?$", line, re.I)
+        if m:
+            targets = [participant(p.strip()) for p in m.group(2).split(",") if p.strip()]
+            if m.group(3) is None:
+                note = [m.group(1).lower(), targets, []]
+            else:
+                ev.append(("note", m.group(1).lower(), targets, m.group(3).replace("<br>", "\n").replace("\\n", "\n")))
+            continue
+        word = low.split(" ", 1)[0]
+        if word in _FRAGMENTS:
+            ev.append(("fragment", word, line[len(word):].strip()))
+            continue
+        if word in ("else", "and"):
+            ev.append(("else", line[len(word):].strip()))
+            continue
+        if low == "end":
+            ev.append(("end",))
+            continue
+        m = re.match(r"^(?:\.\.\.(.*?)\.\.\.|\.\.\.|==\s*(.*?)\s*==|\|\|\d*\|\|?)$", line)
+        if m:
+            ev.append(("divider", (m.group(1) or m.group(2) or "").strip()))
+            continue
+        m = _MESSAGE.match(line)
+        if m:
+            a, b, arrow = participant(m.group("a")), participant(m.group("b")), m.group("arrow")
+            label = (m.group("label") or "").strip()
+            if autonumber:
+                label = f"{autonumber} {label}".strip()
+                autonumber += 1
+            reverse = arrow.startswith("<") and not arrow.rstrip("xo").endswith((">", ")"))
+            if reverse:
+                a, b = b, a
+            if "--" in arrow:
+                style = "reply"
+            elif arrow.endswith(")") or (dialect == "plantuml" and ">>" in arrow):
+                style = "async_message"
+            else:
+                style = "message"
+            pre, post = m.group("pre"), m.group("post")
+            ev.append(("message", a, b, label, style, pre == "+" or post == "++", pre == "-" or post == "--"))
+            if post == "**":
+                ev.append(("create", b))
+            elif post == "!!":
+                ev.append(("destroy", b))
+            continue
+        d.skip(line)
+    return d
+
+# --- Dessin -------------------------------------------------------------------------------
+
+def _round(v: float):
+    # Coordonnées écrites telles quelles (str): 98 plutôt que 98.0
+    return int(v) if float(v).is_integer() else round(v, 2)
+
+CHAR_W = 7.0
+SHAPES = {
+    "state": ((140, 50), "state"), "initial": ((18, 18), "initial"), "final": ((26, 26), "final"),
+    "choice": ((40, 40), "decision"), "fork": ((120, 8), "bar"), "join": ((120, 8), "bar"),
+    "actor": ((40, 70), "actor"), "usecase": ((170, 60), "usecase"), "boundary": ((300, 200), "system_boundary"),
+}
+
+def _class_label(n: Node) -> tuple[str, float, float]:
+    """HTML label of a class box and its size."""
+    e = html.escape
+    head = f"<b>{e(n.label)}</b>"
+    if n.stereotype == "abstract":
+        head = f"<i>{head}</i>"
+    elif n.stereotype:
+        head = f"«{e(n.stereotype)}»<br>{head}"
+    parts = [f'<p style="margin:4px;text-align:center">{head}</p>']
+    for section in (n.attributes, n.methods):
+        if section:
+            parts.append('<hr size="1"><p style="margin:0 4px">' + "<br>".join(e(m) for m in section) + "</p>")
+    lines = [n.label, f"«{n.stereotype}»" if n.stereotype else ""] + n.attributes + n.methods
+    width = max(120.0, CHAR_W * max(len(s) for s in lines) + 24)
+    height = 30 + (16 if n.stereotype and n.stereotype != "abstract" else 0) + 17 * (len(n.attributes) + len(n.methods)) + (
+        8 * sum(1 for s in (n.attributes, n.methods) if s))
+    return "".join(parts), width, height
+
+def _state_label(n: Node) -> tuple[str, float, float]:
+    lines = [n.label] + n.attributes
+    label = html.escape(n.label) if not n.attributes else (
+        f'<p style="margin:4px"><b>{html.escape(n.label)}</b></p><hr size="1"><p style="margin:0 4px">'
+        + "<br>".join(html.escape(a) for a in n.attributes) + "</p>")
+    return label, max(120.0, CHAR_W * max(len(s) for s in lines) + 24), 40 + 17 * len(n.attributes)
+
+def _edge_label(e: Edge) -> str:
+    ma, mb = e.multiplicity
+    if not (ma or mb):
+        return e.label
+    ends = f"{ma or ''} → {mb or ''}".strip()
+    return f"{e.label}\n({ends})" if e.label else f"({ends})"
+
+def draw_graph(d: Diagram, builder: DrawIOBuilder, root):
+    """Class, state and use case diagrams: nodes placed by layered_layout, then edges."""
+    graph = LayoutGraph()
+    labels: dict[str, str] = {}
+    # Parents avant enfants (composites, frontières de système)
+    ordered: list[Node] = []
+    seen: set[str] = set()
+
+    def visit(n: Node):
+        chain = []
+        while n is not None and n.id not in seen:
+            chain.append(n)
+            n = d.nodes.get(n.parent) if n.parent else None
+        for c in reversed(chain):
+            seen.add(c.id)
+            ordered.append(c)
+
+    for n in d.nodes.values():
+        visit(n)
+    containers = {n.parent for n in d.nodes.values() if n.parent}
+    for n in ordered:
+        if d.kind == "class":
+            label, w, h = _class_label(n)
+        elif n.kind == "state":
+            label, w, h = _state_label(n)
+        else:
+            (w, h), _ = SHAPES[n.kind]
+            label = html.escape(n.label)
+            if n.kind == "usecase":
+                w = max(w, CHAR_W * len(n.label) * 0.8 + 40)
+        labels[n.id] = label
+        graph.add_node(n.id, w, h, parent=n.parent)
+    for e in d.edges:
+        # Généralisations: le parent au-dessus (ou à gauche) de ses enfants
+        if e.kind in ("inheritance", "realization") and d.kind != "usecase":
+            graph.add_edge(e.target, e.source)
+        else:
+            graph.add_edge(e.source, e.target)
+    result = layered_layout(graph, d.direction)
+
+    ox, oy = ORIGIN
+    if d.title:
+        builder.add_vertex(root, ox, 10, max(300, CHAR_W * 1.6 * len(d.title)), 30, html.escape(d.title), STYLES["title"])
+    ids: dict[str, str] = {}
+    for n in ordered:
+        # Positions relatives au parent: les enfants d'un composite sont ses cellules filles
+        x, y, w, h = result.positions[n.id]
+        if not n.parent:
+            x, y = x + ox, y + oy
+        if d.kind == "class":
+            style = STYLES["class_box"]
+        elif n.kind == "state" and n.id in containers:
+            style = STYLES["composite"]
+        else:
+            style = STYLES[SHAPES[n.kind][1]]
+        ids[n.id] = builder.add_vertex(root, _round(x), _round(y), _round(w), _round(h), labels[n.id], style,
+                                       ids[n.parent] if n.parent else "1")
+    for e in d.edges:
+        builder.add_edge(root, ids[e.source], ids[e.target], html.escape(_edge_label(e)).replace("\n", "<br>"), STYLES[e.kind])
+
+SEQ_SPACING = 180
+SEQ_WIDTH = 130
+SEQ_HEADER = 40
+SEQ_ROW = 36
+ACTIVATION_W = 10
+
+def draw_sequence(d: Diagram, builder: DrawIOBuilder, root):
+    """Lifelines side by side, one row per message; activations, fragments, notes, creations and destructions."""
+    ox, oy = ORIGIN
+    order = list(d.nodes)
+    column = {p: i for i, p in enumerate(order)}
+    center = {p: ox + i * SEQ_SPACING + SEQ_WIDTH / 2 for i, p in enumerate(order)}
+    created_at: dict[str, float] = {}
+    destroyed_at: dict[str, float] = {}
+    pending_create: set[str] = set()
+    y = oy + SEQ_HEADER + SEQ_ROW
+    if d.title:
+        builder.add_vertex(root, ox, 10, max(300, CHAR_W * 1.6 * len(d.title)), 30, html.escape(d.title), STYLES["title"])
+        y += 20
+        oy += 20
+
+    # Première passe: ordonnées de chaque évènement, activations, fragments
+    rows: list[tuple] = []          # (évènement, y)
+    active: dict[str, list[float]] = {p: [] for p in order}
+    activations: list[tuple[str, float, float, int]] = []
+    fragments: list[list] = []      # [type, garde, y0, [séparateurs], colonnes]
+    frames: list[tuple] = []
+    for event in d.events:
+        kind = event[0]
+        if kind == "create":
+            pending_create.add(event[1])
+            continue
+        if kind == "message":
+            _, a, b, _label, _style, act, deact = event
+            if b in pending_create:
+                pending_create.discard(b)
+                created_at[b] = y
+            rows.append((event, y))
+            for f in fragments:
+                f[4].update((column[a], column[b]))
+            if act:
+                active[b].append(y)
+            if deact and active[a]:
+                activations.append((a, active[a].pop(), y, len(active[a])))
+            y += SEQ_ROW + (SEQ_ROW * 0.6 if a == b else 0)
+        elif kind == "activate":
+            active[event[1]].append(y - SEQ_ROW / 2)
+        elif kind == "deactivate":
+            p = event[1]
+            if active[p]:
+                activations.append((p, active[p].pop(), y - SEQ_ROW / 2, len(active[p])))
+        elif kind == "destroy":
+            p = event[1]
+            while active[p]:
+                activations.append((p, active[p].pop(), y - SEQ_ROW / 2, len(active[p])))
+            destroyed_at[p] = y - SEQ_ROW / 2
+        elif kind == "note":
+            _, where, targets, text = event
+            lines = text.count("\n") + 1
+            rows.append((event, y))
+            for f in fragments:
+                f[4].update(column[t] for t in targets)
+            y += 20 + 16 * lines
+        elif kind == "fragment":
+            fragments.append([event[1], event[2], y, [], set()])
+            y += SEQ_ROW
+        elif kind == "else":
+            if fragments:
+                fragments[-1][3].append((y, event[1]))
+            y += SEQ_ROW
+        elif kind == "end":
+            if fragments:
+                f = fragments.pop()
+                if fragments:
+                    fragments[-1][4].update(f[4])
+                frames.append((f, y, len(fragments)))
+            y += SEQ_ROW / 2
+        elif kind == "divider":
+            rows.append((event, y))
+            y += SEQ_ROW
+    bottom = y + SEQ_ROW / 2
+    for p in order:
+        while active[p]:
+            activations.append((p, active[p].pop(), bottom - SEQ_ROW / 2, len(active[p])))
+
+    # Lignes de vie: un umlLifeline par participant, de sa création à sa destruction
+    ids: dict[str, str] = {}
+    tops: dict[str, float] = {}
+    heights: dict[str, float] = {}
+    for p in order:
+        n = d.nodes[p]
+        top = created_at[p] - SEQ_HEADER / 2 if p in created_at else oy
+        end = destroyed_at.get(p, bottom)
+        tops[p], heights[p] = top, end - top
+        label = html.escape(n.label)
+        if n.stereotype:
+            label = f"«{html.escape(n.stereotype)}»<br>{label}"
+        style = STYLES["actor_lifeline" if n.kind == "actor" else "lifeline"]
+        ids[p] = builder.add_vertex(root, _round(center[p] - SEQ_WIDTH / 2), _round(top), SEQ_WIDTH, _round(end - top), label, style)
+        if p in destroyed_at:
+            builder.add_vertex(root, _round(center[p] - 10), _round(end - 10), 20, 20, "", STYLES["destroy"])
+
+    # Cadres des fragments combinés, du plus englobant au plus imbriqué
+    for f, y_end, depth in sorted(frames, key=lambda fr: fr[2]):
+        kind, guard, y0, separators, cols = f
+        cols = cols or set(column.values())
+        margin = 14 + 8 * depth
+        left = ox + min(cols) * SEQ_SPACING + margin - 20
+        right = ox + max(cols) * SEQ_SPACING + SEQ_WIDTH - margin + 20
+        top = y0 - SEQ_ROW / 2 + 4 * depth
+        style = STYLES["fragment"]
+        if kind == "rect":
+            # Surlignage Mermaid "rect rgb(r, g, b)": cadre sans étiquette, fond de la couleur donnée
+            rgb = re.match(r"rgba?\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)", guard)
+            label = ""
+            if rgb:
+                style = STYLES.get("fragment", fillColor="#%02x%02x%02x" % tuple(min(255, int(c)) for c in rgb.groups()), opacity=40)
+        elif guard:
+            label = html.escape(f"{kind} [{guard.strip('[]')}]" if kind in ("alt", "opt", "loop", "break", "critical") else f"{kind} {guard}")
+        else:
+            label = html.escape(kind)
+        builder.add_vertex(root, _round(left), _round(top), _round(right - left), _round(y_end - top), label, style)
+        for sy, sguard in separators:
+            builder.add_vertex(root, _round(left), _round(sy - SEQ_ROW / 2), _round(right - left), 1,
+                               html.escape(f"[{sguard.strip('[]')}]" if sguard else ""), STYLES["fragment_separator"])
+
+    for p, y0, y1, depth in activations:
+        builder.add_vertex(root, _round(center[p] - ACTIVATION_W / 2 + depth * 4), _round(y0), ACTIVATION_W,
+                           _round(max(y1 - y0, 10)), "", STYLES["activation"])
+
+    # Messages: arêtes entre lignes de vie, ancrées à la hauteur de leur rangée
+    for event, y in rows:
+        kind = event[0]
+        if kind == "message":
+            _, a, b, label, style, _, _ = event
+            ya = (y - tops[a]) / heights[a] if heights[a] else 0
+            yb = (y + (SEQ_ROW * 0.6 if a == b else 0) - tops[b]) / heights[b] if heights[b] else 0
+            entry_x = 0.5
+            if b in created_at and abs(created_at[b] - y) < 1e-6:
+                entry_x, yb = (0 if center[b] > center[a] else 1), SEQ_HEADER / 2 / heights[b]
+            overrides = {"exitX": 0.5, "exitY": round(ya, 4), "entryX": entry_x, "entryY": round(yb, 4)}
+            builder.add_edge(root, ids[a], ids[b], html.escape(label), STYLES.get(style, **overrides))
+        elif kind == "note":
+            _, where, targets, text = event
+            lines = text.split("\n")
+            w = max(100.0, CHAR_W * max(len(l) for l in lines) + 20)
+            h = 10 + 16 * len(lines)
+            xs = [center[t] for t in targets]
+            if where == "over":
+                x = (min(xs) + max(xs)) / 2 - w / 2
+                w = max(w, max(xs) - min(xs) + 60)
+                x = min(x, min(xs) - 30)
+            elif where.startswith("left"):
+                x = min(xs) - w - 10
+            else:
+                x = max(xs) + 10
+            builder.add_vertex(root, _round(x), _round(y - SEQ_ROW / 3), _round(w), _round(h),
+                               "<br>".join(html.escape(l) for l in lines), STYLES["note"])
+        elif kind == "divider":
+            width = ox + (len(order) - 1) * SEQ_SPACING + SEQ_WIDTH - ox
+            builder.add_vertex(root, ox, _round(y - SEQ_ROW / 2), _round(width), 1, html.escape(event[1]),
+                               STYLES["fragment_separator"])
+
+def draw(d: Diagram, builder: DrawIOBuilder, root):
+    if d.kind == "sequence":
+        draw_sequence(d, builder, root)
+    else:
+        draw_graph(d, builder, root)
+
+# --- Compilation avec cache par bloc ---------------------------------------------------------
+
+def _compiler_version() -> str:
+    h = hashlib.sha256()
+    # act.py: StableIds et DrawIOBuilder produisent le XML mis en cache
+    here = Path(__file__)
+    for module in (here, here.with_name("styles.py"), here.with_name("layout.py"), here.with_name("act.py")):
+        h.update(module.read_bytes())
+    return h.hexdigest()[:16]
+
+class BlockCache:
+    """Compiled pages (<diagram> XML) stored by block hash."""
+
+    def __init__(self, directory: str | Path = CACHE_DIR):
+        self.dir = Path(directory)
+        self.version = _compiler_version()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, block: Block) -> str:
+        data = "\x1f".join((self.version, block.dialect, block.name, block.text)).encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, key: str) -> ET.Element | None:
+        try:
+            diagram = ET.parse(self.dir / f"{key}.xml").getroot()
+        except (OSError, ET.ParseError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return diagram
+
+    def put(self, key: str, diagram: ET.Element):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.dir / f"{key}.xml.tmp"
+        ET.ElementTree(diagram).write(tmp, encoding="utf-8", xml_declaration=True)
+        tmp.replace(self.dir / f"{key}.xml")
+
+def compile_blocks(blocks, builder: DrawIOBuilder | None = None, cache: BlockCache | None = None) -> tuple[DrawIOBuilder, list[str]]:
+    """Add one page per block to `builder`; returns it and the warnings (unsupported blocks or lines)."""
+    builder = builder if builder is not None else DrawIOBuilder(stable_ids=True)
+    warnings: list[str] = []
+    for block in blocks:
+        where = f"{block.source}:{block.line}" if block.line else block.source
+        key = cache.key(block) if cache is not None else None
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            builder.append_page(cached, block.name)
+            continue
+        try:
+            with instrument.span("md_compile.parse", source=where):
+                d = parse(block.text, block.dialect)
+        except DiagramError as e:
+            warnings.append(f"{where}: bloc ignoré ({e})")
+            continue
+        warnings.extend(f"{where}: ligne non supportée: {line}" for line in d.warnings)
+        root = builder.add_page(block.name)
+        with instrument.span("md_compile.draw", kind=d.kind, nodes=len(d.nodes)):
+            draw(d, builder, root)
+        if cache is not None:
+            diagram = builder.mxfile[-1]
+            stored = ET.fromstring(ET.tostring(diagram))
+            stored.attrib.pop("name", None)
+            cache.put(key, stored)
+    return builder, warnings
+
+def compile_file(source: str | Path, out_path: str | Path, cache: BlockCache | None = None, build_cache=None) -> str | None:
+    """
+    Compile the diagrams of `source` (markdown or .drawio) into `out_path`.
+    Returns None when the source has no supported block.
+    """
+    blocks = list(iter_blocks(source))
+    if not blocks:
+        return None
+    builder, warnings = compile_blocks(blocks, cache=cache)
+    for w in warnings:
+        print(w)
+    if not builder.page_index:
+        return None
+    if build_cache is None:
+        from build_cache import BuildCache
+        build_cache = BuildCache()
+    # Écriture via un fichier temporaire: un .drawio identique n'est pas réécrit
+    with build_cache.output(out_path) as tmp:
+        builder.save(tmp)
+    return str(out_path)
+
+def default_sources() -> list[Path]:
+    return sorted(_ROOT.glob("*.md")) + sorted((_ROOT / OUT_DIR).glob("*.drawio"))
+
+def output_path(source: Path, out_dir: Path) -> Path:
+    # atm_sequence.drawio -> atm_sequence.plantuml.drawio, pour ne pas écraser la source
+    suffix = ".plantuml.drawio" if source.suffix == ".drawio" else ".drawio"
+    return out_dir / (source.stem + suffix)
+
+def main(argv: list[str]) -> int:
+    from build_cache import BuildCache
+    out_dir = None
+    args = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == "-o" and i + 1 < len(argv):
+            out_dir = Path(argv[i + 1])
+            i += 2
+            continue
+        if argv[i] == "--trace":
+            i += 2
+            continue
+        args.append(argv[i])
+        i += 1
+    instrument.from_argv(argv)
+    sources = [Path(a) for a in args] if args else default_sources()
+    if out_dir is None:
+        out_dir = Path(OUT_DIR) if args else _ROOT / OUT_DIR
+    cache = BlockCache(CACHE_DIR if args else _ROOT / CACHE_DIR)
+    build_cache = BuildCache()
+    for source in sources:
+        if source.suffix == ".drawio" and source.name.endswith(".plantuml.drawio"):
+            continue  # sortie d'une compilation précédente
+        out = compile_file(source, output_path(source, out_dir), cache, build_cache)
+        if out is not None:
+            print(f"{source} -> {out}")
+    print(f"Blocs: {cache.misses} compilé(s), {cache.hits} depuis le cache")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,411 @@
+"""
+Declarative diagram models (JSON, JSON Lines, YAML) for the activity and state generators.
+
+A model is either one nested document:
+
+    {"type": "activity", "pages": [{"name": "...", "nodes": [...], "flows": [...]}]}
+    {"type": "state", "name": "...", "states": [...], "transitions": [...]}
+
+or a stream of flat records, one per line (.jsonl) or per YAML document:
+
+    {"type": "activity"}
+    {"type": "page", "name": "Retrait"}
+    {"type": "node", "id": "a1", "kind": "action", "label": "Insérer la carte"}
+    {"type": "flow", "source": "a1", "target": "d1", "guard": "valide"}
+
+Records are checked as they arrive: ids go into a dict, references to ids not seen
+yet wait in a pending dict and are resolved when the id shows up, so loading is a
+single pass with O(1) lookups. Nodes without x/y/w/h are placed by layout.py.
+The resulting Model feeds act.DrawIOBuilder (activities) or state.mxcell (states).
+"""
+from __future__ import annotations
+
+import io
+import json
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import state
+from act import DrawIOBuilder
+from layout import LayoutGraph, layered_layout
+from styles import STYLES
+
+ACTIVITY_KINDS = {
+    "start", "action", "decision", "merge", "fork", "join", "object", "signal",
+    "send_signal", "final", "flow_final", "note", "region", "call",
+}
+FLOW_KINDS = {"control", "object", "exception", "signal"}
+STATE_KINDS = {"state", "composite", "initial", "final", "choice", "note"}
+MODEL_FORMATS = (".json", ".jsonl", ".yaml", ".yml")
+
+# Taille par défaut (w, h) et style de chaque type de nœud
+ACTIVITY_SHAPES = {
+    "start": ((30, 30), "start"),
+    "action": ((200, 50), "action"),
+    "call": ((220, 60), "action"),
+    "decision": ((120, 60), "decision"),
+    "merge": ((120, 60), "merge"),
+    "fork": ((8, 120), "bar"),
+    "join": ((8, 120), "bar"),
+    "object": ((200, 60), "object"),
+    "signal": ((220, 50), "signal"),
+    "send_signal": ((220, 50), "signal"),
+    "final": ((36, 36), "flow_final"),
+    "flow_final": ((36, 36), "flow_final_cross"),
+    "note": ((300, 40), "note"),
+    "region": ((400, 200), "interruptible"),
+}
+FLOW_STYLES = {"control": "flow", "object": "object_flow", "exception": "exception_flow", "signal": "signal_flow"}
+STATE_SHAPES = {
+    "state": ((140, 60), "state"),
+    "composite": ((200, 120), "composite"),
+    "initial": ((18, 18), "initial"),
+    "final": ((26, 26), "final"),
+    "choice": ((40, 40), "decision"),
+    "note": ((240, 60), "state_note"),
+}
+GEOMETRY_KEYS = ("x", "y", "w", "h")
+# Pseudo-états et barres: pas de libellé par défaut (l'id sinon)
+UNLABELLED_KINDS = {"start", "fork", "join", "final", "flow_final", "initial", "choice"}
+
+class ModelError(ValueError):
+    pass
+
+class Page:
+    __slots__ = ("name", "direction", "nodes", "edges", "index")
+
+    def __init__(self, name: str, direction: str = "LR"):
+        self.name = name
+        self.direction = direction
+        self.nodes: list[dict] = []
+        self.edges: list[dict] = []
+        self.index: dict[str, int] = {}  # id -> position dans nodes
+
+class Model:
+    """type "activity" (one Page per diagram page) or "state" (a single Page)."""
+    __slots__ = ("type", "name", "pages")
+
+    def __init__(self, type_: str, name: str = ""):
+        self.type = type_
+        self.name = name
+        self.pages: list[Page] = []
+
+class _Assembler:
+    """Single-pass record consumer: validates kinds and resolves references by id."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.model: Model | None = None
+        self.page: Page | None = None
+        # id manquant -> références en attente (pour le message d'erreur)
+        self.pending: dict[str, list[str]] = {}
+
+    def fail(self, where: str, message: str):
+        raise ModelError(f"{self.source}: {where}: {message}")
+
+    def feed(self, record: dict, where: str):
+        if not isinstance(record, dict):
+            self.fail(where, "un objet est attendu")
+        rtype = record.get("type")
+        if self.model is None:
+            if rtype not in ("activity", "state"):
+                self.fail(where, "le premier enregistrement doit être de type 'activity' ou 'state'")
+            self.model = Model(rtype, record.get("name", ""))
+            if rtype == "state":
+                self._new_page(record.get("name", "Machine à états"), record.get("direction", "LR"))
+            return
+        mtype = self.model.type
+        if mtype == "activity" and rtype == "page":
+            self._close_page()
+            self._new_page(record.get("name", f"Page {len(self.model.pages) + 1}"), record.get("direction", "LR"))
+        elif (mtype, rtype) in (("activity", "node"), ("state", "state")):
+            self._node(record, where, ACTIVITY_KINDS if mtype == "activity" else STATE_KINDS)
+        elif (mtype, rtype) in (("activity", "flow"), ("state", "transition")):
+            self._edge(record, where)
+        else:
+            self.fail(where, f"enregistrement {rtype!r} inattendu dans un modèle {mtype!r}")
+
+    def _new_page(self, name: str, direction: str):
+        if direction not in ("LR", "TB"):
+            self.fail(name, f"direction {direction!r} inconnue (LR ou TB)")
+        self.page = Page(name, direction)
+        self.model.pages.append(self.page)
+
+    def _require_page(self, where: str) -> Page:
+        if self.page is None:
+            self.fail(where, "nœud ou flux avant la première page")
+        return self.page
+
+    def _ref(self, id_: str, where: str):
+        if id_ not in self.page.index:
+            self.pending.setdefault(id_, []).append(where)
+
+    def _node(self, record: dict, where: str, kinds: set[str]):
+        page = self._require_page(where)
+        id_ = record.get("id")
+        if not id_:
+            self.fail(where, "nœud sans 'id'")
+        if id_ in page.index:
+            self.fail(where, f"id en double {id_!r}")
+        kind = record.get("kind", "action" if kinds is ACTIVITY_KINDS else "state")
+        if kind not in kinds:
+            self.fail(where, f"type de nœud {kind!r} inconnu ({', '.join(sorted(kinds))})")
+        node = {"id": id_, "kind": kind, "label": record.get("label", "" if kind in UNLABELLED_KINDS else id_),
+                "parent": record.get("parent"), "lane": record.get("lane")}
+        for key in GEOMETRY_KEYS:
+            if key in record:
+                node[key] = float(record[key])
+        page.index[id_] = len(page.nodes)
+        page.nodes.append(node)
+        self.pending.pop(id_, None)
+        if node["parent"] is not None:
+            self._ref(node["parent"], where)
+
+    def _edge(self, record: dict, where: str):
+        page = self._require_page(where)
+        for key in ("source", "target"):
+            if not record.get(key):
+                self.fail(where, f"flux sans '{key}'")
+        kind = record.get("kind", "control")
+        if kind not in FLOW_KINDS:
+            self.fail(where, f"type de flux {kind!r} inconnu ({', '.join(sorted(FLOW_KINDS))})")
+        edge = {
+            "id": record.get("id"), "source": record["source"], "target": record["target"], "kind": kind,
+            "label": _edge_label(record),
+        }
+        page.edges.append(edge)
+        self._ref(edge["source"], where)
+        self._ref(edge["target"], where)
+
+    def _close_page(self):
+        if self.pending:
+            missing = ", ".join(f"{k!r} (référencé en {v[0]})" for k, v in list(self.pending.items())[:10])
+            page = self.page.name if self.page is not None else "?"
+            raise ModelError(f"{self.source}: page {page!r}: {len(self.pending)} id(s) inconnu(s): {missing}")
+
+    def finish(self) -> Model:
+        if self.model is None:
+            raise ModelError(f"{self.source}: modèle vide")
+        self._close_page()
+        return self.model
+
+def _edge_label(record: dict) -> str:
+    """'event [guard] / action' for transitions, '[guard]' for activity flows, or 'label' as is."""
+    if "label" in record:
+        return record["label"]
+    parts = []
+    if record.get("event"):
+        parts.append(record["event"])
+    if record.get("guard"):
+        parts.append(f"[{record['guard']}]")
+    text = " ".join(parts)
+    if record.get("action"):
+        text = f"{text} / {record['action']}" if text else f"/ {record['action']}"
+    return text
+
+def _expand(doc: dict):
+    """Flatten a nested model document into records."""
+    yield {k: v for k, v in doc.items() if k not in ("pages", "states", "transitions")}
+    if doc.get("type") == "activity":
+        for page in doc.get("pages", []):
+            yield {"type": "page", **{k: v for k, v in page.items() if k not in ("nodes", "flows")}}
+            for node in page.get("nodes", []):
+                yield {"type": "node", **node}
+            for flow in page.get("flows", []):
+                yield {"type": "flow", **flow}
+    else:
+        for st in doc.get("states", []):
+            yield {"type": "state", **st}
+        for tr in doc.get("transitions", []):
+            yield {"type": "transition", **tr}
+
+def iter_records(path: Path):
+    """Yield (record, location) from a .json, .jsonl or .yaml/.yml model file, lazily where the format allows."""
+    suffix = path.suffix.lower()
+    if suffix not in MODEL_FORMATS:
+        raise ModelError(f"{path}: extension non supportée (.json, .jsonl, .yaml, .yml)")
+    with open(path, encoding="utf-8") as f:
+        yield from _stream_records(f, suffix, str(path))
+
+def _stream_records(f, suffix: str, source: str):
+    if suffix == ".jsonl":
+        for lineno, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line), f"ligne {lineno}"
+                except ValueError as e:
+                    raise ModelError(f"{source}: ligne {lineno}: JSON invalide ({e})") from None
+    elif suffix == ".json":
+        try:
+            doc = json.load(f)
+        except ValueError as e:
+            raise ModelError(f"{source}: JSON invalide ({e})") from None
+        if not isinstance(doc, dict):
+            raise ModelError(f"{source}: un objet JSON est attendu")
+        for i, record in enumerate(_expand(doc)):
+            yield record, f"élément {i}"
+    else:
+        try:
+            import yaml  # PyYAML
+        except Exception:
+            raise ModelError("PyYAML est requis pour lire les modèles YAML. Installez-le ou utilisez JSON/JSONL.") from None
+        # Plusieurs documents = flux d'enregistrements; un seul document imbriqué sinon
+        for n, doc in enumerate(yaml.safe_load_all(f)):
+            if doc is None:
+                continue
+            if not isinstance(doc, dict):
+                raise ModelError(f"{source}: document {n + 1}: un mapping YAML est attendu")
+            if "pages" in doc or "states" in doc:
+                for i, record in enumerate(_expand(doc)):
+                    yield record, f"élément {i}"
+            else:
+                yield doc, f"document {n + 1}"
+
+def load_model(path: str | Path) -> Model:
+    path = Path(path)
+    asm = _Assembler(str(path))
+    for record, where in iter_records(path):
+        asm.feed(record, where)
+    return asm.finish()
+
+def parse_model(text: str, fmt: str = "json", source: str = "<modèle>") -> Model:
+    """Model from the text of a document in format `fmt` (json, jsonl, yaml), e.g. received by render_service.py."""
+    suffix = "." + fmt.lower().lstrip(".")
+    if suffix not in MODEL_FORMATS:
+        raise ModelError(f"{source}: format non supporté {fmt!r} (json, jsonl, yaml)")
+    asm = _Assembler(source)
+    for record, where in _stream_records(io.StringIO(text), suffix, source):
+        asm.feed(record, where)
+    return asm.finish()
+
+def _parents_first(page: Page) -> list[dict]:
+    """Nodes ordered so that every parent precedes its children (raises on parent cycles)."""
+    ordered, state_of = [], {}
+    for node in page.nodes:
+        chain = []
+        cur = node
+        while cur is not None and cur["id"] not in state_of:
+            if any(c is cur for c in chain):
+                raise ModelError(f"page {page.name!r}: cycle de parents autour de {cur['id']!r}")
+            chain.append(cur)
+            parent = cur["parent"]
+            cur = page.nodes[page.index[parent]] if parent is not None else None
+        for n in reversed(chain):
+            state_of[n["id"]] = True
+            ordered.append(n)
+    return ordered
+
+def _place(page: Page, shapes: dict) -> dict[str, tuple[float, float, float, float]]:
+    """
+    Geometry of every node, relative to its parent: explicit x/y/w/h when given,
+    layout.py for the others (sizes default to the kind's size).
+    """
+    nodes = _parents_first(page)
+    geo: dict[str, tuple[float, float, float, float]] = {}
+    if all(all(k in n for k in GEOMETRY_KEYS) for n in nodes):
+        return {n["id"]: tuple(_round(n[k]) for k in GEOMETRY_KEYS) for n in nodes}
+    graph = LayoutGraph()
+    for n in nodes:
+        (dw, dh), _ = shapes[n["kind"]]
+        graph.add_node(n["id"], n.get("w", dw), n.get("h", dh), lane=n["lane"], parent=n["parent"])
+    for e in page.edges:
+        graph.add_edge(e["source"], e["target"])
+    result = layered_layout(graph, page.direction)
+    for n in nodes:
+        x, y, w, h = result.positions[n["id"]]
+        geo[n["id"]] = tuple(_round(v) for v in (n.get("x", x), n.get("y", y), w, h))
+    geo["__lanes__"] = result.lanes
+    return geo
+
+def _round(v: float):
+    # Coordonnées écrites telles quelles (str): 98 plutôt que 98.0
+    return int(v) if float(v).is_integer() else round(v, 2)
+
+ORIGIN = (40, 60)
+
+def build_activity(model: Model, builder=None):
+    """Add the model's pages to `builder` (DrawIOBuilder-compatible, new DrawIOBuilder by default)."""
+    d = builder if builder is not None else DrawIOBuilder()
+    for page in model.pages:
+        root = d.add_page(page.name)
+        geo = _place(page, ACTIVITY_SHAPES)
+        ox, oy = ORIGIN
+        # Couloirs en premier: simples formes d'arrière-plan sous les actions
+        for lane, (x, y, w, h) in geo.pop("__lanes__", {}).items():
+            d.add_vertex(root, _round(ox + x), _round(oy + y), _round(w), _round(h), lane, STYLES["swimlane"])
+        ids: dict[str, str] = {}
+        absolute: dict[str, tuple[float, float]] = {}
+        for n in _parents_first(page):
+            x, y, w, h = geo[n["id"]]
+            if n["parent"] is not None:
+                px, py = absolute[n["parent"]]
+                x, y = x + px, y + py
+            else:
+                x, y = x + ox, y + oy
+            absolute[n["id"]] = (x, y)
+            _, style = ACTIVITY_SHAPES[n["kind"]]
+            ids[n["id"]] = d.add_vertex(root, x, y, w, h, n["label"], STYLES[style])
+            if n["kind"] == "final":
+                # Fin d'activité = cercle + disque plein
+                d.add_vertex(root, x + w * 0.22, y + h * 0.22, w * 0.56, h * 0.56, "", STYLES["final_inner"])
+        for e in page.edges:
+            d.add_edge(root, ids[e["source"]], ids[e["target"]], e["label"], STYLES[FLOW_STYLES[e["kind"]]])
+    return d
+
+def _edge_ids(page: Page) -> list[str]:
+    """Cell ids of the edges: the model id, else t0, t1... skipping the ids already used on the page."""
+    used = set(page.index) | {e["id"] for e in page.edges if e["id"]}
+    ids, n = [], 0
+    for e in page.edges:
+        id_ = e["id"]
+        if not id_:
+            while f"t{n}" in used:
+                n += 1
+            id_ = f"t{n}"
+            used.add(id_)
+        ids.append(id_)
+    return ids
+
+def build_state(model: Model):
+    """Return the mxfile Element of a state machine model, cells made with state.mxcell."""
+    page = model.pages[0]
+    mxfile, root = state.new_document(diagram_id="state-1", name=page.name)
+    geo = _place(page, STATE_SHAPES)
+    geo.pop("__lanes__", None)
+    ox, oy = ORIGIN
+    for n in _parents_first(page):
+        x, y, w, h = geo[n["id"]]
+        if n["parent"] is None:
+            x, y = x + ox, y + oy
+        _, style = STATE_SHAPES[n["kind"]]
+        state.mxcell(root, n["id"], value=n["label"], style=STYLES[style], vertex=True,
+                     parent_id=n["parent"] or "1", x=x, y=y, w=w, h=h)
+    parent_of = {n["id"]: n["parent"] for n in page.nodes}
+    for e, id_ in zip(page.edges, _edge_ids(page)):
+        # Transition interne à un composite si ses deux extrémités y sont
+        p = parent_of[e["source"]] if parent_of[e["source"]] == parent_of[e["target"]] else None
+        state.mxcell(root, id_, value=e["label"], style=STYLES["transition"], edge=True,
+                     source=e["source"], target=e["target"], parent_id=p or "1")
+    return state.fix_as_attributes(mxfile)
+
+def build_file(model_path: str | Path, out_path: str | Path) -> str:
+    """Load a model file and write the corresponding .drawio file."""
+    model = load_model(model_path)
+    if model.type == "activity":
+        return build_activity(model).save(str(out_path))
+    mxfile = build_state(model)
+    ET.indent(mxfile, space="  ", level=0)
+    ET.ElementTree(mxfile).write(out_path, encoding="utf-8", xml_declaration=True)
+    return str(out_path)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python model_loader.py <modèle.json|.jsonl|.yaml> <sortie.drawio>")
+        sys.exit(2)
+    try:
+        out = build_file(sys.argv[1], sys.argv[2])
+    except ModelError as e:
+        print(f"Modèle invalide: {e}")
+        sys.exit(1)
+    print(f"Fichier .drawio généré: {out}")
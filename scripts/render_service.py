@@ -0,0 +1,333 @@
+"""
+Local render service for editor previews: models in, .drawio or SVG out.
+
+Every "python act.py" / "python state.py" run pays for the interpreter start,
+the imports (ElementTree, minidom, fitz...) and the style registry before the
+first cell is built. This asyncio server pays once:
+
+- HTTP/1.1 with keep-alive, on a local TCP port or a Unix socket;
+- CPU-heavy builds (model loading, layout, rendering, PDF text extraction)
+  run in a process pool whose workers import the generators once, keep the
+  parsed styles and memoize layouts (layout.enable_cache);
+- responses are kept in an LRU cache keyed by a hash of the request: a
+  repeated request is answered by the event loop without reaching a worker,
+  in well under a millisecond of service time; concurrent identical requests
+  share one build;
+- the figure index of a PDF (demarche_uml.extract_figure_pages) is kept in an
+  LRU keyed by path, size and mtime.
+
+Routes:
+
+    POST /model?format=json|jsonl|yaml&output=drawio|svg&page=1   modèle model_loader
+    POST /compile?dialect=mermaid|plantuml&output=drawio|svg      bloc md_compile
+    POST /render?page=1                                           .drawio -> SVG
+    GET  /figures?pdf=chemin.pdf                                  index des figures (JSON)
+    GET  /stats                                                   caches et temps (JSON)
+
+    python render_service.py --port 8765 -j 4
+    python render_service.py --unix /tmp/uml-render.sock
+    curl --data-binary @models/atm_states.jsonl "http://127.0.0.1:8765/model?format=jsonl&output=svg"
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import signal
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import instrument
+from build_cache import LRUCache
+
+HOST = "127.0.0.1"
+PORT = 8765
+CACHE_SIZE = 256          # réponses gardées en mémoire
+LAYOUT_CACHE_SIZE = 128   # placements gardés par worker
+MAX_BODY = 32 << 20
+OUTPUTS = {"drawio": "application/xml; charset=utf-8", "svg": "image/svg+xml; charset=utf-8"}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class RequestError(ValueError):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+# --- Travail des workers (fonctions de module: envoyées au pool par nom) -----------------------
+
+def _init_worker():
+    """Import the generators once per worker and memoize layouts."""
+    # Ctrl-C touche tout le groupe de processus: seul le service s'arrête, puis arrête le pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    import layout
+    import md_compile  # noqa: F401  (act, styles, layout)
+    import model_loader  # noqa: F401  (state)
+    import render_svg  # noqa: F401
+    layout.enable_cache(LAYOUT_CACHE_SIZE)
+
+def _output(tables, drawio, output: str, page: int) -> bytes:
+    """`drawio()` text, or the SVG of page `page` (1-based) of `tables`."""
+    if output == "drawio":
+        return drawio().encode("utf-8")
+    from render_svg import render_page
+    if not 1 <= page <= len(tables):
+        raise ValueError(f"Page {page} inexistante ({len(tables)} page(s))")
+    return render_page(tables[page - 1]).encode("utf-8")
+
+def _builder_xml(builder) -> str:
+    buf = io.StringIO()
+    builder.save(buf)
+    return buf.getvalue()
+
+def build_model(text: str, fmt: str, output: str, page: int) -> bytes:
+    """Worker: a model_loader document (activity or state) -> .drawio or SVG."""
+    from drawio_model import CompactDrawIOBuilder
+    from drawio_reader import page_tables
+    from model_loader import build_activity, build_state, parse_model
+
+    model = parse_model(text, fmt, "<requête>")
+    if model.type == "activity":
+        builder = build_activity(model, CompactDrawIOBuilder())
+        return _output(builder.pages, lambda: _builder_xml(builder), output, page)
+    mxfile = build_state(model)
+    return _output(page_tables(mxfile) if output == "svg" else [],
+                   lambda: ET.tostring(mxfile, encoding="unicode", xml_declaration=True), output, page)
+
+def compile_block(text: str, dialect: str, output: str, page: int) -> bytes:
+    """Worker: a Mermaid / PlantUML block (md_compile) -> .drawio or SVG."""
+    from drawio_model import CompactDrawIOBuilder
+    from md_compile import draw, parse
+
+    d = parse(text, dialect)
+    builder = CompactDrawIOBuilder(stable_ids=True)
+    draw(d, builder, builder.add_page(d.title or d.kind))
+    return _output(builder.pages, lambda: _builder_xml(builder), output, page)
+
+def render_drawio(text: str, page: int) -> bytes:
+    """Worker: one page of a .drawio document -> SVG."""
+    from drawio_reader import page_tables
+
+    return _output(page_tables(ET.fromstring(text)), None, "svg", page)
+
+def figure_pages(pdf: str) -> dict:
+    """Worker: figure -> page index of a PDF (demarche_uml, cached on disk next to the PDF)."""
+    from demarche_uml import FIGURE_PATTERNS, extract_figure_pages
+
+    return extract_figure_pages(Path(pdf), FIGURE_PATTERNS)
+
+# --- Service -----------------------------------------------------------------------------
+
+class RenderService:
+    def __init__(self, workers: int | None = None, cache_size: int = CACHE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        self.responses = LRUCache(cache_size)
+        self.figures = LRUCache(32)
+        self.inflight: dict[str, asyncio.Future] = {}
+        self.requests = 0
+        self.builds = 0
+        self.busy_s = 0.0   # temps de service cumulé (hors réseau)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def warm_up(self):
+        """Start every worker now rather than on the first requests."""
+        futures = [self.pool.submit(os.getpid) for _ in range(self.workers)]
+        for f in futures:
+            f.result()
+
+    async def _run(self, key: str, func, *args):
+        """Cached result of func(*args) in the pool; identical concurrent requests wait for the same build."""
+        cached = self.responses.get(key)
+        if cached is not None:
+            return cached, True
+        pending = self.inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending), True
+        future = asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+        self.inflight[key] = future
+        try:
+            result = await future
+        finally:
+            del self.inflight[key]
+        self.builds += 1
+        self.responses.put(key, result)
+        return result, False
+
+    async def handle(self, method: str, target: str, body: bytes) -> tuple[int, str, bytes, dict]:
+        """(status, content type, payload, extra headers) of one request."""
+        url = urlsplit(target)
+        query = dict(parse_qsl(url.query))
+        route = url.path.rstrip("/") or "/"
+        if route in ("/model", "/compile", "/render"):
+            if method != "POST":
+                raise RequestError(405, f"{route} attend un POST")
+            try:
+                text = body.decode("utf-8")
+            except UnicodeDecodeError:
+                raise RequestError(400, "corps de requête non UTF-8") from None
+            output = query.get("output", "svg" if route == "/render" else "drawio")
+            if output not in OUTPUTS:
+                raise RequestError(400, f"sortie inconnue {output!r} (drawio ou svg)")
+            try:
+                page = int(query.get("page", "1"))
+            except ValueError:
+                raise RequestError(400, f"numéro de page invalide {query['page']!r}") from None
+            if route == "/model":
+                func, params = build_model, [query.get("format", "json"), output, page]
+            elif route == "/compile":
+                func, params = compile_block, [query.get("dialect", "mermaid"), output, page]
+            else:
+                func, params, output = render_drawio, [page], "svg"
+            key = hashlib.sha256(json.dumps([route, *params]).encode("utf-8") + b"\0" + body).hexdigest()
+            payload, hit = await self._run(key, func, text, *params)
+            return 200, OUTPUTS[output], payload, {"X-Cache": "hit" if hit else "miss"}
+        if method != "GET":
+            raise RequestError(405, f"{route} attend un GET")
+        if route == "/figures":
+            pdf = query.get("pdf")
+            if not pdf:
+                raise RequestError(400, "paramètre pdf manquant")
+            path = Path(pdf).resolve()
+            try:
+                st = path.stat()
+            except OSError:
+                raise RequestError(404, f"PDF introuvable: {pdf}") from None
+            key = (str(path), st.st_size, st.st_mtime_ns)
+            pages = self.figures.get(key)
+            hit = pages is not None
+            if not hit:
+                pages = await asyncio.get_running_loop().run_in_executor(self.pool, figure_pages, str(path))
+                self.figures.put(key, pages)
+            return 200, "application/json", json.dumps(pages, ensure_ascii=False).encode("utf-8"), {
+                "X-Cache": "hit" if hit else "miss"}
+        if route == "/stats":
+            stats = {"requests": self.requests, "builds": self.builds, "busy_ms": round(self.busy_s * 1000, 3),
+                     "responses": self.responses.stats(), "figures": self.figures.stats()}
+            return 200, "application/json", json.dumps(stats).encode("utf-8"), {}
+        raise RequestError(404, f"route inconnue: {route}")
+
+    async def respond(self, method: str, target: str, body: bytes) -> tuple[int, str, bytes, dict]:
+        """handle() with errors turned into plain-text responses."""
+        from md_compile import DiagramError
+        from model_loader import ModelError
+
+        start = time.perf_counter()
+        self.requests += 1
+        try:
+            return await self.handle(method, target, body)
+        except RequestError as e:
+            return e.status, "text/plain; charset=utf-8", str(e).encode("utf-8"), {}
+        except (ModelError, DiagramError, ET.ParseError, ValueError, KeyError) as e:
+            return 400, "text/plain; charset=utf-8", f"{type(e).__name__}: {e}".encode("utf-8"), {}
+        except Exception as e:
+            return 500, "text/plain; charset=utf-8", f"{type(e).__name__}: {e}".encode("utf-8"), {}
+        finally:
+            self.busy_s += time.perf_counter() - start
+
+    # --- HTTP/1.1 minimal: Content-Length, keep-alive ---------------------------------------------
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body, status = request
+                if status is not None:
+                    response = status, "text/plain; charset=utf-8", REASONS[status].encode(), {}
+                else:
+                    response = await self.respond(method, target, body)
+                keep = headers.get("connection", "").lower() != "close" and status is None
+                self._write_response(writer, *response, keep)
+                await writer.drain()
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3:
+            return "", "", {}, b"", 400
+        method, target, _ = parts
+        headers: dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            return method, target, headers, b"", 400
+        if length > MAX_BODY:
+            return method, target, headers, b"", 413
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body, None
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, content_type: str, payload: bytes,
+                        headers: dict, keep_alive: bool):
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(payload)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head.extend(f"{k}: {v}" for k, v in headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+
+async def serve(service: RenderService, host: str = HOST, port: int = PORT, unix: str | None = None):
+    if unix:
+        server = await asyncio.start_unix_server(service.serve_connection, path=unix)
+        where = unix
+    else:
+        server = await asyncio.start_server(service.serve_connection, host, port)
+        where = f"http://{host}:{port}"
+    print(f"Service de rendu à l'écoute: {where}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Service local de génération .drawio/SVG avec caches chauds.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", help="socket Unix à la place du port TCP")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="processus de génération")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help=f"réponses en cache (défaut: {CACHE_SIZE})")
+    parser.add_argument("--trace", dest="trace_out", help="trace d'exécution (instrument.py) écrite à l'arrêt")
+    args = parser.parse_args(argv)
+
+    if args.trace_out:
+        instrument.enable(interval=0.05, dump_to=args.trace_out)
+    service = RenderService(max(1, args.jobs), args.cache_size)
+    service.warm_up()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)   # arrêt propre (socket supprimée) sur SIGTERM aussi
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+        service.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,526 @@
+"""
+Headless SVG (and optional PNG) rendering of draw.io pages.
+
+Renders the in-memory models of the generators (DrawIOBuilder,
+CompactDrawIOBuilder, state.build_drawio()) or any .drawio file, without the
+draw.io desktop app. Covers the shapes used by these scripts: rect/rounded,
+ellipse, doubleEllipse, rhombus, hexagon, note, line, triangle, swimlane and
+text, straight and orthogonal edges with arrows, and labels. Styles are
+resolved once per distinct style string, so the cost per cell is a few
+f-strings.
+
+    python render_svg.py diagrammes/*.drawio -o images          # SVG
+    python render_svg.py diagrammes/*.drawio -o images --png -j 4
+
+    from render_svg import render
+    render(state.build_drawio(), "images", "atm_state_example")
+
+PNG output needs CairoSVG (pip install cairosvg).
+"""
+from __future__ import annotations
+
+import argparse
+import html
+import re
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from math import hypot, isnan
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from drawio_model import KIND_EDGE, KIND_VERTEX, NO_REF, CellTable
+from drawio_reader import page_tables
+from styles import DRAWIO_BASE_STYLES, STYLES, parse_style
+
+MARGIN = 10
+CHAR_WIDTH = 0.55   # largeur moyenne d'un caractère, en fraction de fontSize
+LINE_HEIGHT = 1.2
+SHAPES = ("rect", "ellipse", "doubleEllipse", "rhombus", "hexagon", "note", "line", "triangle", "swimlane", "text")
+
+# --- Styles ---------------------------------------------------------------------------
+
+def _resolve(style: str, named: bool = False) -> dict[str, str | None]:
+    """
+    Parsed style; with `named` (file written with named_styles=True), "name;"
+    references to the shared registry are expanded. Bare draw.io base tokens
+    ("swimlane;", "note;"...) are never expanded.
+    """
+    entries: dict[str, str | None] = {}
+    for key, value in parse_style(style).items():
+        if named and value is None and key in STYLES and key not in DRAWIO_BASE_STYLES:
+            entries.update(STYLES.parsed(STYLES[key]))
+        else:
+            entries[key] = value
+    return entries
+
+def _color(value, default: str) -> str:
+    if value is None:
+        return default
+    return "none" if value in ("none", "") else value
+
+class _Look:
+    """Render attributes of one style string, computed once per page and style."""
+    __slots__ = (
+        "shape", "paint", "rounded", "size", "start_size", "horizontal", "direction", "rotation",
+        "font", "font_size", "align", "valign", "label_pos", "vlabel_pos", "spacing", "wrap", "html",
+        "orthogonal", "end", "start", "label_bg", "exit", "entry", "stroke", "stroke_width",
+        "fill", "swimlane_fill",
+    )
+
+    def __init__(self, style: str, edge: bool, named: bool = False):
+        s = _resolve(style, named)
+        shape = s.get("shape")
+        if shape is None:
+            shape = next((k for k, v in s.items() if v is None and k in SHAPES), "rect")
+        self.shape = shape
+        self.stroke = _color(s.get("strokeColor"), "#000000")
+        self.stroke_width = float(s.get("strokeWidth", 1))
+        default_fill = "none" if edge or shape in ("text", "line") else "#ffffff"
+        self.fill = _color(s.get("fillColor"), default_fill)
+        self.swimlane_fill = _color(s.get("swimlaneFillColor"), "none")
+        paint = f' stroke="{self.stroke}" stroke-width="{self.stroke_width:g}"'
+        if s.get("dashed") == "1":
+            paint += f' stroke-dasharray="{s.get("dashPattern") or "3 3"}"'
+        if shape == "text" and "strokeColor" not in s:
+            paint = ' stroke="none"'
+        self.paint = paint
+        self.rounded = s.get("rounded") == "1"
+        self.size = float(s["size"]) if s.get("size") else None
+        self.start_size = float(s.get("startSize", 40))
+        self.horizontal = s.get("horizontal", "1") != "0"
+        self.direction = s.get("direction", "east")
+        self.rotation = float(s.get("rotation", 0))
+
+        self.font_size = float(s.get("fontSize", 11 if edge else 12))
+        font_style = int(s.get("fontStyle", 0))
+        font = f' font-family="{s.get("fontFamily", "Helvetica")}" font-size="{self.font_size:g}"'
+        font += f' fill="{_color(s.get("fontColor"), "#000000")}"'
+        if font_style & 1:
+            font += ' font-weight="bold"'
+        if font_style & 2:
+            font += ' font-style="italic"'
+        if font_style & 4:
+            font += ' text-decoration="underline"'
+        self.font = font
+        self.align = s.get("align", "center")
+        self.valign = s.get("verticalAlign", "middle")
+        self.label_pos = s.get("labelPosition", "center")
+        self.vlabel_pos = s.get("verticalLabelPosition", "middle")
+        self.spacing = float(s.get("spacing", 2))
+        self.wrap = s.get("whiteSpace") == "wrap"
+        self.html = s.get("html") == "1"
+
+        self.orthogonal = s.get("edgeStyle") in ("orthogonalEdgeStyle", "elbowEdgeStyle", "entityRelationEdgeStyle")
+        end = s.get("endArrow", "classic" if edge else "none")
+        self.end = None if end == "none" else (end, s.get("endFill", "1") != "0")
+        start = s.get("startArrow", "none")
+        self.start = None if start == "none" else (start, s.get("startFill", "1") != "0")
+        self.label_bg = _color(s.get("labelBackgroundColor"), "#ffffff" if edge else "none")
+        self.exit = _constraint(s, "exitX", "exitY")
+        self.entry = _constraint(s, "entryX", "entryY")
+
+def _constraint(s: dict, kx: str, ky: str) -> tuple[float, float] | None:
+    if s.get(kx) is None or s.get(ky) is None:
+        return None
+    return float(s[kx]), float(s[ky])
+
+# --- Géométrie ------------------------------------------------------------------------
+
+def _perimeter(box, shape: str, toward: tuple[float, float]) -> tuple[float, float]:
+    """Point where the segment centre -> `toward` leaves the shape."""
+    x, y, w, h = box
+    cx, cy = x + w / 2, y + h / 2
+    dx, dy = toward[0] - cx, toward[1] - cy
+    if (dx == 0 and dy == 0) or w == 0 or h == 0:
+        return cx, cy
+    if shape in ("ellipse", "doubleEllipse"):
+        t = 1 / hypot(dx / (w / 2), dy / (h / 2))
+    elif shape == "rhombus":
+        t = 1 / (abs(dx) / (w / 2) + abs(dy) / (h / 2))
+    else:
+        t = min(w / 2 / abs(dx) if dx else float("inf"), h / 2 / abs(dy) if dy else float("inf"))
+    t = min(t, 1.0)
+    return cx + dx * t, cy + dy * t
+
+def _side_point(box, toward: tuple[float, float], horizontal: bool) -> tuple[float, float]:
+    x, y, w, h = box
+    if horizontal:
+        return (x + w if toward[0] > x + w / 2 else x), y + h / 2
+    return x + w / 2, (y + h if toward[1] > y + h / 2 else y)
+
+def _orthogonal_route(s, t) -> list[tuple[float, float]]:
+    """Axis-aligned route between two boxes: straight if they face each other, else one elbow."""
+    sx, sy, sw, sh = s
+    tx, ty, tw, th = t
+    lo, hi = max(sx, tx), min(sx + sw, tx + tw)
+    if lo < hi:  # superposées en x: segment vertical
+        x = (lo + hi) / 2
+        return [(x, sy + sh), (x, ty)] if ty > sy else [(x, sy), (x, ty + th)]
+    lo, hi = max(sy, ty), min(sy + sh, ty + th)
+    if lo < hi:  # superposées en y: segment horizontal
+        y = (lo + hi) / 2
+        return [(sx + sw, y), (tx, y)] if tx > sx else [(sx, y), (tx + tw, y)]
+    scx, scy = sx + sw / 2, sy + sh / 2
+    tcx, tcy = tx + tw / 2, ty + th / 2
+    if abs(tcx - scx) >= abs(tcy - scy):
+        x0 = sx + sw if tcx > scx else sx
+        x1 = tx if tcx > scx else tx + tw
+        mid = (x0 + x1) / 2
+        return [(x0, scy), (mid, scy), (mid, tcy), (x1, tcy)]
+    y0 = sy + sh if tcy > scy else sy
+    y1 = ty if tcy > scy else ty + th
+    mid = (y0 + y1) / 2
+    return [(scx, y0), (scx, mid), (tcx, mid), (tcx, y1)]
+
+def _elbows(points: list[tuple[float, float]]) -> list[tuple[float, float]]:
+    """Insert a corner between consecutive points that are not axis-aligned."""
+    out = [points[0]]
+    for p in points[1:]:
+        q = out[-1]
+        if q[0] != p[0] and q[1] != p[1]:
+            out.append((p[0], q[1]))
+        out.append(p)
+    return out
+
+def _label_anchor(points: list[tuple[float, float]]) -> tuple[float, float]:
+    """Middle of a polyline, by length."""
+    lengths = [hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(points, points[1:])]
+    half = sum(lengths) / 2
+    for (a, b), length in zip(zip(points, points[1:]), lengths):
+        if half <= length and length:
+            t = half / length
+            return a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t
+        half -= length
+    return points[0]
+
+# --- Texte ----------------------------------------------------------------------------
+
+_BR = re.compile(r"<br\s*/?>|</(?:div|p)>", re.IGNORECASE)
+_TAG = re.compile(r"<[^>]+>")
+
+def _label_lines(value: str, look: _Look, width: float) -> list[str]:
+    if look.html:
+        value = html.unescape(_TAG.sub("", _BR.sub("\n", value)))
+    lines = value.split("\n")
+    if not look.wrap or width <= 0:
+        return lines
+    max_chars = max(1, int(width / (look.font_size * CHAR_WIDTH)))
+    wrapped = []
+    for line in lines:
+        current = ""
+        for word in line.split(" "):
+            if current and len(current) + 1 + len(word) > max_chars:
+                wrapped.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        wrapped.append(current)
+    return wrapped
+
+def _text(out: list[str], lines: list[str], box, look: _Look, background: str = "none"):
+    x, y, w, h = box
+    sp = look.spacing
+    fs = look.font_size
+    lh = fs * LINE_HEIGHT
+    total = lh * len(lines)
+    if look.align == "left":
+        tx, anchor = x + sp, "start"
+    elif look.align == "right":
+        tx, anchor = x + w - sp, "end"
+    else:
+        tx, anchor = x + w / 2, "middle"
+    if look.valign == "top":
+        top = y + sp
+    elif look.valign == "bottom":
+        top = y + h - sp - total
+    else:
+        top = y + (h - total) / 2
+    if background != "none":
+        width = max(len(line) for line in lines) * fs * CHAR_WIDTH + 4
+        left = {"start": tx, "middle": tx - width / 2, "end": tx - width}[anchor]
+        out.append(f'<rect x="{left - 2:.1f}" y="{top:.1f}" width="{width:.1f}" height="{total:.1f}" fill="{background}"/>')
+    out.append(f'<text text-anchor="{anchor}"{look.font}>')
+    baseline = top + fs * 0.9
+    for line in lines:
+        out.append(f'<tspan x="{tx:.1f}" y="{baseline:.1f}">{escape(line)}</tspan>')
+        baseline += lh
+    out.append("</text>")
+
+# --- Formes ---------------------------------------------------------------------------
+
+def _polygon(points, paint_fill: str) -> str:
+    pts = " ".join(f"{px:.1f},{py:.1f}" for px, py in points)
+    return f'<polygon points="{pts}"{paint_fill}/>'
+
+def _shape(out: list[str], look: _Look, x, y, w, h):
+    fill = f' fill="{look.fill}"'
+    pf = look.paint + fill
+    shape = look.shape
+    if shape == "text":
+        if look.fill != "none":
+            out.append(f'<rect x="{x:g}" y="{y:g}" width="{w:g}" height="{h:g}"{pf}/>')
+    elif shape == "ellipse":
+        out.append(f'<ellipse cx="{x + w / 2:g}" cy="{y + h / 2:g}" rx="{w / 2:g}" ry="{h / 2:g}"{pf}/>')
+    elif shape == "doubleEllipse":
+        inset = min(4 + look.stroke_width, w / 5, h / 5)
+        out.append(f'<ellipse cx="{x + w / 2:g}" cy="{y + h / 2:g}" rx="{w / 2:g}" ry="{h / 2:g}"{pf}/>')
+        out.append(f'<ellipse cx="{x + w / 2:g}" cy="{y + h / 2:g}" rx="{w / 2 - inset:g}" ry="{h / 2 - inset:g}"{pf}/>')
+    elif shape == "rhombus":
+        out.append(_polygon(((x + w / 2, y), (x + w, y + h / 2), (x + w / 2, y + h), (x, y + h / 2)), pf))
+    elif shape == "hexagon":
+        s = w * (look.size if look.size is not None and look.size < 1 else 0.25)
+        out.append(_polygon(((x + s, y), (x + w - s, y), (x + w, y + h / 2), (x + w - s, y + h), (x + s, y + h), (x, y + h / 2)), pf))
+    elif shape == "note":
+        s = min(look.size if look.size is not None else 30, w, h)
+        out.append(_polygon(((x, y), (x + w - s, y), (x + w, y + s), (x + w, y + h), (x, y + h)), pf))
+        out.append(f'<path d="M{x + w - s:g},{y:g}L{x + w - s:g},{y + s:g}L{x + w:g},{y + s:g}" fill="none"{look.paint}/>')
+    elif shape == "line":
+        out.append(f'<line x1="{x:g}" y1="{y + h / 2:g}" x2="{x + w:g}" y2="{y + h / 2:g}"{look.paint}/>')
+    elif shape == "triangle":
+        d = look.direction
+        if d == "north":
+            pts = ((x, y + h), (x + w / 2, y), (x + w, y + h))
+        elif d == "south":
+            pts = ((x, y), (x + w, y), (x + w / 2, y + h))
+        elif d == "west":
+            pts = ((x + w, y), (x, y + h / 2), (x + w, y + h))
+        else:
+            pts = ((x, y), (x + w, y + h / 2), (x, y + h))
+        out.append(_polygon(pts, pf))
+    elif shape == "swimlane":
+        ss = min(look.start_size, h if look.horizontal else w)
+        if look.horizontal:
+            head = (x, y, w, ss)
+            sep = f"M{x:g},{y + ss:g}L{x + w:g},{y + ss:g}"
+        else:
+            head = (x, y, ss, h)
+            sep = f"M{x + ss:g},{y:g}L{x + ss:g},{y + h:g}"
+        out.append(f'<rect x="{x:g}" y="{y:g}" width="{w:g}" height="{h:g}" fill="{look.swimlane_fill}"{look.paint}/>')
+        out.append(f'<rect x="{head[0]:g}" y="{head[1]:g}" width="{head[2]:g}" height="{head[3]:g}"{pf}/>')
+        out.append(f'<path d="{sep}" fill="none"{look.paint}/>')
+    else:
+        rx = f' rx="{min(w, h) * 0.15:g}"' if look.rounded else ""
+        out.append(f'<rect x="{x:g}" y="{y:g}" width="{w:g}" height="{h:g}"{rx}{pf}/>')
+
+def _label_box(look: _Look, x, y, w, h):
+    if look.shape == "swimlane":
+        ss = min(look.start_size, h if look.horizontal else w)
+        return (x, y, w, ss) if look.horizontal else (x, y, ss, h)
+    dx = {"left": -w, "right": w}.get(look.label_pos, 0)
+    dy = {"top": -h, "bottom": h}.get(look.vlabel_pos, 0)
+    return x + dx, y + dy, w, h
+
+# --- Flèches --------------------------------------------------------------------------
+
+_MARKERS = {
+    "block": '<path d="M0,0L10,5L0,10z"{paint}/>',
+    "classic": '<path d="M0,0L10,5L0,10L3,5z"{paint}/>',
+    "open": '<path d="M0,0L10,5L0,10" fill="none" stroke="{color}" stroke-width="1.5"/>',
+    "oval": '<circle cx="5" cy="5" r="4"{paint}/>',
+    "diamond": '<path d="M0,5L5,0L10,5L5,10z"{paint}/>',
+}
+
+class _Markers:
+    """<marker> definitions, created on first use for each (arrow, fill, color)."""
+
+    def __init__(self):
+        self.ids: dict[tuple, str] = {}
+        self.defs: list[str] = []
+
+    def ref(self, arrow: tuple[str, bool] | None, color: str) -> str | None:
+        if arrow is None:
+            return None
+        name, filled = arrow
+        key = (name, filled, color)
+        mid = self.ids.get(key)
+        if mid is None:
+            mid = self.ids[key] = f"m{len(self.ids)}"
+            template = _MARKERS.get(name, _MARKERS["classic"])
+            fill = color if filled else "#ffffff"
+            paint = f' fill="{fill}" stroke="{color}"'
+            ref_x = 5 if name == "oval" else 10
+            self.defs.append(
+                f'<marker id="{mid}" viewBox="-1 -1 12 12" refX="{ref_x}" refY="5" markerWidth="8" markerHeight="8" '
+                f'orient="auto-start-reverse" markerUnits="userSpaceOnUse">{template.format(paint=paint, color=color)}</marker>'
+            )
+        return mid
+
+# --- Page -----------------------------------------------------------------------------
+
+def render_page(table: CellTable, background: str = "#ffffff") -> str:
+    """SVG document of one page, in cell (z-)order."""
+    ax, ay = table.absolute()
+    kind, ws, hs = table.kind, table.w, table.h
+    looks: dict[tuple[int, bool], _Look] = {}
+    markers = _Markers()
+    body: list[str] = []
+    min_x = min_y = float("inf")
+    max_x = max_y = float("-inf")
+
+    def box(r):
+        w, h = ws[r], hs[r]
+        return ax[r], ay[r], (0.0 if isnan(w) else w), (0.0 if isnan(h) else h)
+
+    def look_of(r, edge):
+        key = (table.style[r], edge)
+        look = looks.get(key)
+        if look is None:
+            look = looks[key] = _Look(table.style_of(r), edge, table.named_styles)
+        return look
+
+    for r in table.order:
+        k = kind[r]
+        if k == KIND_VERTEX:
+            look = look_of(r, False)
+            x, y, w, h = box(r)
+            min_x, min_y = min(min_x, x), min(min_y, y)
+            max_x, max_y = max(max_x, x + w), max(max_y, y + h)
+            if look.rotation:
+                body.append(f'<g transform="rotate({look.rotation:g} {x + w / 2:g} {y + h / 2:g})">')
+            _shape(body, look, x, y, w, h)
+            value = table.labels[r]
+            if value:
+                lbox = _label_box(look, x, y, w, h)
+                _text(body, _label_lines(value, look, lbox[2] - 2 * look.spacing), lbox, look)
+            if look.rotation:
+                body.append("</g>")
+        elif k == KIND_EDGE:
+            look = look_of(r, True)
+            points = _edge_points(table, r, look, box, ax, ay, look_of)
+            if not points:
+                continue
+            for px, py in points:
+                min_x, min_y = min(min_x, px), min(min_y, py)
+                max_x, max_y = max(max_x, px), max(max_y, py)
+            d = "M" + "L".join(f"{px:.1f},{py:.1f}" for px, py in points)
+            attrs = ""
+            end = markers.ref(look.end, look.stroke)
+            if end:
+                attrs += f' marker-end="url(#{end})"'
+            start = markers.ref(look.start, look.stroke)
+            if start:
+                attrs += f' marker-start="url(#{start})"'
+            body.append(f'<path d="{d}" fill="none"{look.paint}{attrs}/>')
+            value = table.labels[r]
+            if value:
+                lines = _label_lines(value, look, 0)
+                lx, ly = _label_anchor(points)
+                tw = max(len(line) for line in lines) * look.font_size * CHAR_WIDTH
+                th = len(lines) * look.font_size * LINE_HEIGHT
+                _text(body, lines, (lx - tw / 2, ly - th / 2, tw, th), look, look.label_bg)
+
+    if min_x == float("inf"):
+        min_x = min_y = max_x = max_y = 0.0
+    x0, y0 = min_x - MARGIN, min_y - MARGIN
+    width, height = max_x - min_x + 2 * MARGIN, max_y - min_y + 2 * MARGIN
+    head = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+        f'viewBox="{x0:.1f} {y0:.1f} {width:.1f} {height:.1f}">',
+    ]
+    if markers.defs:
+        head.append("<defs>" + "".join(markers.defs) + "</defs>")
+    if background != "none":
+        head.append(f'<rect x="{x0:.1f}" y="{y0:.1f}" width="{width:.1f}" height="{height:.1f}" fill="{background}"/>')
+    return "\n".join(head + body + ["</svg>", ""])
+
+def _edge_points(table: CellTable, r: int, look: _Look, box, ax, ay, look_of) -> list[tuple[float, float]]:
+    s, t = table.source[r], table.target[r]
+    if s == NO_REF or t == NO_REF or table.kind[s] != KIND_VERTEX or table.kind[t] != KIND_VERTEX:
+        return []
+    sb, tb = box(s), box(t)
+    p = table.parent[r]
+    ox, oy = (ax[p], ay[p]) if p != NO_REF and table.kind[p] == KIND_VERTEX else (0.0, 0.0)
+    waypoints = [(ox + px, oy + py) for px, py in table.points.get(r, ())]
+
+    if s == t and not waypoints:  # boucle sur le même sommet, côté droit
+        x, y, w, h = sb
+        d = max(20.0, h / 4)
+        return [(x + w, y + h / 3), (x + w + d, y + h / 3), (x + w + d, y + 2 * h / 3), (x + w, y + 2 * h / 3)]
+
+    start = (sb[0] + look.exit[0] * sb[2], sb[1] + look.exit[1] * sb[3]) if look.exit else None
+    end = (tb[0] + look.entry[0] * tb[2], tb[1] + look.entry[1] * tb[3]) if look.entry else None
+    if look.orthogonal:
+        if not waypoints and start is None and end is None:
+            return _orthogonal_route(sb, tb)
+        first = waypoints[0] if waypoints else (end or (tb[0] + tb[2] / 2, tb[1] + tb[3] / 2))
+        last = waypoints[-1] if waypoints else (start or (sb[0] + sb[2] / 2, sb[1] + sb[3] / 2))
+        if start is None:
+            start = _side_point(sb, first, abs(first[0] - sb[0] - sb[2] / 2) >= abs(first[1] - sb[1] - sb[3] / 2))
+        if end is None:
+            end = _side_point(tb, last, abs(last[0] - tb[0] - tb[2] / 2) >= abs(last[1] - tb[1] - tb[3] / 2))
+        return _elbows([start] + waypoints + [end])
+    first = waypoints[0] if waypoints else (end or (tb[0] + tb[2] / 2, tb[1] + tb[3] / 2))
+    last = waypoints[-1] if waypoints else (start or (sb[0] + sb[2] / 2, sb[1] + sb[3] / 2))
+    start = start or _perimeter(sb, look_of(s, False).shape, first)
+    end = end or _perimeter(tb, look_of(t, False).shape, last)
+    return [start] + waypoints + [end]
+
+# --- Fichiers -------------------------------------------------------------------------
+
+def svg_to_png(svg: str, path: str | Path, scale: float = 1.0):
+    try:
+        import cairosvg
+    except Exception:
+        raise RuntimeError("CairoSVG est requis pour la sortie PNG (pip install cairosvg); utilisez la sortie SVG sinon.") from None
+    cairosvg.svg2png(bytestring=svg.encode("utf-8"), write_to=str(path), scale=scale)
+
+def _safe_name(name: str) -> str:
+    # Même convention que les exports draw.io de images/: caractères interdits -> "_"
+    return re.sub(r'[\\/:*?"<>|]', "_", name).strip()
+
+def _render_job(table: CellTable, path: str, fmt: str) -> str:
+    svg = render_page(table)
+    if fmt == "png":
+        svg_to_png(svg, path)
+    else:
+        Path(path).write_text(svg, encoding="utf-8")
+    return path
+
+def render(source, out_dir: str | Path = ".", stem: str = "diagram", fmt: str = "svg", workers: int = 1) -> list[Path]:
+    """
+    Render every page of `source` (see page_tables) to <out_dir>/<stem>-<page>.drawio.<fmt>,
+    or <stem>.drawio.<fmt> for a single page; pages are rendered in a process pool if workers > 1.
+    """
+    if fmt not in ("svg", "png"):
+        raise ValueError(f"Format de sortie inconnu: {fmt!r} (svg ou png)")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tables = page_tables(source)
+    if len(tables) == 1:
+        paths = [out_dir / f"{stem}.drawio.{fmt}"]
+    else:
+        paths = [out_dir / f"{stem}-{_safe_name(t.name)}.drawio.{fmt}" for t in tables]
+    jobs = [(t, str(p), fmt) for t, p in zip(tables, paths)]
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            _render_job(*job)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            list(pool.map(_render_job, *zip(*jobs)))
+    return paths
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Rendu SVG/PNG de fichiers .drawio sans l'application draw.io.")
+    parser.add_argument("inputs", nargs="+", help="fichiers .drawio")
+    parser.add_argument("-o", "--out-dir", default="images", help="dossier de sortie (défaut: images)")
+    parser.add_argument("--png", action="store_true", help="écrire des PNG (CairoSVG requis)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="nombre de processus (pages en parallèle)")
+    args = parser.parse_args(argv)
+
+    status = 0
+    for item in args.inputs:
+        path = Path(item)
+        try:
+            outputs = render(path, args.out_dir, path.name.removesuffix(".drawio"), "png" if args.png else "svg", args.jobs)
+        except (OSError, ET.ParseError, ValueError, RuntimeError) as e:
+            print(f"{path}: échec du rendu ({e})", file=sys.stderr)
+            status = 1
+            continue
+        for out in outputs:
+            print(f"Image générée: {out}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
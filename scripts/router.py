@@ -0,0 +1,642 @@
+"""
+Obstacle-avoiding orthogonal edge routing for draw.io pages.
+
+add_edge() only writes a relative mxGeometry and leaves routing to draw.io: on
+big generated pages edges cut straight through shapes, and draw.io re-routes
+every edge when the file is opened. route_table() computes the routes once,
+for all the edges of a page:
+
+- vertices (actions, states, notes, composites...) are obstacles, kept in a
+  uniform grid index: testing a segment only looks at the shapes listed in
+  the grid cells it crosses. Swimlanes are not, and neither is a shape that
+  overlaps one end of the edge (its container, a ring drawn around it);
+- each edge tries the routes with the fewest bends first (straight, L, then Z
+  through the free channels along the obstacles) and falls back to an A*
+  search over the sparse grid of obstacle sides around its two ends;
+- placed routes are indexed too, so crossings and overlaps with them are
+  penalized; edges are routed shortest first.
+
+Routes are written the way draw.io stores them: waypoints in the mxGeometry
+(Array as="points") and fixed exitX/exitY/entryX/entryY in the edge style.
+Loops, edges whose style already fixes their ends (sequence messages) and
+edges that already have waypoints are left untouched.
+
+    python router.py diagrammes/atm_activity_examples.drawio          # en place
+    python router.py entree.drawio -o sortie.drawio
+
+    from router import route
+    route(builder)   # DrawIOBuilder ou CompactDrawIOBuilder, avant save()
+"""
+from __future__ import annotations
+
+import heapq
+import shutil
+import sys
+import xml.etree.ElementTree as ET
+from bisect import bisect_left, bisect_right
+from math import isnan
+from pathlib import Path
+
+import instrument
+from drawio_model import KIND_EDGE, KIND_VERTEX, NO_REF, CellTable
+from drawio_reader import WRAPPER_TAGS, page_tables, table_from_diagram
+from styles import STYLES, format_style
+
+MARGIN = 10.0       # distance minimale entre une route et un obstacle
+BEND = 30.0         # coût d'un coude, en pixels de longueur équivalente
+CROSSING = 60.0     # coût d'un croisement avec une route déjà placée
+OVERLAP = 200.0     # coût d'un tronçon superposé à une autre route
+CHANNELS = 6        # couloirs candidats par route en Z
+WINDOW = 160.0      # marge de la fenêtre de recherche A* autour des deux extrémités
+MAX_EXPANSIONS = 20000
+
+# Formes dont les ports sont les milieux des côtés (le bord n'est pas le rectangle englobant)
+ROUND_SHAPES = {"ellipse", "doubleEllipse", "rhombus", "hexagon", "triangle", "cloud", "umlActor", "actor"}
+_FIXED_KEYS = ("exitX", "exitY", "entryX", "entryY")
+
+class GridIndex:
+    """Uniform grid over axis-aligned boxes: each box is listed in every grid cell it overlaps."""
+    __slots__ = ("size", "cells", "boxes")
+
+    def __init__(self, size: float):
+        self.size = size
+        self.cells: dict[tuple[int, int], list[int]] = {}
+        self.boxes: list[tuple[float, float, float, float]] = []   # x0, y0, x1, y1
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def insert(self, x0: float, y0: float, x1: float, y1: float) -> int:
+        key = len(self.boxes)
+        self.boxes.append((x0, y0, x1, y1))
+        s = self.size
+        cells = self.cells
+        for i in range(int(x0 // s), int(x1 // s) + 1):
+            for j in range(int(y0 // s), int(y1 // s) + 1):
+                bucket = cells.get((i, j))
+                if bucket is None:
+                    cells[(i, j)] = [key]
+                else:
+                    bucket.append(key)
+        return key
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> set[int]:
+        """Keys of the boxes listed in the grid cells overlapping the box (a superset of the hits)."""
+        s = self.size
+        cells = self.cells
+        found: set[int] = set()
+        for i in range(int(x0 // s), int(x1 // s) + 1):
+            for j in range(int(y0 // s), int(y1 // s) + 1):
+                bucket = cells.get((i, j))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+class RouteStats:
+    __slots__ = ("routed", "searched", "failed", "skipped", "bends", "crossings")
+
+    def __init__(self):
+        self.routed = 0      # arêtes routées
+        self.searched = 0    # dont par la recherche A*
+        self.failed = 0      # aucune route sans obstacle: laissées à draw.io
+        self.skipped = 0     # boucles, extrémités imposées, points existants...
+        self.bends = 0
+        self.crossings = 0
+
+    def add(self, other: RouteStats):
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def __str__(self) -> str:
+        return (f"{self.routed} arête(s) routée(s) ({self.searched} par recherche), {self.failed} sans route, "
+                f"{self.skipped} ignorée(s); {self.bends} coude(s), {self.crossings} croisement(s)")
+
+def _inside(box, p) -> bool:
+    return box[0] <= p[0] <= box[2] and box[1] <= p[1] <= box[3]
+
+def _leave(box, a, b):
+    """Point where the axis-aligned segment a -> b (a in `box`) crosses the border of `box`."""
+    x0, y0, x1, y1 = box
+    if a[1] == b[1]:
+        return (x1 if b[0] > a[0] else x0), a[1]
+    return a[0], (y1 if b[1] > a[1] else y0)
+
+def _simplify(points: list) -> list:
+    """Drop repeated and collinear points."""
+    out = [points[0]]
+    for p in points[1:]:
+        if p == out[-1]:
+            continue
+        if len(out) >= 2:
+            a, b = out[-2], out[-1]
+            if (a[0] == b[0] == p[0]) or (a[1] == b[1] == p[1]):
+                out[-1] = p
+                continue
+        out.append(p)
+    return out
+
+def _clip(points: list, sbox, tbox):
+    """
+    Cut a polyline running from inside the source box to inside the target box
+    down to the part between the two borders; None if it does not leave the
+    source before reaching the target.
+    """
+    n = len(points)
+    i = 0
+    while i + 1 < n and _inside(sbox, points[i + 1]):
+        i += 1
+    j = n - 1
+    while j - 1 > i and _inside(tbox, points[j - 1]):
+        j -= 1
+    if i + 1 >= n or j <= i:
+        return None
+    start = _leave(sbox, points[i], points[i + 1])
+    end = _leave(tbox, points[j], points[j - 1])
+    route = [start] + points[i + 1:j] + [end]
+    if len(route) == 2 and route[0] == route[1]:
+        return None
+    return route
+
+class _Page:
+    """Obstacle and route indexes of one page, shared by all its edges."""
+
+    def __init__(self, table: CellTable, margin: float):
+        self.table = table
+        self.margin = margin
+        self.ax, self.ay = table.absolute()
+        kind, parent = table.kind, table.parent
+        self._shapes: dict[int, tuple[bool, bool]] = {}   # style -> (ports aux milieux, couloir)
+        self.boxes: dict[int, tuple[float, float, float, float]] = {}
+        obstacles = []
+        for r in table.order:
+            if kind[r] != KIND_VERTEX:
+                continue
+            w, h = table.w[r], table.h[r]
+            if isnan(w) or isnan(h) or w <= 0 or h <= 0:
+                continue
+            p = parent[r]
+            if p != NO_REF and kind[p] == KIND_EDGE:
+                continue  # libellé d'arête
+            self.boxes[r] = (self.ax[r], self.ay[r], self.ax[r] + w, self.ay[r] + h)
+            # Les couloirs se traversent; les conteneurs (composites, régions) ne gênent que les
+            # arêtes qui n'y ont pas d'extrémité (voir touching())
+            if not self._shape(r)[1]:
+                obstacles.append(r)
+        # Maille de la grille: deux fois la taille moyenne d'un obstacle
+        size = 100.0
+        if obstacles:
+            size = 2 * sum(max(b[2] - b[0], b[3] - b[1]) for b in map(self.boxes.get, obstacles)) / len(obstacles)
+        self.obstacles = GridIndex(max(size, 40.0))
+        m = margin - 0.5
+        for r in obstacles:
+            x0, y0, x1, y1 = self.boxes[r]
+            self.obstacles.insert(x0 - m, y0 - m, x1 + m, y1 + m)
+        self.segments = GridIndex(self.obstacles.size)
+        self.segment_ends: list[tuple[int, int]] = []   # (source, cible) de l'arête de chaque tronçon
+
+    def _shape(self, r: int) -> tuple[bool, bool]:
+        sid = self.table.style[r]
+        shape = self._shapes.get(sid)
+        if shape is None:
+            entries = dict(STYLES.parsed(self.table.style_of(r)))
+            for key, value in list(entries.items()):
+                if value is None and key in STYLES:
+                    entries.update(STYLES.parsed(STYLES[key]))
+            tokens = {entries.get("shape"), *(k for k, v in entries.items() if v is None)}
+            shape = self._shapes[sid] = (bool(ROUND_SHAPES & tokens), "swimlane" in tokens)
+        return shape
+
+    def round_ports(self, r: int) -> bool:
+        """True if the ports of vertex `r` must be the middles of its sides."""
+        return self._shape(r)[0]
+
+    def touching(self, r: int) -> set[int]:
+        """Obstacle keys of the shapes overlapping vertex `r` (itself, its children, a ring drawn around it...)."""
+        x0, y0, x1, y1 = self.boxes[r]
+        m = self.margin - 0.5
+        boxes = self.obstacles.boxes
+        return {k for k in self.obstacles.query(x0, y0, x1, y1)
+                if boxes[k][0] + m < x1 and x0 < boxes[k][2] - m and boxes[k][1] + m < y1 and y0 < boxes[k][3] - m}
+
+    def blocked(self, a, b, skip: set[int]) -> bool:
+        x0, x1 = (a[0], b[0]) if a[0] <= b[0] else (b[0], a[0])
+        y0, y1 = (a[1], b[1]) if a[1] <= b[1] else (b[1], a[1])
+        boxes = self.obstacles.boxes
+        for k in self.obstacles.query(x0, y0, x1, y1):
+            if k in skip:
+                continue
+            ox0, oy0, ox1, oy1 = boxes[k]
+            if x0 < ox1 and ox0 < x1 and y0 < oy1 and oy0 < y1:
+                return True
+        return False
+
+    def conflicts(self, a, b, ends: tuple[int, int]) -> tuple[int, int]:
+        """(crossings, overlaps) of segment a-b with the routes already placed."""
+        x0, x1 = (a[0], b[0]) if a[0] <= b[0] else (b[0], a[0])
+        y0, y1 = (a[1], b[1]) if a[1] <= b[1] else (b[1], a[1])
+        horizontal = y0 == y1
+        crossings = overlaps = 0
+        boxes = self.segments.boxes
+        for k in self.segments.query(x0, y0, x1, y1):
+            sx0, sy0, sx1, sy1 = boxes[k]
+            if (sy0 == sy1) == horizontal:
+                # Parallèles: superposition sur la même ligne, tolérée entre arêtes d'un même sommet
+                same_line = sy0 == y0 if horizontal else sx0 == x0
+                if same_line and (min(x1, sx1) - max(x0, sx0) > 1 if horizontal else min(y1, sy1) - max(y0, sy0) > 1):
+                    e = self.segment_ends[k]
+                    if e[0] not in ends and e[1] not in ends:
+                        overlaps += 1
+            elif horizontal:
+                if x0 < sx0 < x1 and sy0 < y0 < sy1:
+                    crossings += 1
+            elif y0 < sy0 < y1 and sx0 < x0 < sx1:
+                crossings += 1
+        return crossings, overlaps
+
+    def place(self, route: list, ends: tuple[int, int]):
+        for a, b in zip(route, route[1:]):
+            self.segments.insert(min(a[0], b[0]), min(a[1], b[1]), max(a[0], b[0]), max(a[1], b[1]))
+            self.segment_ends.append(ends)
+
+class _Edge:
+    """Routing context of one edge: its end boxes, ports and the obstacles it may touch."""
+    __slots__ = ("page", "sbox", "tbox", "sround", "tround", "skip", "ends")
+
+    def __init__(self, page: _Page, s: int, t: int):
+        self.page = page
+        self.sbox, self.tbox = page.boxes[s], page.boxes[t]
+        self.sround, self.tround = page.round_ports(s), page.round_ports(t)
+        self.skip = page.touching(s) | page.touching(t)
+        self.ends = (s, t)
+
+    def _port_ok(self, box, p, round_) -> bool:
+        if not round_:
+            return box[0] < p[0] < box[2] or box[1] < p[1] < box[3]   # pas sur un coin
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        return abs(p[0] - cx) < 0.5 or abs(p[1] - cy) < 0.5
+
+    def clip(self, points: list) -> tuple[float, list] | None:
+        """(length and bends cost, route between the two borders) of a center-to-center polyline."""
+        route = _clip(_simplify(points), self.sbox, self.tbox)
+        if route is None or not (self._port_ok(self.sbox, route[0], self.sround)
+                                 and self._port_ok(self.tbox, route[-1], self.tround)):
+            return None
+        length = sum(abs(b[0] - a[0]) + abs(b[1] - a[1]) for a, b in zip(route, route[1:]))
+        return length + BEND * (len(route) - 2), route
+
+    def evaluate(self, base: float, route: list) -> tuple[float, list, int] | None:
+        """(cost, route, crossings) with the penalties of the placed routes; None if it hits an obstacle."""
+        page = self.page
+        crossings = overlaps = 0
+        for a, b in zip(route, route[1:]):
+            if page.blocked(a, b, self.skip) or _cuts(self.sbox, a, b) or _cuts(self.tbox, a, b):
+                return None
+            c, o = page.conflicts(a, b, self.ends)
+            crossings += c
+            overlaps += o
+        return base + CROSSING * crossings + OVERLAP * overlaps, route, crossings
+
+    def _level(self, polylines: list) -> list[tuple[float, list]]:
+        routes = {}
+        for points in polylines:
+            clipped = self.clip(points)
+            if clipped is not None:
+                routes.setdefault(tuple(clipped[1]), clipped[0])
+        return sorted(((base, list(route)) for route, base in routes.items()), key=lambda c: c[0])
+
+    def candidates(self):
+        """
+        Routes by number of bends (straight, L, Z), each level sorted by its length
+        and bends cost, a lower bound of the full cost. Levels are built lazily.
+        """
+        sx0, sy0, sx1, sy1 = self.sbox
+        tx0, ty0, tx1, ty1 = self.tbox
+        scx, scy = (sx0 + sx1) / 2, (sy0 + sy1) / 2
+        tcx, tcy = (tx0 + tx1) / 2, (ty0 + ty1) / 2
+        margin = self.page.margin
+        straight = []
+        # Droites: dans la bande commune aux deux sommets (ports libres), sinon alignement des centres
+        lo, hi = (max(sx0, tx0), min(sx1, tx1))
+        if self.sround:
+            lo, hi = max(lo, scx), min(hi, scx)
+        if self.tround:
+            lo, hi = max(lo, tcx), min(hi, tcx)
+        if lo <= hi:
+            x = min(max((scx + tcx) / 2, lo), hi)
+            straight.append([(x, scy), (x, tcy)])
+        lo, hi = (max(sy0, ty0), min(sy1, ty1))
+        if self.sround:
+            lo, hi = max(lo, scy), min(hi, scy)
+        if self.tround:
+            lo, hi = max(lo, tcy), min(hi, tcy)
+        if lo <= hi:
+            y = min(max((scy + tcy) / 2, lo), hi)
+            straight.append([(scx, y), (tcx, y)])
+        yield self._level(straight)
+        # En L
+        yield self._level([[(scx, scy), (tcx, scy), (tcx, tcy)], [(scx, scy), (scx, tcy), (tcx, tcy)]])
+        zs = []
+        # En Z: couloir vertical (resp. horizontal) entre les deux, le long des obstacles, ou en U autour
+        for vertical in (True, False):
+            if vertical:
+                a0, a1, b0, b1, sc, tc = sx0, sx1, tx0, tx1, scx, tcx
+            else:
+                a0, a1, b0, b1, sc, tc = sy0, sy1, ty0, ty1, scy, tcy
+            mid = (sc + tc) / 2
+            lanes = {min(a0, b0) - 2 * margin, max(a1, b1) + 2 * margin}
+            if a1 < b0:
+                lanes.add((a1 + b0) / 2)
+            elif b1 < a0:
+                lanes.add((b1 + a0) / 2)
+            lo, hi = min(sc, tc), max(sc, tc)
+            band = (lo, min(scy, tcy), hi, max(scy, tcy)) if vertical else (min(scx, tcx), lo, max(scx, tcx), hi)
+            for k in self.page.obstacles.query(*band):
+                box = self.page.obstacles.boxes[k]
+                lanes.add((box[0] if vertical else box[1]) - 0.5)
+                lanes.add((box[2] if vertical else box[3]) + 0.5)
+            for c in sorted(lanes, key=lambda c: abs(c - mid))[:CHANNELS]:
+                zs.append([(scx, scy), (c, scy), (c, tcy), (tcx, tcy)] if vertical
+                          else [(scx, scy), (scx, c), (tcx, c), (tcx, tcy)])
+        yield self._level(zs)
+
+    def search(self, window: float) -> list | None:
+        """
+        A* from center to center over the sparse grid of the obstacle sides around
+        both ends, with a bend penalty. Blocked steps and the penalties of the
+        placed routes are rasterized on the grid first: a step is then a lookup.
+        None if the window holds no path, [] if the search gave up (MAX_EXPANSIONS).
+        """
+        page = self.page
+        sx0, sy0, sx1, sy1 = self.sbox
+        tx0, ty0, tx1, ty1 = self.tbox
+        scx, scy = (sx0 + sx1) / 2, (sy0 + sy1) / 2
+        tcx, tcy = (tx0 + tx1) / 2, (ty0 + ty1) / 2
+        wx0, wy0 = min(sx0, tx0) - window, min(sy0, ty0) - window
+        wx1, wy1 = max(sx1, tx1) + window, max(sy1, ty1) + window
+        boxes = page.obstacles.boxes
+        local = [boxes[k] for k in page.obstacles.query(wx0, wy0, wx1, wy1) if k not in self.skip]
+        xs = {scx, tcx, wx0, wx1}
+        ys = {scy, tcy, wy0, wy1}
+        for x0, y0, x1, y1 in local:
+            xs.update((x0 - 0.5, x1 + 0.5))
+            ys.update((y0 - 0.5, y1 + 0.5))
+        xs = sorted(x for x in xs if wx0 <= x <= wx1)
+        ys = sorted(y for y in ys if wy0 <= y <= wy1)
+        nx, ny = len(xs), len(ys)
+
+        # Pas xs[i] -> xs[i + 1] sur la ligne ys[j]: indice j * nx + i; pas vertical: i * ny + j
+        hblocked = bytearray(nx * ny)
+        vblocked = bytearray(nx * ny)
+        for x0, y0, x1, y1 in local:
+            i0, i1 = max(0, bisect_right(xs, x0) - 1), min(bisect_left(xs, x1), nx - 1)
+            j0, j1 = max(0, bisect_right(ys, y0) - 1), min(bisect_left(ys, y1), ny - 1)
+            for j in range(bisect_right(ys, y0), bisect_left(ys, y1)):
+                hblocked[j * nx + i0:j * nx + i1] = b"\x01" * (i1 - i0)
+            for i in range(bisect_right(xs, x0), bisect_left(xs, x1)):
+                vblocked[i * ny + j0:i * ny + j1] = b"\x01" * (j1 - j0)
+        hpen: dict[int, float] = {}
+        vpen: dict[int, float] = {}
+        segments = page.segments.boxes
+        for k in page.segments.query(wx0, wy0, wx1, wy1):
+            a0, b0, a1, b1 = segments[k]
+            ends = page.segment_ends[k]
+            shared = ends[0] in self.ends or ends[1] in self.ends
+            if b0 == b1:
+                lines, cross, across, along, pen_cross, pen_along, n_along, n_cross = xs, ys, b0, (a0, a1), vpen, hpen, nx, ny
+            else:
+                lines, cross, across, along, pen_cross, pen_along, n_along, n_cross = ys, xs, a0, (b0, b1), hpen, vpen, ny, nx
+            # Croisements: pas perpendiculaires franchissant le tronçon
+            c = bisect_right(cross, across) - 1
+            if 0 <= c < n_cross - 1 and cross[c] < across:
+                for m in range(bisect_right(lines, along[0]), bisect_left(lines, along[1])):
+                    key = m * n_cross + c
+                    pen_cross[key] = pen_cross.get(key, 0.0) + CROSSING
+            # Superpositions: pas sur la même ligne que le tronçon
+            c = bisect_left(cross, across)
+            if not shared and c < n_cross and cross[c] == across:
+                for m in range(max(0, bisect_right(lines, along[0]) - 1), min(bisect_left(lines, along[1]), n_along - 1)):
+                    key = c * n_along + m
+                    pen_along[key] = pen_along.get(key, 0.0) + OVERLAP
+
+        goal = (bisect_left(xs, tcx), bisect_left(ys, tcy))
+        start = (bisect_left(xs, scx), bisect_left(ys, scy))
+        steps = ((1, 0), (-1, 0), (0, 1), (0, -1))
+        best = {(start, -1): 0.0}
+        came: dict = {}
+        heap = [(abs(scx - tcx) + abs(scy - tcy), 0.0, start, -1)]
+        expansions = 0
+        while heap:
+            _, g, node, d = heapq.heappop(heap)
+            if node == goal:
+                path = [node]
+                state = (node, d)
+                while state in came:
+                    state = came[state]
+                    path.append(state[0])
+                return [(xs[i], ys[j]) for i, j in reversed(path)]
+            if g > best.get((node, d), float("inf")):
+                continue
+            expansions += 1
+            if expansions > MAX_EXPANSIONS:
+                return []
+            i, j = node
+            p = (xs[i], ys[j])
+            in_source = d != -1 and _inside(self.sbox, p)
+            in_target = _inside(self.tbox, p)
+            for nd, (di, dj) in enumerate(steps):
+                if in_source and nd != d:
+                    continue  # pas de coude dans la source: on en sort par le milieu d'un côté
+                if d != -1 and nd == d ^ 1:
+                    continue  # demi-tour
+                ni, nj = i + di, j + dj
+                if not (0 <= ni < nx and 0 <= nj < ny):
+                    continue
+                if di:
+                    k = j * nx + min(i, ni)
+                    if hblocked[k] or (in_target and p[1] != tcy):
+                        continue
+                    pen = hpen.get(k, 0.0)
+                else:
+                    k = i * ny + min(j, nj)
+                    if vblocked[k] or (in_target and p[0] != tcx):
+                        continue
+                    pen = vpen.get(k, 0.0)
+                q = (xs[ni], ys[nj])
+                if (ni, nj) != goal and _inside(self.tbox, q) and q[0] != tcx and q[1] != tcy:
+                    continue  # entrée dans la cible alignée sur son centre
+                cost = g + abs(q[0] - p[0]) + abs(q[1] - p[1]) + pen
+                if d != -1 and nd != d:
+                    cost += BEND
+                state = ((ni, nj), nd)
+                if cost < best.get(state, float("inf")):
+                    best[state] = cost
+                    came[state] = (node, d)
+                    # Heuristique: distance de Manhattan, plus un coude si la cible n'est pas alignée
+                    h = abs(q[0] - tcx) + abs(q[1] - tcy) + (BEND if q[0] != tcx and q[1] != tcy else 0.0)
+                    heapq.heappush(heap, (cost + h, cost, (ni, nj), nd))
+        return None
+
+def _cuts(box, a, b) -> bool:
+    """True if the segment a-b goes through the interior of `box`."""
+    x0, x1 = (a[0], b[0]) if a[0] <= b[0] else (b[0], a[0])
+    y0, y1 = (a[1], b[1]) if a[1] <= b[1] else (b[1], a[1])
+    if x0 == x1:
+        return box[0] < x0 < box[2] and y0 < box[3] and box[1] < y1
+    return box[1] < y0 < box[3] and x0 < box[2] and box[0] < x1
+
+def _routable(table: CellTable, page: _Page, r: int) -> bool:
+    s, t = table.source[r], table.target[r]
+    if s == NO_REF or t == NO_REF or s == t or s not in page.boxes or t not in page.boxes:
+        return False
+    if table.points.get(r):
+        return False
+    style = STYLES.parsed(table.style_of(r))
+    if any(style.get(k) is not None for k in _FIXED_KEYS):
+        return False
+    a, b = page.boxes[s], page.boxes[t]
+    # Sommets imbriqués ou superposés: pas de route extérieure possible
+    return not (a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3])
+
+def _set_route(table: CellTable, page: _Page, r: int, route: list):
+    sbox, tbox = page.boxes[table.source[r]], page.boxes[table.target[r]]
+    (ex, ey), (nx, ny) = route[0], route[-1]
+    entries = dict(STYLES.parsed(table.style_of(r)))
+    entries.update({
+        "exitX": f"{(ex - sbox[0]) / (sbox[2] - sbox[0]):.4g}", "exitY": f"{(ey - sbox[1]) / (sbox[3] - sbox[1]):.4g}",
+        "entryX": f"{(nx - tbox[0]) / (tbox[2] - tbox[0]):.4g}", "entryY": f"{(ny - tbox[1]) / (tbox[3] - tbox[1]):.4g}",
+    })
+    table.style[r] = table.pool.intern(STYLES.intern(format_style(entries)))
+    # Points dans le repère du parent de l'arête
+    p = table.parent[r]
+    ox, oy = (page.ax[p], page.ay[p]) if p != NO_REF and table.kind[p] == KIND_VERTEX else (0.0, 0.0)
+    waypoints = [(round(x - ox, 2), round(y - oy, 2)) for x, y in route[1:-1]]
+    if waypoints:
+        table.points[r] = waypoints
+    else:
+        table.points.pop(r, None)
+
+@instrument.traced("route")
+def route_table(table: CellTable, margin: float = MARGIN) -> RouteStats:
+    """Route every edge of the page in place (styles and points of the CellTable)."""
+    stats = RouteStats()
+    page = _Page(table, margin)
+    edges = []
+    for r in table.order:
+        if table.kind[r] != KIND_EDGE:
+            continue
+        if not _routable(table, page, r):
+            stats.skipped += 1
+            continue
+        a, b = page.boxes[table.source[r]], page.boxes[table.target[r]]
+        edges.append((abs(a[0] + a[2] - b[0] - b[2]) + abs(a[1] + a[3] - b[1] - b[3]), r))
+    edges.sort()   # les plus courtes d'abord: elles gardent les routes directes
+    for _, r in edges:
+        edge = _Edge(page, table.source[r], table.target[r])
+        best = None
+        for level in edge.candidates():
+            for base, route in level:
+                if best is not None and base >= best[0]:
+                    break
+                result = edge.evaluate(base, route)
+                if result is not None and (best is None or result[0] < best[0]):
+                    best = result
+            if best is not None and best[2] == 0:
+                break   # moins de coudes et aucun croisement: inutile d'essayer plus de coudes
+        if best is None:
+            for window in (WINDOW, 4 * WINDOW):
+                points = edge.search(window)
+                if points == []:
+                    break   # recherche abandonnée: une fenêtre plus grande coûterait plus encore
+                clipped = edge.clip(points) if points else None
+                best = edge.evaluate(*clipped) if clipped else None
+                if best is not None:
+                    stats.searched += 1
+                    break
+        if best is None:
+            stats.failed += 1
+            continue
+        _, route, crossings = best
+        page.place(route, edge.ends)
+        _set_route(table, page, r, route)
+        stats.routed += 1
+        stats.bends += len(route) - 2
+        stats.crossings += crossings
+    instrument.count("edges_routed", stats.routed, page=table.name)
+    return stats
+
+def route_diagram(diagram: ET.Element) -> RouteStats:
+    """Route the edges of an ElementTree <diagram> (DrawIOBuilder, state.build_drawio()) in place."""
+    table = table_from_diagram(diagram)
+    stats = route_table(table)
+    root = diagram if diagram.tag == "root" else diagram.find(".//root")
+    if root is None:
+        raise ValueError(f"Page compressée non modifiable en place: {diagram.get('name')!r}")
+    for elem in root:
+        r = table.index.get(elem.get("id"))
+        if r is None or table.kind[r] != KIND_EDGE:
+            continue
+        cell = elem.find("mxCell") if elem.tag in WRAPPER_TAGS else elem
+        if cell.get("style") == table.style_of(r):
+            continue   # arête non routée
+        cell.set("style", table.style_of(r))
+        geo = cell.find("mxGeometry")
+        if geo is None:
+            geo = ET.SubElement(cell, "mxGeometry", attrib={"relative": "1", "as": "geometry"})
+        array = geo.find("Array")
+        if array is not None:
+            geo.remove(array)
+        points = table.points.get(r)
+        if points:
+            array = ET.SubElement(geo, "Array", attrib={"as": "points"})
+            for x, y in points:
+                ET.SubElement(array, "mxPoint", attrib={"x": f"{x:g}", "y": f"{y:g}"})
+    return stats
+
+def route(source) -> RouteStats:
+    """Route every page of a DrawIOBuilder, CompactDrawIOBuilder, CellTable or <mxfile>/<diagram> Element."""
+    stats = RouteStats()
+    if isinstance(source, CellTable):
+        pages = [source]
+    elif hasattr(source, "pages"):      # CompactDrawIOBuilder
+        pages = source.pages
+    else:
+        mxfile = source.mxfile if hasattr(source, "mxfile") else source
+        pages = [mxfile] if mxfile.tag != "mxfile" else mxfile.findall("diagram")
+    for page in pages:
+        stats.add(route_table(page) if isinstance(page, CellTable) else route_diagram(page))
+    return stats
+
+def route_file(path, out_path=None) -> RouteStats:
+    """Route a .drawio file, patching only the edges that changed (diagram_diff.apply_patch)."""
+    from diagram_diff import apply_patch, diff_tables
+
+    stats = RouteStats()
+    ops = []
+    for old, table in zip(page_tables(path), page_tables(path)):
+        stats.add(route_table(table))
+        ops.extend(diff_tables(old, table))
+    if not apply_patch(path, ops, out_path) and out_path is not None and Path(out_path) != Path(path):
+        shutil.copyfile(path, out_path)   # rien à router: copie telle quelle
+    return stats
+
+def main(argv: list[str]) -> int:
+    out = None
+    if "-o" in argv:
+        i = argv.index("-o")
+        if i + 1 >= len(argv):
+            print("-o attend un fichier de sortie")
+            return 2
+        out = argv[i + 1]
+        argv = argv[:i] + argv[i + 2:]
+    instrument.from_argv(argv)
+    paths = [a for i, a in enumerate(argv) if not a.startswith("--") and (i == 0 or argv[i - 1] != "--trace")]
+    if not paths or (out and len(paths) != 1):
+        print("Usage: python router.py <fichier.drawio>... [-o sortie.drawio] [--trace trace.json]")
+        return 2
+    for path in paths:
+        stats = route_file(path, out)
+        print(f"{path} -> {out or path}: {stats}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,674 @@
+"""
+Token-flow simulation of activity diagrams (act.build_pages() pages, .drawio files).
+
+A page is compiled into a flow graph: initial nodes emit one token per session,
+actions hold it for a sampled duration, decisions route it along one branch,
+forks (and actions with several outgoing flows) split it, joins wait for all
+their inputs, an activity final ends the session, a flow final (or a node
+without outgoing flow) only ends its token. Exception flows leave an action
+with a given probability and, when the action sits in an interruptible region,
+cancel the session's other tokens in that region.
+
+Two engines produce the same report:
+
+- a vectorized one (NumPy), used when the graph is acyclic, no action has a
+  limited capacity and no interruptible region holds concurrent tokens: every
+  node is evaluated once for all sessions at a time (1e6 sessions in ~1 s);
+- a discrete-event one (heapq, pure Python) otherwise, which also models
+  Poisson arrivals and actions with a limited number of servers (FIFO queues).
+
+The report gives throughput, latency percentiles and, per node, visits, mean
+duration, demand (busy time per session), queue and join waits; with an
+arrival rate, the utilisation of every action and the bottleneck throughput.
+
+Parameters (JSON), keys being node/edge labels or ids:
+
+    {"durations": {"Vérifier solde (banque)": "exp:0.8", "*": "const:1"},
+     "branches": {"[valide]": 0.9, "[invalide]": 0.1},
+     "exceptions": {"e12": 0.05},
+     "capacity": {"Vérifier solde (banque)": 4},
+     "arrival_rate": 3.0}
+
+Distributions: const:v, exp:mean, uniform:a,b, normal:mu,sigma,
+lognormal:mu,sigma, tri:low,mode,high (negative samples are clipped to 0).
+
+    python simulate.py --page 2 --sessions 1000000 --params params.json
+    python simulate.py diagramme.drawio --page 1 --json
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import random
+import sys
+import time
+from array import array
+from collections import deque
+
+from drawio_model import KIND_EDGE, KIND_VERTEX, CellTable
+from drawio_reader import page_tables
+from validate import cell_style_names
+
+# Nœud: nom de style -> sorte de nœud pour la simulation
+NODE_KINDS = {
+    "start": "initial", "initial": "initial",
+    "action": "action", "state": "action", "signal": "action", "object": "object",
+    "decision": "decision", "merge": "merge", "bar": "bar",
+    "flow_final": "activity_final", "final": "activity_final", "flow_final_cross": "flow_final",
+}
+EXCEPTION_STYLES = {"exception_flow"}
+PERCENTILES = (50, 90, 95, 99)
+
+class FlowGraph:
+    """Nodes and edges of one activity page, as parallel lists."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ids: list[str] = []
+        self.labels: list[str] = []
+        self.kinds: list[str] = []
+        self.out: list[list[int]] = []
+        self.inc: list[list[int]] = []
+        self.edge_ids: list[str] = []
+        self.edge_labels: list[str] = []
+        self.src: list[int] = []
+        self.dst: list[int] = []
+        self.exception: list[bool] = []
+        self.regions: list[frozenset[int]] = []   # nœuds de chaque région interruptible
+        self.region_of: list[tuple[int, ...]] = []
+
+    def node(self, key: str) -> int:
+        """Index of the node whose id or label is `key`."""
+        for i, (id_, label) in enumerate(zip(self.ids, self.labels)):
+            if key in (id_, label):
+                return i
+        raise KeyError(key)
+
+    def topological_order(self) -> list[int] | None:
+        """Kahn order of the nodes, or None if the graph has a cycle."""
+        indeg = [len(i) for i in self.inc]
+        queue = deque(v for v, d in enumerate(indeg) if d == 0)
+        order = []
+        while queue:
+            v = queue.popleft()
+            order.append(v)
+            for e in self.out[v]:
+                w = self.dst[e]
+                indeg[w] -= 1
+                if indeg[w] == 0:
+                    queue.append(w)
+        return order if len(order) == len(indeg) else None
+
+def compile_activity(source, page: int = 0) -> FlowGraph:
+    """Flow graph of page `page` of `source` (anything accepted by drawio_reader.page_tables)."""
+    table: CellTable = page_tables(source)[page]
+    names = cell_style_names(table)
+    g = FlowGraph(table.name)
+    pos: dict[int, int] = {}
+    region_rows = []
+    for r in table.order:
+        if table.kind[r] != KIND_VERTEX:
+            continue
+        if names[r] == "interruptible":
+            region_rows.append(r)
+        kind = NODE_KINDS.get(names[r])
+        if kind is None:
+            continue
+        pos[r] = len(g.ids)
+        g.ids.append(table.ids[r])
+        g.labels.append(table.labels[r].replace("\n", " ") or table.ids[r])
+        g.kinds.append(kind)
+        g.out.append([])
+        g.inc.append([])
+    for r in table.order:
+        if table.kind[r] != KIND_EDGE:
+            continue
+        s, t = pos.get(table.source[r]), pos.get(table.target[r])
+        if s is None or t is None:
+            continue
+        e = len(g.src)
+        g.edge_ids.append(table.ids[r])
+        g.edge_labels.append(table.labels[r])
+        g.src.append(s)
+        g.dst.append(t)
+        g.exception.append(names[r] in EXCEPTION_STYLES)
+        g.out[s].append(e)
+        g.inc[t].append(e)
+    for v, kind in enumerate(g.kinds):
+        if kind == "bar":
+            g.kinds[v] = "join" if len(g.inc[v]) > 1 else "fork"
+
+    # Régions interruptibles: nœuds enfants de la région ou dont le centre est dans son cadre
+    for region in region_rows:
+        rx, ry, rw, rh = table.geometry(region)
+        members = set()
+        for r, v in pos.items():
+            x, y, w, h = table.geometry(r)
+            if table.parent[r] == region or (table.parent[r] == table.parent[region]
+                                             and rx <= x + w / 2 <= rx + rw and ry <= y + h / 2 <= ry + rh):
+                members.add(v)
+        g.regions.append(frozenset(members))
+    g.region_of = [tuple(i for i, members in enumerate(g.regions) if v in members) for v in range(len(g.ids))]
+    return g
+
+# --- Paramètres -----------------------------------------------------------------------
+
+def parse_distribution(spec) -> tuple[str, tuple[float, ...]]:
+    """"exp:0.8" / {"exp": 0.8} / 2.0 -> ("exp", (0.8,))."""
+    if isinstance(spec, (int, float)):
+        return "const", (float(spec),)
+    if isinstance(spec, dict):
+        (name, args), = spec.items()
+        args = args if isinstance(args, (list, tuple)) else [args]
+    else:
+        name, _, rest = str(spec).partition(":")
+        args = [a for a in rest.split(",") if a.strip()]
+    name = name.strip()
+    args = tuple(float(a) for a in args)
+    expected = {"const": 1, "exp": 1, "uniform": 2, "normal": 2, "lognormal": 2, "tri": 3}
+    if expected.get(name) != len(args):
+        raise ValueError(f"Distribution invalide: {spec!r} (const:v, exp:moyenne, uniform:a,b, normal:mu,sigma, "
+                         "lognormal:mu,sigma, tri:min,mode,max)")
+    return name, args
+
+def _py_sampler(dist, rng: random.Random):
+    name, a = dist
+    if name == "const":
+        v = a[0]
+        return lambda: v
+    if name == "exp":
+        rate = 1 / a[0] if a[0] else float("inf")
+        return (lambda: rng.expovariate(rate)) if a[0] else (lambda: 0.0)
+    if name == "uniform":
+        return lambda: rng.uniform(a[0], a[1])
+    if name == "normal":
+        return lambda: max(0.0, rng.gauss(a[0], a[1]))
+    if name == "lognormal":
+        return lambda: rng.lognormvariate(a[0], a[1])
+    return lambda: rng.triangular(a[0], a[2], a[1])
+
+def _np_sample(dist, rng, n: int):
+    import numpy as np
+    name, a = dist
+    if name == "const":
+        return np.full(n, a[0])
+    if name == "exp":
+        return rng.exponential(a[0], n)
+    if name == "uniform":
+        return rng.uniform(a[0], a[1], n)
+    if name == "normal":
+        return np.maximum(rng.normal(a[0], a[1], n), 0.0)
+    if name == "lognormal":
+        return rng.lognormal(a[0], a[1], n)
+    return rng.triangular(a[0], a[1], a[2], n)
+
+class Params:
+    """Simulation parameters resolved against one FlowGraph."""
+
+    def __init__(self, graph: FlowGraph, config: dict | None = None):
+        config = config or {}
+        self.arrival_rate: float | None = config.get("arrival_rate")
+
+        def lookup(section: dict, keys, default=None):
+            for key in keys:
+                if key in section:
+                    return section[key]
+            return default
+
+        durations = config.get("durations", {})
+        default = parse_distribution(durations.get("*", "const:1"))
+        zero = ("const", (0.0,))
+        self.durations = []
+        for v, kind in enumerate(graph.kinds):
+            spec = lookup(durations, (graph.ids[v], graph.labels[v]))
+            if spec is not None:
+                self.durations.append(parse_distribution(spec))
+            else:
+                self.durations.append(default if kind == "action" else zero)
+
+        capacity = config.get("capacity", {})
+        self.capacity = [lookup(capacity, (graph.ids[v], graph.labels[v])) for v in range(len(graph.ids))]
+
+        # Probabilités des branches de décision (normalisées) et des flux d'exception
+        branches, exceptions = config.get("branches", {}), config.get("exceptions", {})
+        self.edge_prob = [1.0] * len(graph.src)
+        for v, kind in enumerate(graph.kinds):
+            normal = [e for e in graph.out[v] if not graph.exception[e]]
+            for e in graph.out[v]:
+                if graph.exception[e]:
+                    # Seule sortie: l'exception est certaine; sinon 0 par défaut
+                    p = lookup(exceptions, (graph.edge_ids[e], graph.edge_labels[e]), 0.0 if normal else 1.0)
+                    self.edge_prob[e] = float(p)
+            if kind == "decision" and normal:
+                weights = [float(lookup(branches, (graph.edge_ids[e], graph.edge_labels[e]), 1.0)) for e in normal]
+                total = sum(weights)
+                if total <= 0:
+                    raise ValueError(f"Probabilités de branche nulles pour la décision {graph.labels[v]!r}")
+                for e, w in zip(normal, weights):
+                    self.edge_prob[e] = w / total
+
+# --- Rapport --------------------------------------------------------------------------
+
+def _percentiles(values, qs=PERCENTILES) -> dict[str, float]:
+    if len(values) == 0:
+        return {}
+    try:
+        import numpy as np
+        arr = np.asarray(values, dtype=float)
+        result = {f"p{q}": float(v) for q, v in zip(qs, np.percentile(arr, qs))}
+        result.update(mean=float(arr.mean()), max=float(arr.max()))
+        return result
+    except ImportError:
+        data = sorted(values)
+        n = len(data)
+        result = {f"p{q}": data[min(n - 1, int(round(q / 100 * (n - 1))))] for q in qs}
+        result.update(mean=sum(data) / n, max=data[-1])
+        return result
+
+class Report:
+    def __init__(self, graph: FlowGraph, params: Params, engine: str, sessions: int):
+        self.graph = graph
+        self.params = params
+        self.engine = engine
+        self.sessions = sessions
+        self.completed = 0
+        self.stuck = 0
+        self.latencies = array("d")
+        self.makespan: float | None = None
+        self.elapsed = 0.0
+        n = len(graph.ids)
+        self.visits = [0] * n
+        self.busy = [0.0] * n
+        self.queue_wait = [0.0] * n
+        self.join_waits: dict[int, object] = {}
+
+    def summary(self) -> dict:
+        g, p = self.graph, self.params
+        # Sans taux d'arrivée, toutes les sessions démarrent à 0: completed/makespan ne mesure
+        # que le nombre de sessions simulées; le débit possible est celui du goulot (bottleneck)
+        throughput = self.completed / self.makespan if self.makespan and p.arrival_rate else None
+        nodes = []
+        bottleneck = None
+        for v in range(len(g.ids)):
+            if g.kinds[v] in ("initial",) or not self.visits[v]:
+                continue
+            demand = self.busy[v] / self.sessions
+            entry = {
+                "node": g.labels[v], "kind": g.kinds[v], "visits": self.visits[v],
+                "mean_duration": self.busy[v] / self.visits[v], "demand": demand,
+            }
+            if self.queue_wait[v]:
+                entry["mean_queue_wait"] = self.queue_wait[v] / self.visits[v]
+            if v in self.join_waits:
+                entry["join_wait"] = _percentiles(self.join_waits[v])
+            cap = p.capacity[v]
+            if demand > 0 and g.kinds[v] == "action":
+                # Loi de l'utilisation: débit max = serveurs / demande par session
+                limit = (cap or 1) / demand
+                entry["max_throughput"] = limit if cap else None
+                if p.arrival_rate:
+                    entry["utilisation"] = p.arrival_rate * demand / cap if cap else None
+                    entry["servers_needed"] = p.arrival_rate * demand
+                if cap and (bottleneck is None or limit < bottleneck[1]):
+                    bottleneck = (g.labels[v], limit)
+            nodes.append(entry)
+        return {
+            "page": g.name, "engine": self.engine, "sessions": self.sessions,
+            "completed": self.completed, "stuck": self.stuck,
+            "throughput": throughput, "arrival_rate": p.arrival_rate,
+            "bottleneck": {"node": bottleneck[0], "max_throughput": bottleneck[1]} if bottleneck else None,
+            "latency": _percentiles(self.latencies), "nodes": nodes, "elapsed_s": self.elapsed,
+        }
+
+    def format(self) -> str:
+        s = self.summary()
+        lines = [f"{s['page']}: {s['completed']}/{s['sessions']} session(s) terminée(s), "
+                 f"{s['stuck']} bloquée(s) [{s['engine']}, {s['elapsed_s']:.2f} s]"]
+        lat = s["latency"]
+        if lat:
+            lines.append("latence: " + ", ".join(f"{k}={v:.3f}" for k, v in lat.items()))
+        if s["throughput"]:
+            lines.append(f"débit: {s['throughput']:.3f} session(s)/unité de temps")
+        if s["bottleneck"]:
+            lines.append(f"goulot: {s['bottleneck']['node']} (débit max {s['bottleneck']['max_throughput']:.3f})")
+        for n in s["nodes"]:
+            extra = ""
+            if "utilisation" in n and n["utilisation"] is not None:
+                extra += f", utilisation {n['utilisation']:.0%}"
+            if "mean_queue_wait" in n:
+                extra += f", attente file {n['mean_queue_wait']:.3f}"
+            if "join_wait" in n:
+                extra += f", attente join p50={n['join_wait']['p50']:.3f} p95={n['join_wait']['p95']:.3f}"
+            lines.append(f"  {n['node']:<40} {n['kind']:<14} visites {n['visits']:>9}  durée moy. {n['mean_duration']:.3f}{extra}")
+        return "\n".join(lines)
+
+# --- Moteur vectorisé -----------------------------------------------------------------
+
+def _vectorizable(graph: FlowGraph, params: Params) -> bool:
+    if graph.topological_order() is None or any(params.capacity):
+        return False
+    for members in graph.regions:
+        # Une région qui contient un fork (explicite ou implicite) peut avoir des jetons concurrents
+        for v in members:
+            normal = [e for e in graph.out[v] if not graph.exception[e]]
+            if graph.kinds[v] != "decision" and len(normal) > 1:
+                return False
+    return True
+
+BATCH = 1 << 17  # sessions par lot du moteur vectorisé
+
+def _vector_batch(graph: FlowGraph, params: Params, order: list[int], rng, n: int, report: Report, waits: dict):
+    """Simulate `n` sessions at once; return their completion times (NaN: never completed)."""
+    import numpy as np
+    edge_t: list = [None] * len(graph.src)
+    starts: dict[int, tuple] = {}   # nœud -> (instants d'arrivée, durées)
+    join_wait: dict[int, object] = {}
+    activity_end = np.full(n, np.nan)
+    token_end = np.full(n, np.nan)
+    stuck = np.zeros(n, dtype=bool)
+    for v in order:
+        kind = graph.kinds[v]
+        inc = [edge_t[e] for e in graph.inc[v] if edge_t[e] is not None]
+        if kind == "initial":
+            t = np.zeros(n)
+        elif not inc:
+            continue
+        elif kind == "join":
+            if len(inc) < len(graph.inc[v]):
+                stuck |= ~np.isnan(np.fmin.reduce(inc) if len(inc) > 1 else inc[0])
+                continue  # une entrée jamais alimentée: le join ne se déclenche pas
+            stacked = np.vstack(inc)
+            t = stacked.max(axis=0)  # NaN si une entrée manque: pas de déclenchement
+            stuck |= np.isnan(t) & ~np.isnan(stacked).all(axis=0)
+            join_wait[v] = t - stacked.min(axis=0)
+        else:
+            t = np.fmin.reduce(inc) if len(inc) > 1 else inc[0]
+        present = ~np.isnan(t)
+        if not present.any():
+            continue
+        duration = _np_sample(params.durations[v], rng, n)
+        starts[v] = (t, duration)
+        finish = t + duration
+
+        outs = graph.out[v]
+        if kind == "activity_final":
+            activity_end = np.fmin(activity_end, t)
+            continue
+        if not outs:
+            token_end = np.fmax(token_end, finish)
+            continue
+        taken_exc = np.zeros(n, dtype=bool)
+        for e in outs:
+            if graph.exception[e]:
+                fire = present & ~taken_exc & (rng.random(n) < params.edge_prob[e])
+                taken_exc |= fire
+                edge_t[e] = np.where(fire, finish, np.nan)
+        normal = [e for e in outs if not graph.exception[e]]
+        if not normal:
+            token_end = np.fmax(token_end, np.where(present & ~taken_exc, finish, np.nan))
+            continue
+        base = np.where(taken_exc, np.nan, finish)
+        if kind == "decision" and len(normal) > 1:
+            cum = np.cumsum([params.edge_prob[e] for e in normal])
+            choice = np.searchsorted(cum, rng.random(n) * cum[-1], side="right")
+            for k, e in enumerate(normal):
+                edge_t[e] = np.where(choice == k, base, np.nan)
+        else:
+            for e in normal:
+                edge_t[e] = base
+
+    # Un nœud final d'activité termine la session: les jetons arrivés après ne comptent pas
+    ended = ~np.isnan(activity_end)
+    for v, (t, duration) in starts.items():
+        alive = ~np.isnan(t)
+        if graph.kinds[v] == "activity_final":
+            alive[ended] &= t[ended] <= activity_end[ended]
+        else:
+            alive[ended] &= t[ended] < activity_end[ended]
+        report.visits[v] += int(alive.sum())
+        report.busy[v] += float(duration[alive].sum())
+        if v in join_wait:
+            waits.setdefault(v, []).append(join_wait[v][alive])
+    done = np.where(ended, activity_end, np.where(stuck, np.nan, token_end))
+    report.stuck += int((stuck & ~ended).sum())
+    return done
+
+def _simulate_vectorized(graph: FlowGraph, params: Params, sessions: int, seed, report: Report):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    order = graph.topological_order()
+    waits: dict[int, list] = {}
+    latencies = []
+    makespan = 0.0
+    offset = 0.0
+    for first in range(0, sessions, BATCH):
+        n = min(BATCH, sessions - first)
+        done = _vector_batch(graph, params, order, rng, n, report, waits)
+        ok = ~np.isnan(done)
+        latencies.append(done[ok])
+        if params.arrival_rate and ok.any():
+            # Arrivées de Poisson: sans capacité limitée, les sessions ne s'attendent pas
+            arrivals = offset + np.cumsum(rng.exponential(1 / params.arrival_rate, n))
+            offset = float(arrivals[-1])
+            makespan = max(makespan, float((arrivals + done)[ok].max()))
+    report.latencies = np.concatenate(latencies) if latencies else np.empty(0)
+    report.completed = len(report.latencies)
+    report.join_waits = {v: np.concatenate(parts) for v, parts in waits.items()}
+    report.makespan = makespan or None
+
+# --- Moteur à événements discrets -----------------------------------------------------
+
+_ARRIVE, _FINISH, _NEW_SESSION = 0, 1, 2
+
+class _Session:
+    __slots__ = ("start", "tokens", "joins", "done")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.tokens: dict[int, int] = {}          # jeton -> nœud
+        # join -> arête entrante -> instants d'arrivée des jetons en attente
+        self.joins: dict[int, dict[int, deque]] = {}
+        self.done = False
+
+def _simulate_events(graph: FlowGraph, params: Params, sessions: int, seed, report: Report):
+    rng = random.Random(seed)
+    sample = [_py_sampler(d, rng) for d in params.durations]
+    rate = params.arrival_rate
+    initials = [v for v, k in enumerate(graph.kinds) if k == "initial"]
+    free = [c if c else None for c in params.capacity]  # serveurs libres (None: illimité)
+    queues = [deque() for _ in graph.ids]
+    join_waits: dict[int, array] = {}
+    heap: list = []
+    seq = 0
+    next_token = 0
+    live: dict[int, _Session] = {}
+    latencies = report.latencies
+    first_arrival, last_done = None, 0.0
+
+    def push(t, kind, sid, node, token, edge=-1):
+        nonlocal seq
+        seq += 1
+        heapq.heappush(heap, (t, seq, kind, sid, node, token, edge))
+
+    def finish_session(sid, s, now):
+        nonlocal last_done
+        s.done = True
+        s.tokens.clear()
+        latencies.append(now - s.start)
+        report.completed += 1
+        last_done = max(last_done, now)
+        del live[sid]
+
+    def start_service(now, sid, node, token):
+        d = sample[node]()
+        report.busy[node] += d
+        push(now + d, _FINISH, sid, node, token)
+
+    def release(now, node):
+        # Un serveur se libère: premier jeton encore vivant de la file
+        q = queues[node]
+        while q:
+            enq, sid, token = q.popleft()
+            s = live.get(sid)
+            if s is not None and token in s.tokens:
+                report.queue_wait[node] += now - enq
+                start_service(now, sid, node, token)
+                return
+        free[node] += 1
+
+    push(0.0, _NEW_SESSION, 0, -1, -1)
+    while heap:
+        now, _, kind, sid, node, token, edge = heapq.heappop(heap)
+        if kind == _NEW_SESSION:
+            if first_arrival is None:
+                first_arrival = now
+            s = live[sid] = _Session(now)
+            for v in initials:
+                next_token += 1
+                s.tokens[next_token] = v
+                push(now, _ARRIVE, sid, v, next_token)
+            if sid + 1 < sessions:
+                push(now + (rng.expovariate(rate) if rate else 0.0), _NEW_SESSION, sid + 1, -1, -1)
+            continue
+        s = live.get(sid)
+        if s is None or token not in s.tokens:
+            if kind == _FINISH and free[node] is not None:
+                release(now, node)  # jeton annulé pendant son service
+            continue
+        k = graph.kinds[node]
+        if kind == _ARRIVE:
+            if k == "join":
+                # Le join attend un jeton sur chacune de ses arêtes entrantes (deux jetons
+                # arrivés par la même arête, dans un cycle, ne suffisent pas)
+                waiting = s.joins.setdefault(node, {})
+                waiting.setdefault(edge, deque()).append(now)
+                del s.tokens[token]
+                if len(waiting) < len(graph.inc[node]):
+                    continue
+                first = now
+                for e in list(waiting):
+                    first = min(first, waiting[e].popleft())
+                    if not waiting[e]:
+                        del waiting[e]
+                if not waiting:
+                    del s.joins[node]
+                join_waits.setdefault(node, array("d")).append(now - first)
+                next_token += 1
+                token = next_token
+                s.tokens[token] = node
+            report.visits[node] += 1
+            if k == "activity_final":
+                finish_session(sid, s, now)
+                continue
+            if free[node] is None:
+                start_service(now, sid, node, token)
+            elif free[node] > 0:
+                free[node] -= 1
+                start_service(now, sid, node, token)
+            else:
+                queues[node].append((now, sid, token))
+            continue
+
+        # _FINISH: le jeton quitte le nœud
+        if free[node] is not None:
+            release(now, node)
+        del s.tokens[token]
+        outs = graph.out[node]
+        exc = None
+        for e in outs:
+            if graph.exception[e] and rng.random() < params.edge_prob[e]:
+                exc = e
+                break
+        if exc is not None:
+            taken = [exc]
+            # Interruption: les autres jetons de la région de l'action sont annulés
+            for region in graph.region_of[node]:
+                members = graph.regions[region]
+                for other in [t for t, v in s.tokens.items() if v in members]:
+                    del s.tokens[other]
+                for j in [j for j in s.joins if j in members]:
+                    del s.joins[j]
+        else:
+            normal = [e for e in outs if not graph.exception[e]]
+            if k == "decision" and len(normal) > 1:
+                u = rng.random()
+                acc = 0.0
+                chosen = normal[-1]
+                for e in normal:
+                    acc += params.edge_prob[e]
+                    if u < acc:
+                        chosen = e
+                        break
+                taken = [chosen]
+            else:
+                taken = normal
+        for e in taken:
+            v = graph.dst[e]
+            next_token += 1
+            s.tokens[next_token] = v
+            push(now, _ARRIVE, sid, v, next_token, e)
+        if not s.tokens and not s.joins:
+            finish_session(sid, s, now)
+
+    report.stuck = len(live)
+    report.makespan = (last_done - first_arrival) if first_arrival is not None and last_done > first_arrival else None
+    report.join_waits = join_waits
+
+def simulate(graph: FlowGraph, sessions: int = 10000, config: dict | None = None, seed=None,
+             engine: str = "auto") -> Report:
+    """Run `sessions` sessions; engine is "auto", "vector" (NumPy) or "events"."""
+    params = Params(graph, config)
+    if engine == "auto":
+        try:
+            import numpy  # noqa: F401
+            engine = "vector" if _vectorizable(graph, params) else "events"
+        except ImportError:
+            engine = "events"
+    elif engine == "vector" and not _vectorizable(graph, params):
+        raise ValueError("Moteur vectorisé impossible: cycle, capacité limitée ou région interruptible concurrente")
+    report = Report(graph, params, engine, sessions)
+    start = time.perf_counter()
+    if engine == "vector":
+        _simulate_vectorized(graph, params, sessions, seed, report)
+    else:
+        _simulate_events(graph, params, sessions, seed, report)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Simulation par jetons d'un diagramme d'activités.")
+    parser.add_argument("diagram", nargs="?", help="fichier .drawio (défaut: pages de act.build_pages)")
+    parser.add_argument("--page", type=int, default=1, help="numéro de page, à partir de 1 (défaut: 1)")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--params", help="paramètres JSON (durées, branches, exceptions, capacités, arrivées)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--engine", choices=("auto", "vector", "events"), default="auto")
+    parser.add_argument("--json", action="store_true", help="rapport JSON")
+    args = parser.parse_args(argv)
+
+    config = None
+    if args.params:
+        with open(args.params, encoding="utf-8") as f:
+            config = json.load(f)
+    if args.diagram:
+        graph = compile_activity(args.diagram, args.page - 1)
+    else:
+        # Pages d'exemple de act.py, générées dans un répertoire temporaire
+        import tempfile
+        from pathlib import Path
+        from act import DrawIOBuilder, build_pages
+        with tempfile.TemporaryDirectory() as tmp:
+            d = DrawIOBuilder()
+            build_pages(d, str(Path(tmp) / "act.drawio"))
+            graph = compile_activity(d, args.page - 1)
+    report = simulate(graph, args.sessions, config, args.seed, args.engine)
+    if args.json:
+        json.dump(report.summary(), sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    else:
+        print(report.format())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,9 @@
+import sys
 import xml.etree.ElementTree as ET
-from datetime import datetime
+from pathlib import Path
+
+import instrument
+from styles import STYLES
 
 def mxcell(parent, id_, value="", style="", vertex=False, edge=False, parent_id="1", x=None, y=None, w=None, h=None, source=None, target=None):
     cell = ET.SubElement(parent, "mxCell", id=id_)
@@ -30,17 +34,17 @@ def mxcell(parent, id_, value="", style="", vertex=False, edge=False, parent_id=
         geom.set("height", str(h))
     return cell
 
-def build_drawio():
-    # Root mxfile
+def new_document(diagram_id="atm-state-1", name="ATM - États (exemple)"):
+    """Return (mxfile, root) for a one-page state diagram, root and layer cells included."""
+    # Root mxfile (sans horodatage "modified": mêmes entrées, mêmes octets)
     mxfile = ET.Element(
         "mxfile",
         host="app.diagrams.net",
-        modified=datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
         agent="python-xml",
         version="20.8.16",
         type="device",
     )
-    diagram = ET.SubElement(mxfile, "diagram", id="atm-state-1", name="ATM - États (exemple)")
+    diagram = ET.SubElement(mxfile, "diagram", id=diagram_id, name=name)
     model = ET.SubElement(
         diagram,
         "mxGraphModel",
@@ -63,13 +67,26 @@ def build_drawio():
     root = ET.SubElement(model, "root")
     ET.SubElement(root, "mxCell", id="0")
     ET.SubElement(root, "mxCell", id="1", parent="0")
+    return mxfile, root
+
+def fix_as_attributes(elem):
+    # Serialize with correct attribute names (mxGeometry needs as="geometry")
+    for e in elem.iter():
+        if "as_" in e.attrib:
+            e.set("as", e.attrib["as_"])
+            del e.attrib["as_"]
+    return elem
+
+@instrument.traced("state.build_drawio")
+def build_drawio():
+    mxfile, root = new_document()
 
-    # Common styles
-    state_style = "rounded=1;whiteSpace=wrap;html=1;labelPosition=center;verticalLabelPosition=middle;align=center;verticalAlign=middle;strokeColor=#1a1a1a;fillColor=#ffffff;spacing=4;"
-    composite_style = state_style + "container=1;recursiveResize=0;"
-    edge_style = "endArrow=block;endFill=1;html=1;rounded=1;strokeColor=#1a1a1a;labelBackgroundColor=#ffffff;"
-    initial_style = "shape=ellipse;perimeter=ellipsePerimeter;html=1;fillColor=#000000;strokeColor=#000000;"
-    final_style = "shape=doubleEllipse;perimeter=ellipsePerimeter;html=1;fillColor=#ffffff;strokeColor=#000000;"
+    # Common styles (registre partagé, voir styles.py)
+    state_style = STYLES["state"]
+    composite_style = STYLES["composite"]
+    edge_style = STYLES["transition"]
+    initial_style = STYLES["initial"]
+    final_style = STYLES["final"]
 
     # Initial [*]
     ini = mxcell(root, "ini", style=initial_style, vertex=True, x=60, y=60, w=18, h=18)
@@ -106,7 +123,7 @@ def build_drawio():
         root,
         "TransNote",
         value="Préparation et Impression en parallèle (conceptuel)",
-        style="shape=note;whiteSpace=wrap;html=1;size=14;fillColor=#fff2a8;strokeColor=#b09500;",
+        style=STYLES["state_note"],
         vertex=True,
         parent_id="Transaction",
         x=20, y=90, w=310, h=70
@@ -145,26 +162,61 @@ def build_drawio():
     mxcell(root, "e_retrait_fin", value="billetsRemis / remercierClient()", style=edge_style, edge=True, source="RetraitEnCours", target="FinSession", parent_id="1")
 
     # Cosmetic separators for readability
-    title = mxcell(root, "Title", value="ATM - Diagramme d'États (exemple draw.io)", style="text;whiteSpace=wrap;html=1;align=left;verticalAlign=top;fontSize=18;fontStyle=1;", vertex=True, x=40, y=10, w=520, h=30)
-
-    # Serialize with correct attribute names (mxGeometry needs as="geometry")
-    def fix_as_attributes(elem):
-        for e in elem.iter():
-            if "as_" in e.attrib:
-                e.set("as", e.attrib["as_"])
-                del e.attrib["as_"]
-        return elem
+    title = mxcell(root, "Title", value="ATM - Diagramme d'États (exemple draw.io)", style=STYLES["title"], vertex=True, x=40, y=10, w=520, h=30)
 
     mxfile = fix_as_attributes(mxfile)
     return mxfile
 
-def save_drawio(filename="atm_state_example.drawio"):
+def save_drawio(filename="atm_state_example.drawio", compressed=False, route=False):
     mxfile = build_drawio()
-    ET.indent(mxfile, space="  ", level=0)
-    tree = ET.ElementTree(mxfile)
-    tree.write(filename, encoding="utf-8", xml_declaration=True)
+    if route:
+        import router
+        router.route(mxfile)
+    if instrument.enabled():
+        for diagram in mxfile.iter("diagram"):
+            instrument.count("cells", len(diagram.find("mxGraphModel/root")), page=diagram.get("name"))
+    if compressed:
+        from act import write_mxfile
+        return write_mxfile(mxfile, filename, compressed=True)
+    with instrument.span("serialize"):
+        ET.indent(mxfile, space="  ", level=0)
+    with instrument.span("write", path=str(filename)):
+        tree = ET.ElementTree(mxfile)
+        tree.write(filename, encoding="utf-8", xml_declaration=True)
+    instrument.count_file("bytes_written", filename)
     return filename
 
-if __name__ == "__main__":
-    out = save_drawio()
+def main(argv: list[str]) -> str:
+    # Reconstruction incrémentale: rien n'est régénéré si state.py/styles.py/act.py n'ont pas changé
+    import styles
+    import validate
+    from build_cache import BuildCache
+
+    out = "atm_state_example.drawio"
+    cache = BuildCache()
+    compressed = "--compressed" in argv
+    route = "--route" in argv
+    instrument.from_argv(argv)
+    # act.py écrit la sortie compressée (write_mxfile) et sert au routeur via drawio_model:
+    # il fait toujours partie des entrées, le routeur et ses modules seulement avec --route
+    here = Path(__file__)
+    extra = [here.with_name(n) for n in ("router.py", "drawio_model.py", "drawio_reader.py")] if route else []
+    key = cache.fingerprint(here, Path(styles.__file__), here.with_name("act.py"), *extra,
+                            {"compressed": compressed, "route": route})
+    if "--force" not in argv and cache.is_fresh("state", key):
+        print(f"Fichier à jour: {out}")
+        return out
+    with cache.output(out) as tmp:
+        save_drawio(tmp, compressed, route)
+        # Contrôles UML (références, initiaux, fork/join, gardes...) avant publication
+        if "--no-validate" not in argv:
+            with instrument.span("validate"):
+                invalid = validate.report(validate.validate(tmp))
+            if invalid:
+                raise SystemExit(f"Diagramme invalide: {out} n'est pas mis à jour")
+    cache.record("state", key, [out])
     print(f"Fichier généré: {out}")
+    return out
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
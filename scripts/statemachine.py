@@ -0,0 +1,448 @@
+"""
+Executable hierarchical state machines compiled from state diagrams.
+
+compile_machine() reads a state page (state.build_drawio(), a .drawio file, a
+CellTable...), parses the "event [guard] / action" transition labels and
+precomputes, for every state and event, the candidate transitions (inner states
+first) together with the states they exit and enter. Dispatching an event is
+then one dict lookup plus the guards of its candidates.
+
+- "after(30s)" transitions are timers: AsyncStateMachine schedules them on an
+  asyncio loop; in recorded traces they are plain events.
+- Transitions without event are completion transitions: they fire as soon as
+  their guard holds (e.g. "[tentatives>3]") after each step; a composite's
+  completion transitions fire when one of its final states is reached.
+- Actions "incX()" / "resetX()" update the counter x of the context by default;
+  other actions are looked up in the `actions` mapping (ignored if absent).
+
+    python statemachine.py traces.jsonl                 # contre state.build_drawio()
+    python statemachine.py traces.jsonl diagramme.drawio
+
+Trace lines are {"session": ..., "event": ..., "state": <état attendu, optionnel>};
+each new session restarts the machine.
+"""
+from __future__ import annotations
+
+import asyncio
+import html
+import json
+import operator
+import re
+import sys
+from pathlib import Path
+
+from drawio_model import KIND_EDGE, NO_REF, CellTable
+from drawio_reader import page_tables
+from validate import cell_roles
+
+ROOT = -1
+MAX_STEPS = 1000  # transitions automatiques enchaînées par événement, au-delà: boucle
+
+_LABEL = re.compile(r"^\s*(?P<event>[^\[/]*?)\s*(?:\[(?P<guard>[^\]]*)\])?\s*(?:/\s*(?P<actions>.*?))?\s*$", re.S)
+_AFTER = re.compile(r"^after\(\s*(\d+(?:\.\d+)?)\s*(ms|s|min|h)?\s*\)$")
+_COMPARISON = re.compile(r"^\s*([A-Za-z_]\w*)\s*(==|!=|>=|<=|>|<)\s*(\S+)\s*$")
+_OPERATORS = {"==": operator.eq, "!=": operator.ne, ">=": operator.ge, "<=": operator.le, ">": operator.gt, "<": operator.lt}
+_UNITS = {"ms": 0.001, "s": 1.0, "min": 60.0, "h": 3600.0, None: 1.0}
+
+def parse_label(label: str) -> tuple[str | None, str | None, list[str]]:
+    """
+    "pinInvalide / incTentatives()" -> ("pinInvalide", None, ["incTentatives()"]).
+    HTML labels are unescaped; a trigger that is a comparison ("tentatives>3")
+    is read as a guard, as draw.io labels often omit the brackets.
+    """
+    m = _LABEL.match(html.unescape(label or ""))
+    if m is None:
+        raise ValueError(f"Libellé de transition illisible: {label!r}")
+    event = m.group("event") or None
+    guard = m.group("guard")
+    if event is not None and guard is None and _COMPARISON.match(event):
+        event, guard = None, event
+    actions = [a.strip() for a in (m.group("actions") or "").split(";") if a.strip()]
+    return event, (guard.strip() if guard else None), actions
+
+def event_key(event: str) -> str:
+    """Dispatch key of a trigger: "choisirRetrait(montant)" -> "choisirRetrait", timers kept whole."""
+    event = event.strip()
+    if event.startswith("after("):
+        return re.sub(r"\s+", "", event)
+    return event.split("(", 1)[0].strip()
+
+def timer_delay(event: str) -> float | None:
+    m = _AFTER.match(event)
+    return float(m.group(1)) * _UNITS[m.group(2)] if m else None
+
+def _literal(text: str):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return {"true": True, "false": False}.get(text.lower(), text.strip("'\""))
+
+def compile_guard(text: str | None, guards: dict | None = None):
+    """Guard text -> callable(context) or None; `guards` maps texts to custom callables."""
+    if text is None:
+        return None
+    if guards and text in guards:
+        return guards[text]
+    if text == "else":
+        return None  # évaluée en dernier, voir _Candidate
+    m = _COMPARISON.match(text)
+    if m:
+        name, op, value = m.group(1), _OPERATORS[m.group(2)], _literal(m.group(3))
+        return lambda ctx: op(ctx.get(name, 0), value)
+    negate = text.startswith(("!", "not "))
+    name = text[1:].strip() if text.startswith("!") else text[4:].strip() if negate else text.strip()
+    if re.fullmatch(r"[A-Za-z_]\w*", name):
+        return (lambda ctx: not ctx.get(name)) if negate else (lambda ctx: bool(ctx.get(name)))
+    raise ValueError(f"Garde non reconnue: [{text}] (fournir une fonction via guards=)")
+
+def _counter_action(action: str):
+    """Default behaviour of "incX()" / "resetX()" / "decX()": counter x of the context."""
+    m = re.fullmatch(r"(inc|dec|reset)([A-Z]\w*)\(\)", action)
+    if m is None:
+        return None
+    verb, name = m.group(1), m.group(2)[0].lower() + m.group(2)[1:]
+    if verb == "reset":
+        return lambda ctx: ctx.__setitem__(name, 0)
+    step = 1 if verb == "inc" else -1
+    return lambda ctx: ctx.__setitem__(name, ctx.get(name, 0) + step)
+
+class Transition:
+    __slots__ = ("source", "target", "event", "guard_text", "guard", "actions", "label")
+
+    def __init__(self, source: int, target: int, event: str | None, guard_text: str | None, guard, actions, label: str):
+        self.source = source
+        self.target = target
+        self.event = event
+        self.guard_text = guard_text
+        self.guard = guard
+        self.actions = actions
+        self.label = label
+
+class _Candidate:
+    """A transition as seen from one active state: exits, actions and entries precomputed."""
+    __slots__ = ("transition", "guard", "exits", "entries", "actions", "leaf", "is_else")
+
+    def __init__(self, transition: Transition, exits, entries, actions, leaf):
+        self.transition = transition
+        self.guard = transition.guard
+        self.is_else = transition.guard_text == "else"
+        self.exits = exits
+        self.entries = entries
+        self.actions = actions
+        self.leaf = leaf
+
+class Machine:
+    """Compiled machine: state names, hierarchy and one {event: candidates} table per state."""
+
+    def __init__(self, names, labels, parent, finals, tables, timers, start_entries, start_actions, start_leaf):
+        self.names: list[str] = names
+        self.labels: list[str] = labels
+        self.parent: list[int] = parent
+        self.finals: frozenset[int] = finals
+        self.tables: list[dict[str | None, tuple[_Candidate, ...]]] = tables
+        self.timers: list[tuple[tuple[float, str], ...]] = timers
+        self.start_entries = start_entries
+        self.start_actions = start_actions
+        self.start_leaf = start_leaf
+        self.index = {name: i for i, name in enumerate(names)}
+        self.index.update({label: i for i, label in enumerate(labels) if label not in self.index})
+
+    def events(self) -> set[str]:
+        return {e for table in self.tables for e in table if e is not None}
+
+    def instance(self, context: dict | None = None, actions: dict | None = None) -> StateMachine:
+        return StateMachine(self, context, actions)
+
+def compile_machine(source, page: int = 0, guards: dict | None = None) -> Machine:
+    """Compile page `page` of `source` (anything accepted by drawio_reader.page_tables)."""
+    table: CellTable = page_tables(source)[page]
+    role = cell_roles(table)
+    rows = [r for r in table.order if role[r] in ("node", "final", "initial")]
+    pos = {r: i for i, r in enumerate(rows)}
+    names = [table.ids[r] for r in rows]
+    labels = [html.unescape(table.labels[r]) or table.ids[r] for r in rows]
+    parent = [pos.get(table.parent[r], ROOT) for r in rows]
+    initials = {i for i, r in enumerate(rows) if role[r] == "initial"}
+    finals = frozenset(i for i, r in enumerate(rows) if role[r] == "final")
+
+    outgoing: list[list[Transition]] = [[] for _ in rows]
+    for r in table.order:
+        if table.kind[r] != KIND_EDGE or table.source[r] == NO_REF or table.target[r] == NO_REF:
+            continue
+        s, t = pos.get(table.source[r]), pos.get(table.target[r])
+        if s is None or t is None:
+            continue
+        event, guard, actions = parse_label(table.labels[r])
+        outgoing[s].append(Transition(s, t, event_key(event) if event else None, guard,
+                                      compile_guard(guard, guards), tuple(actions), table.labels[r]))
+
+    initial_of: dict[int, int] = {}  # région (ou ROOT) -> pseudo-état initial
+    for i in sorted(initials):
+        initial_of.setdefault(parent[i], i)
+
+    def ancestors(s: int) -> list[int]:
+        chain = []
+        while s != ROOT:
+            chain.append(s)
+            s = parent[s]
+        return chain
+
+    def descend(state: int, entries: list[int], actions: list[str]) -> int:
+        """Follow initial pseudo-states from `state` down to the leaf actually entered."""
+        seen = set()
+        while state in initial_of and state not in seen:
+            seen.add(state)
+            init = initial_of[state]
+            if not outgoing[init]:
+                break
+            t = outgoing[init][0]
+            actions.extend(t.actions)
+            path = ancestors(t.target)
+            entries.extend(reversed(path[:path.index(state)] if state in path else path))
+            state = t.target
+        return state
+
+    def lca(s: int, t: int) -> int:
+        s_chain = set(ancestors(parent[s])) | {ROOT}
+        p = parent[t]
+        while p not in s_chain:
+            p = parent[p]
+        return p
+
+    def candidate(current: int, tr: Transition) -> _Candidate:
+        top = lca(tr.source, tr.target)
+        exits = []
+        s = current
+        while s != top:
+            exits.append(s)
+            s = parent[s]
+        entries = []
+        for s in ancestors(tr.target):
+            if s == top:
+                break
+            entries.append(s)
+        entries.reverse()
+        actions = list(tr.actions)
+        leaf = descend(tr.target, entries, actions)
+        return _Candidate(tr, tuple(exits), tuple(entries), tuple(actions), leaf)
+
+    tables: list[dict[str | None, tuple[_Candidate, ...]]] = []
+    for state in range(len(names)):
+        merged: dict[str | None, list[_Candidate]] = {}
+        for level, owner in enumerate(ancestors(state)):
+            for tr in outgoing[owner]:
+                if tr.event is None and level > 0:
+                    continue  # transitions automatiques: propres à l'état (voir finals ci-dessous)
+                merged.setdefault(tr.event, []).append(candidate(state, tr))
+        if state in finals and parent[state] != ROOT:
+            # Final atteint: transitions de complétion du composite englobant
+            for tr in outgoing[parent[state]]:
+                if tr.event is None:
+                    merged.setdefault(None, []).append(candidate(state, tr))
+        for cands in merged.values():
+            cands.sort(key=lambda c: c.is_else)  # [else] après les autres gardes
+        tables.append({event: tuple(cands) for event, cands in merged.items()})
+
+    timers = [tuple((timer_delay(tr.event), tr.event) for tr in outgoing[s] if tr.event and timer_delay(tr.event) is not None)
+              for s in range(len(names))]
+
+    if ROOT not in initial_of or not outgoing[initial_of[ROOT]]:
+        raise ValueError(f"Page {table.name!r}: aucun nœud initial de premier niveau")
+    first = outgoing[initial_of[ROOT]][0]
+    start_entries = list(reversed(ancestors(first.target)))
+    start_actions = list(first.actions)
+    start_leaf = descend(first.target, start_entries, start_actions)
+    return Machine(names, labels, parent, finals, tables, timers, tuple(start_entries), tuple(start_actions), start_leaf)
+
+class StateMachine:
+    """One running instance: current leaf state, context and action handlers."""
+
+    def __init__(self, machine: Machine, context: dict | None = None, actions: dict | None = None, on_change=None):
+        self.machine = machine
+        self.context: dict = {} if context is None else context
+        self.handlers = dict(actions or {})
+        self._resolved: dict[str, object] = {}
+        self.state = ROOT
+        self.on_change = on_change  # callback(exits, entries), utilisé pour les minuteries
+        self.reset()
+
+    @property
+    def done(self) -> bool:
+        m = self.machine
+        return self.state in m.finals and m.parent[self.state] == ROOT
+
+    @property
+    def state_name(self) -> str:
+        return self.machine.names[self.state]
+
+    def configuration(self) -> list[str]:
+        """Active states, outermost first."""
+        chain = []
+        s = self.state
+        while s != ROOT:
+            chain.append(self.machine.names[s])
+            s = self.machine.parent[s]
+        return chain[::-1]
+
+    def reset(self, context: dict | None = None):
+        if context is not None:
+            self.context = context
+        m = self.machine
+        exits = []
+        s = self.state
+        while s != ROOT:
+            exits.append(s)
+            s = m.parent[s]
+        self._run(m.start_actions)
+        self.state = m.start_leaf
+        if self.on_change is not None:
+            self.on_change(exits, m.start_entries)
+        self._complete()
+
+    def _run(self, actions):
+        for action in actions:
+            fn = self._resolved.get(action)
+            if fn is None:
+                name = action.split("(", 1)[0].strip()
+                fn = self.handlers.get(action) or self.handlers.get(name) or _counter_action(action) or _noop
+                self._resolved[action] = fn
+            fn(self.context)
+
+    def _fire(self, cands) -> bool:
+        ctx = self.context
+        for c in cands:
+            if c.guard is None or c.guard(ctx):
+                self._run(c.actions)
+                self.state = c.leaf
+                if self.on_change is not None:
+                    self.on_change(c.exits, c.entries)
+                return True
+        return False
+
+    def _complete(self):
+        tables = self.machine.tables
+        for _ in range(MAX_STEPS):
+            cands = tables[self.state].get(None)
+            if not cands or not self._fire(cands):
+                return
+        raise RuntimeError(f"Transitions automatiques en boucle depuis {self.state_name!r}")
+
+    def dispatch(self, event: str) -> bool:
+        """Process `event` (run to completion); False if no transition accepts it."""
+        cands = self.machine.tables[self.state].get(event)
+        if cands is None:
+            cands = self.machine.tables[self.state].get(event_key(event))
+            if cands is None:
+                return False
+        if not self._fire(cands):
+            return False
+        self._complete()
+        return True
+
+def _noop(ctx):
+    return None
+
+class AsyncStateMachine:
+    """StateMachine whose "after(...)" transitions are armed on an asyncio loop while their state is active."""
+
+    def __init__(self, machine: Machine, context: dict | None = None, actions: dict | None = None,
+                 loop: asyncio.AbstractEventLoop | None = None):
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self._handles: dict[int, list[asyncio.TimerHandle]] = {}
+        self.machine = machine
+        # Les minuteries des états d'entrée sont armées dès reset(), donc dès la construction
+        self.sm = StateMachine(machine, context, actions, on_change=self._on_change)
+
+    def _on_change(self, exits, entries):
+        for s in exits:
+            for handle in self._handles.pop(s, ()):
+                handle.cancel()
+        timers = self.machine.timers
+        for s in entries:
+            if timers[s]:
+                # self.dispatch et non self.sm.dispatch: appelé depuis reset(), avant que self.sm existe
+                self._handles[s] = [self.loop.call_later(delay, self.dispatch, event) for delay, event in timers[s]]
+
+    def dispatch(self, event: str) -> bool:
+        return self.sm.dispatch(event)
+
+    def stop(self):
+        for handles in self._handles.values():
+            for handle in handles:
+                handle.cancel()
+        self._handles.clear()
+
+# --- Rejeu de traces ------------------------------------------------------------------
+
+class ReplayResult:
+    __slots__ = ("sessions", "events", "failures")
+
+    def __init__(self):
+        self.sessions = 0
+        self.events = 0
+        self.failures: list[tuple[object, int, str]] = []  # (session, n° d'événement, message)
+
+def replay(sm: StateMachine, events, result: ReplayResult | None = None, session=None) -> ReplayResult:
+    """
+    Replay one session: `events` yields event names or (event, expected state)
+    pairs. Stops at the first non-conforming event.
+    """
+    result = ReplayResult() if result is None else result
+    result.sessions += 1
+    sm.reset({})
+    index = sm.machine.index
+    for n, item in enumerate(events):
+        event, expected = (item, None) if isinstance(item, str) else item
+        result.events += 1
+        before = sm.state
+        if not sm.dispatch(event):
+            result.failures.append((session, n, f"{event!r} refusé dans l'état {sm.machine.names[before]!r}"))
+            break
+        if expected is not None and index.get(expected) != sm.state and expected not in sm.configuration():
+            result.failures.append((session, n, f"après {event!r}: état {sm.state_name!r}, attendu {expected!r}"))
+            break
+    return result
+
+def iter_sessions(path: str | Path):
+    """(session, [(event, expected)]) from a JSONL trace, grouping consecutive lines by session."""
+    current, events = None, []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            session = rec.get("session")
+            if events and session != current:
+                yield current, events
+                events = []
+            current = session
+            events.append((rec["event"], rec.get("state")))
+    if events:
+        yield current, events
+
+def replay_file(machine: Machine, path: str | Path, actions: dict | None = None) -> ReplayResult:
+    sm = machine.instance(actions=actions)
+    result = ReplayResult()
+    for session, events in iter_sessions(path):
+        replay(sm, events, result, session)
+    return result
+
+def main(argv: list[str]) -> int:
+    if not argv:
+        print("Usage: python statemachine.py <traces.jsonl> [diagramme.drawio]")
+        return 2
+    if len(argv) > 1:
+        machine = compile_machine(argv[1])
+    else:
+        import state
+        machine = compile_machine(state.build_drawio())
+    result = replay_file(machine, argv[0])
+    for session, n, message in result.failures[:20]:
+        print(f"session {session}, événement {n}: {message}")
+    print(f"{result.sessions} session(s), {result.events} événement(s), {len(result.failures)} non conforme(s)")
+    return 1 if result.failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
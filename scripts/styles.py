@@ -0,0 +1,225 @@
+"""
+Named style registry shared by the draw.io generators (act.py, state.py).
+
+Style strings are parsed once, merged with overrides and interned, so every cell
+using the same style shares a single string object. The registry can also emit
+the mxGraph shared stylesheet (<mxStylesheet>) and the short "name;key=value;"
+reference form that relies on it.
+"""
+from __future__ import annotations
+
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+# Noms de styles/formes de base de draw.io: un jeton nu "swimlane;" d'un fichier tiers
+# désigne le style de draw.io, jamais celui du registre
+DRAWIO_BASE_STYLES = frozenset({
+    "text", "label", "edgeLabel", "icon", "swimlane", "group", "ellipse", "doubleEllipse", "rhombus",
+    "line", "image", "roundImage", "rhombusImage", "arrow", "actor", "note", "link", "cloud",
+    "cylinder", "hexagon", "triangle", "process", "rectangle", "card", "callout",
+})
+# Attribut de <mxfile> des fichiers écrits en références "nom;surcharges;" (save(named_styles=True))
+NAMED_STYLES_ATTR = "namedStyles"
+
+def parse_style(style: str) -> dict[str, str | None]:
+    """
+    "swimlane;fillColor=#fff;" -> {"swimlane": None, "fillColor": "#fff"}.
+    Bare tokens (named styles / shape shortcuts) map to None; order is kept.
+    """
+    result: dict[str, str | None] = {}
+    for token in style.split(";"):
+        if not token:
+            continue
+        key, sep, value = token.partition("=")
+        result[key] = value if sep else None
+    return result
+
+def format_style(entries: dict[str, str | None]) -> str:
+    return "".join(f"{k};" if v is None else f"{k}={v};" for k, v in entries.items())
+
+class StyleRegistry:
+    def __init__(self):
+        self._named: dict[str, dict[str, str | None]] = {}
+        self._strings: dict[str, str] = {}           # name -> interned style string
+        self._by_string: dict[str, str] = {}         # interned style string -> name
+        self._merged: dict[tuple, str] = {}          # (name, overrides) -> interned string
+        self._parsed: dict[str, dict[str, str | None]] = {}
+        self._refs: dict[str, str] = {}
+
+    def intern(self, style: str) -> str:
+        """Canonical shared instance of `style`."""
+        return sys.intern(style)
+
+    def parsed(self, style: str) -> dict[str, str | None]:
+        entries = self._parsed.get(style)
+        if entries is None:
+            entries = self._parsed[style] = parse_style(style)
+        return entries
+
+    def define(self, name: str, style: str | dict = "", base: str | None = None, **overrides) -> str:
+        """Register `name` as `style` (string or dict), optionally on top of the named style `base`."""
+        entries = dict(self._named[base]) if base is not None else {}
+        entries.update(self.parsed(style) if isinstance(style, str) else style)
+        _apply(entries, overrides)
+        text = self.intern(format_style(entries))
+        self._named[name] = entries
+        self._strings[name] = text
+        self._by_string.setdefault(text, name)
+        return text
+
+    def __getitem__(self, name: str) -> str:
+        return self._strings[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._named
+
+    def names(self) -> list[str]:
+        return list(self._named)
+
+    def get(self, name: str, overrides: dict | None = None, **kw) -> str:
+        """Style `name` merged with overrides (a value of None removes the key); cached and interned."""
+        if overrides:
+            kw = {**overrides, **kw}
+        if not kw:
+            return self._strings[name]
+        key = (name, tuple(kw.items()))
+        text = self._merged.get(key)
+        if text is None:
+            entries = dict(self._named[name])
+            _apply(entries, kw)
+            text = self._merged[key] = self.intern(format_style(entries))
+        return text
+
+    def merge(self, style: str, **overrides) -> str:
+        """Same as get() for an arbitrary style string."""
+        entries = dict(self.parsed(style))
+        _apply(entries, overrides)
+        return self.intern(format_style(entries))
+
+    def name_of(self, style: str) -> str | None:
+        """Registered name whose style is exactly `style`, if any."""
+        return self._by_string.get(style)
+
+    def ref(self, name: str, **overrides) -> str:
+        """Shared-stylesheet form: "name;key=value;" (needs stylesheet() loaded in draw.io)."""
+        return self.intern(format_style({name: None, **{k: v for k, v in overrides.items() if v is not None}}))
+
+    def _covering(self, entries: dict, skip=frozenset()) -> str | None:
+        best, best_size = None, 0
+        for name, named in self._named.items():
+            if name in skip:
+                continue
+            if len(named) > best_size and all(entries.get(k, _ABSENT) == v for k, v in named.items()):
+                best, best_size = name, len(named)
+        return best
+
+    def variant_of(self, style: str) -> str | None:
+        """Registered style covering most keys of `style` (a variant with overrides), if any."""
+        return self._covering(self.parsed(style))
+
+    def to_ref(self, style: str) -> str:
+        """
+        Rewrite a full style string as a reference to the registered style that
+        covers most of its keys, plus the differing keys. Unknown styles, and styles
+        named after a draw.io base style (DRAWIO_BASE_STYLES), are returned as is.
+        """
+        cached = self._refs.get(style)
+        if cached is not None:
+            return cached
+        entries = self.parsed(style)
+        best = self._covering(entries, DRAWIO_BASE_STYLES)
+        if best is None:
+            result = style
+        else:
+            named = self._named[best]
+            diff = {k: v for k, v in entries.items() if k not in named}
+            result = self.intern(format_style({best: None, **diff}))
+        self._refs[style] = result
+        return result
+
+    def stylesheet(self) -> ET.Element:
+        """<mxStylesheet> with one <add as="name"> per registered style, draw.io base names excepted."""
+        sheet = ET.Element("mxStylesheet")
+        for name, entries in self._named.items():
+            if name in DRAWIO_BASE_STYLES:
+                continue   # redéfinir "swimlane"... changerait tous les couloirs de draw.io
+            node = ET.SubElement(sheet, "add", attrib={"as": name})
+            for key, value in entries.items():
+                if value is None:
+                    node.set("extend", key)  # nom de style/forme de base
+                else:
+                    ET.SubElement(node, "add", attrib={"as": key, "value": value})
+        return sheet
+
+    def write_stylesheet(self, path: str | Path) -> str:
+        sheet = self.stylesheet()
+        ET.indent(sheet, space="  ", level=0)
+        ET.ElementTree(sheet).write(path, encoding="utf-8", xml_declaration=True)
+        return str(path)
+
+_ABSENT = object()
+
+def _apply(entries: dict, overrides: dict):
+    for key, value in overrides.items():
+        if value is None:
+            entries.pop(key, None)
+        else:
+            entries[key] = str(value)
+
+STYLES = StyleRegistry()
+
+# Diagrammes d'activités (act.py)
+STYLES.define("action", "shape=rect;rounded=1;whiteSpace=wrap;html=1;fillColor=#e3f2fd;strokeColor=#1565c0;")
+STYLES.define("object", "shape=rect;rounded=1;whiteSpace=wrap;html=1;fillColor=#fffde7;strokeColor=#f9a825;")
+STYLES.define("start", "shape=ellipse;whiteSpace=wrap;html=1;fillColor=#111111;strokeColor=#111111;")
+STYLES.define("flow_final", "shape=ellipse;whiteSpace=wrap;html=1;fillColor=#ffffff;strokeColor=#c62828;strokeWidth=2;")
+STYLES.define("final_inner", "shape=ellipse;whiteSpace=wrap;html=1;fillColor=#c62828;strokeColor=#c62828;")
+STYLES.define("flow_final_cross", "shape=ellipse;whiteSpace=wrap;html=1;fillColor=#ffffff;strokeColor=#1565c0;strokeWidth=2;")
+STYLES.define("cross_bar", "shape=line;strokeWidth=3;strokeColor=#1565c0;")
+STYLES.define("decision", "shape=rhombus;whiteSpace=wrap;html=1;fillColor=#f3e5f5;strokeColor=#6a1b9a;")
+STYLES.define("merge", "shape=rhombus;whiteSpace=wrap;html=1;fillColor=#ede7f6;strokeColor=#4527a0;dashed=1;")
+STYLES.define("bar", "shape=rect;rounded=0;whiteSpace=wrap;html=1;fillColor=#212121;strokeColor=#212121;")
+STYLES.define("swimlane", "swimlane;strokeColor=#616161;fontStyle=1;align=center;horizontal=1;startSize=26;")
+STYLES.define("interruptible", "shape=rect;rounded=1;dashed=1;dashPattern=8 4;strokeColor=#ef6c00;fillColor=#fff3e0;")
+STYLES.define("signal", "shape=hexagon;perimeter=hexagonPerimeter2;whiteSpace=wrap;html=1;fillColor=#e8f5e9;strokeColor=#2e7d32;")
+STYLES.define("note", "shape=note;whiteSpace=wrap;html=1;fillColor=#fffde7;strokeColor=#f9a825;")
+STYLES.define("call_marker", "shape=triangle;direction=east;fillColor=#1565c0;strokeColor=#1565c0;")
+STYLES.define("flow", "edgeStyle=orthogonalEdgeStyle;rounded=0;endArrow=block;endFill=1;")
+STYLES.define("flow_end", "endArrow=oval;endFill=0;strokeColor=#1565c0;")
+STYLES.define("object_flow", "dashed=1;strokeColor=#1e88e5;endArrow=block;endFill=1;")
+STYLES.define("exception_flow", "strokeColor=#d32f2f;endArrow=block;endFill=0;dashed=1;")
+STYLES.define("exception_end", "strokeColor=#d32f2f;endArrow=block;endFill=1;")
+STYLES.define("signal_flow", "strokeColor=#2e7d32;endArrow=block;endFill=1;dashed=1;")
+STYLES.define("signal_accept", "strokeColor=#2e7d32;endArrow=block;endFill=1;")
+
+# Diagrammes d'états (state.py)
+STYLES.define("state", "rounded=1;whiteSpace=wrap;html=1;labelPosition=center;verticalLabelPosition=middle;align=center;verticalAlign=middle;strokeColor=#1a1a1a;fillColor=#ffffff;spacing=4;")
+STYLES.define("composite", base="state", container="1", recursiveResize="0")
+STYLES.define("transition", "endArrow=block;endFill=1;html=1;rounded=1;strokeColor=#1a1a1a;labelBackgroundColor=#ffffff;")
+STYLES.define("initial", "shape=ellipse;perimeter=ellipsePerimeter;html=1;fillColor=#000000;strokeColor=#000000;")
+STYLES.define("final", "shape=doubleEllipse;perimeter=ellipsePerimeter;html=1;fillColor=#ffffff;strokeColor=#000000;")
+STYLES.define("state_note", "shape=note;whiteSpace=wrap;html=1;size=14;fillColor=#fff2a8;strokeColor=#b09500;")
+STYLES.define("title", "text;whiteSpace=wrap;html=1;align=left;verticalAlign=top;fontSize=18;fontStyle=1;")
+
+# Diagrammes de classes, de cas d'utilisation et de séquence (md_compile.py)
+STYLES.define("class_box", "shape=rect;html=1;whiteSpace=wrap;align=left;verticalAlign=top;spacingLeft=6;overflow=fill;fillColor=#fafafa;strokeColor=#424242;")
+STYLES.define("association", "endArrow=open;endFill=0;html=1;rounded=0;labelBackgroundColor=#ffffff;")
+STYLES.define("link", base="association", endArrow="none")
+STYLES.define("aggregation", base="association", startArrow="diamondThin", startFill="0", startSize="14")
+STYLES.define("composition", base="aggregation", startFill="1")
+STYLES.define("inheritance", "endArrow=block;endFill=0;endSize=12;html=1;rounded=0;labelBackgroundColor=#ffffff;")
+STYLES.define("realization", base="inheritance", dashed="1")
+STYLES.define("dependency", base="association", dashed="1")
+STYLES.define("actor", "shape=umlActor;verticalLabelPosition=bottom;verticalAlign=top;html=1;outlineConnect=0;")
+STYLES.define("usecase", "ellipse;whiteSpace=wrap;html=1;fillColor=#e3f2fd;strokeColor=#1565c0;")
+STYLES.define("system_boundary", "shape=rect;html=1;verticalAlign=top;fontStyle=1;fillColor=none;strokeColor=#616161;")
+STYLES.define("lifeline", "shape=umlLifeline;perimeter=lifelinePerimeter;whiteSpace=wrap;html=1;container=0;collapsible=0;size=40;outlineConnect=0;")
+STYLES.define("actor_lifeline", base="lifeline", participant="umlActor", verticalLabelPosition="bottom", verticalAlign="top")
+STYLES.define("message", "html=1;verticalAlign=bottom;endArrow=block;endFill=1;rounded=0;")
+STYLES.define("async_message", base="message", endArrow="open", endFill="0")
+STYLES.define("reply", base="async_message", dashed="1")
+STYLES.define("activation", "shape=rect;html=1;fillColor=#ffffff;strokeColor=#424242;")
+STYLES.define("fragment", "shape=umlFrame;whiteSpace=wrap;html=1;width=110;height=24;fillColor=none;strokeColor=#616161;")
+STYLES.define("fragment_separator", "shape=line;dashed=1;html=1;align=left;verticalAlign=bottom;strokeColor=#616161;")
+STYLES.define("destroy", "shape=umlDestroy;html=1;strokeWidth=3;strokeColor=#c62828;")
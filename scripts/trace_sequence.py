@@ -0,0 +1,342 @@
+"""
+Sequence diagrams from recorded interaction traces.
+
+diagrammes/atm_sequence.drawio is drawn by hand; the exchanges actually logged
+between the same participants (Client, DAB, Banque...) come by the million.
+This generator streams a trace file, one message per record, and draws it
+with md_compile.draw_sequence:
+
+- JSONL (one JSON object per line) or CSV with a header, optionally gzipped;
+  fields: from/to (or source/target, sender/receiver), message (or label),
+  ts (or time, timestamp), kind (sync, async, reply...), all but from/to
+  optional;
+- time-window slicing (--since/--until, numbers or ISO dates) and
+  deterministic sampling (--sample), per message or per value of a field
+  (--sample-key session keeps or drops whole sessions);
+- consecutive repetitions of a pattern of up to MAX_PERIOD messages (polling,
+  retries) are collapsed into one "loop [×n]" fragment;
+- the diagram is paginated: every PAGE_ROWS rows the page is drawn, written
+  through a DrawIOStreamWriter and dropped (CompactDrawIOBuilder.flush), so
+  memory stays flat whatever the trace length.
+
+    python trace_sequence.py traces/atm.jsonl.gz -o atm_trace.drawio --sample 0.01 --sample-key session
+    python trace_sequence.py traces/atm.csv --since 2024-03-01T08:00 --until 2024-03-01T09:00 --max-pages 20
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import zlib
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import instrument
+from act import DrawIOStreamWriter
+from drawio_model import CompactDrawIOBuilder
+from md_compile import Diagram, draw_sequence
+
+PAGE_ROWS = 120     # rangées (messages, en-têtes et fins de boucles) par page
+MAX_PERIOD = 6      # longueur maximale d'un motif répété replié en boucle
+MIN_REPEAT = 2      # répétitions à partir desquelles un motif devient une boucle
+
+FIELDS = {
+    "source": ("from", "source", "sender", "src"),
+    "target": ("to", "target", "receiver", "dst"),
+    "label": ("message", "label", "msg", "operation", "name"),
+    "time": ("ts", "time", "timestamp"),
+    "kind": ("kind", "type"),
+}
+# Nature du message -> style de md_compile (flèche pleine, ouverte, retour pointillé)
+KINDS = {
+    "sync": "message", "call": "message", "request": "message",
+    "async": "async_message", "signal": "async_message", "event": "async_message",
+    "reply": "reply", "return": "reply", "response": "reply",
+}
+
+class TraceError(ValueError):
+    pass
+
+class TraceStats:
+    __slots__ = ("read", "malformed", "outside", "sampled_out", "messages", "loops", "collapsed", "pages")
+
+    def __init__(self):
+        self.read = self.malformed = self.outside = self.sampled_out = 0
+        self.messages = self.loops = self.collapsed = self.pages = 0
+
+    def __str__(self) -> str:
+        text = (f"{self.read} enregistrement(s) lu(s), {self.messages} message(s) dessiné(s) sur {self.pages} page(s), "
+                f"{self.loops} boucle(s) ({self.collapsed} message(s) replié(s))")
+        skipped = [(self.outside, "hors fenêtre"), (self.sampled_out, "écarté(s) par l'échantillonnage"),
+                   (self.malformed, "illisible(s)")]
+        return text + "".join(f", {n} {what}" for n, what in skipped if n)
+
+def parse_time(value) -> float | None:
+    """Seconds from a number, a numeric string or an ISO 8601 date; None if absent or unreadable."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith("Z") else text).timestamp()
+    except ValueError:
+        return None
+
+class Message:
+    __slots__ = ("source", "target", "label", "style", "time")
+
+    def __init__(self, source: str, target: str, label: str, style: str, time: float | None):
+        self.source = source
+        self.target = target
+        self.label = label
+        self.style = style
+        self.time = time
+
+    def key(self) -> tuple:
+        return self.source, self.target, self.label, self.style
+
+def _field(record: dict, name: str):
+    for alias in FIELDS[name]:
+        value = record.get(alias)
+        if value is not None and value != "":
+            return value
+    return None
+
+def _open_text(path: str | Path):
+    if str(path) == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+def iter_records(path: str | Path, stats: TraceStats | None = None):
+    """Dicts of a JSONL or CSV trace (format from the suffix, .gz stripped), read line by line."""
+    stats = stats if stats is not None else TraceStats()
+    name = str(path)[:-3] if str(path).endswith(".gz") else str(path)
+    with _open_text(path) as f:
+        if name.endswith((".csv", ".tsv")):
+            reader = csv.DictReader(f, delimiter="\t" if name.endswith(".tsv") else ",")
+            if reader.fieldnames is None:
+                return
+            if not any(a in reader.fieldnames for a in FIELDS["source"]) or not any(a in reader.fieldnames for a in FIELDS["target"]):
+                raise TraceError(f"{path}: colonnes émetteur/destinataire absentes (attendu: from,to,...)")
+            for row in reader:
+                stats.read += 1
+                yield row
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            stats.read += 1
+            try:
+                record = json.loads(line)
+            except ValueError:
+                stats.malformed += 1
+                continue
+            if isinstance(record, dict):
+                yield record
+            else:
+                stats.malformed += 1
+
+def iter_messages(records, stats: TraceStats, since: float | None = None, until: float | None = None,
+                  sample: float = 1.0, sample_key: str | None = None):
+    """Messages of `records` inside [since, until) and kept by the sampling."""
+    window = since is not None or until is not None
+    threshold = int(sample * 0x100000000)
+    for n, record in enumerate(records):
+        a, b = _field(record, "source"), _field(record, "target")
+        if a is None or b is None:
+            stats.malformed += 1
+            continue
+        t = parse_time(_field(record, "time"))
+        if window and (t is None or (since is not None and t < since) or (until is not None and t >= until)):
+            stats.outside += 1
+            continue
+        if sample < 1.0:
+            # Tirage déterministe: une même session (ou un même rang) est toujours gardée ou écartée
+            key = record.get(sample_key) if sample_key else n
+            if zlib.crc32(str(key).encode("utf-8")) >= threshold:
+                stats.sampled_out += 1
+                continue
+        kind = _field(record, "kind")
+        style = KINDS.get(str(kind).lower(), "message") if kind is not None else "message"
+        yield Message(str(a), str(b), str(_field(record, "label") or ""), style, t)
+
+def collapse_loops(messages, max_period: int = MAX_PERIOD, min_repeat: int = MIN_REPEAT):
+    """
+    ("message", m) and ("loop", pattern, count) items: consecutive repetitions
+    of a pattern of up to `max_period` messages become one loop. Only a window
+    of 2 * max_period messages is buffered.
+    """
+    buffer: deque[Message] = deque()
+    it = iter(messages)
+
+    def fill(size: int) -> bool:
+        while len(buffer) < size:
+            m = next(it, None)
+            if m is None:
+                return False
+            buffer.append(m)
+        return True
+
+    def repeats(pattern: list[Message], start: int) -> bool:
+        return all(buffer[start + i].key() == pattern[i].key() for i in range(len(pattern)))
+
+    while fill(1):
+        fill(2 * max_period)
+        period = next((p for p in range(1, max_period + 1)
+                       if len(buffer) >= 2 * p and repeats([buffer[i] for i in range(p)], p)), None)
+        if period is None:
+            yield ("message", buffer.popleft())
+            continue
+        pattern = [buffer.popleft() for _ in range(period)]
+        count = 1
+        while fill(period) and repeats(pattern, 0):
+            for _ in range(period):
+                buffer.popleft()
+            count += 1
+        if count >= min_repeat:
+            yield ("loop", pattern, count)
+        else:
+            for _ in range(count):
+                for m in pattern:
+                    yield ("message", m)
+
+def _item_rows(item) -> float:
+    return 1 if item[0] == "message" else len(item[1]) + 1.5
+
+def _page_diagram(items: list, participants: dict[str, None], title: str) -> Diagram:
+    d = Diagram("sequence", "LR")
+    d.title = title
+    for p in participants:
+        d.node(p, p, "participant")
+    for item in items:
+        if item[0] == "message":
+            m = item[1]
+            d.events.append(("message", m.source, m.target, m.label, m.style, False, False))
+        else:
+            _, pattern, count = item
+            d.events.append(("fragment", "loop", f"×{count}"))
+            d.events.extend(("message", m.source, m.target, m.label, m.style, False, False) for m in pattern)
+            d.events.append(("end",))
+    return d
+
+def _time_text(t: float | None) -> str:
+    if t is None:
+        return "?"
+    return datetime.fromtimestamp(t).isoformat(sep=" ", timespec="seconds") if t > 1e8 else f"{t:g}"
+
+@instrument.traced("trace_sequence")
+def build_file(path: str | Path, out_path: str | Path, since=None, until=None, sample: float = 1.0,
+               sample_key: str | None = None, page_rows: int = PAGE_ROWS, max_pages: int | None = None,
+               loops: bool = True, participants: list[str] | None = None, compressed: bool = False) -> TraceStats:
+    """Draw the trace `path` into `out_path`, one page per `page_rows` rows."""
+    if not 0.0 < sample <= 1.0:
+        raise TraceError(f"Taux d'échantillonnage hors de ]0, 1]: {sample}")
+    since, until = (parse_time(v) if isinstance(v, str) else v for v in (since, until))
+    stats = TraceStats()
+    messages = iter_messages(iter_records(path, stats), stats, since, until, sample, sample_key)
+    items = collapse_loops(messages) if loops else (("message", m) for m in messages)
+    name = Path(path).name
+    known: dict[str, None] = dict.fromkeys(participants or ())   # ordre des lignes de vie, stable d'une page à l'autre
+    builder = CompactDrawIOBuilder()
+    # Fichier temporaire: une trace illisible en cours de route ne laisse pas de .drawio tronqué
+    tmp = f"{out_path}.tmp"
+    try:
+        with DrawIOStreamWriter(tmp, compressed=compressed) as writer:
+            _write_pages(writer, builder, items, stats, name, known, page_rows, max_pages)
+        os.replace(tmp, out_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    instrument.count("trace_messages", stats.messages)
+    return stats
+
+def _write_pages(writer: DrawIOStreamWriter, builder: CompactDrawIOBuilder, items, stats: TraceStats, name: str,
+                 known: dict[str, None], page_rows: int, max_pages: int | None):
+    page: list = []
+    rows = 0.0
+    first = 0   # rang du premier message de la page
+
+    def flush_page():
+        nonlocal page, rows, first
+        count = sum(1 if it[0] == "message" else len(it[1]) * it[2] for it in page)
+        times = [m.time for it in page for m in ((it[1],) if it[0] == "message" else it[1]) if m.time is not None]
+        title = f"{name} — messages {first + 1}–{first + count}"
+        if times:
+            title += f" ({_time_text(min(times))} → {_time_text(max(times))})"
+        root = builder.add_page(f"{name} {stats.pages + 1}")
+        with instrument.span("trace_sequence.page", messages=count):
+            draw_sequence(_page_diagram(page, known, title), builder, root)
+        builder.flush(writer)
+        stats.pages += 1
+        first += count
+        page, rows = [], 0.0
+
+    for item in items:
+        if max_pages is not None and stats.pages >= max_pages:
+            break
+        if item[0] == "message":
+            m = item[1]
+            stats.messages += 1
+            ends = (m.source, m.target)
+        else:
+            stats.loops += 1
+            stats.messages += len(item[1])
+            stats.collapsed += len(item[1]) * (item[2] - 1)
+            ends = [p for m in item[1] for p in (m.source, m.target)]
+        for p in ends:
+            known.setdefault(p)
+        page.append(item)
+        rows += _item_rows(item)
+        if rows >= page_rows:
+            flush_page()
+    if page and (max_pages is None or stats.pages < max_pages):
+        flush_page()
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Diagrammes de séquence à partir de traces d'échanges (JSONL/CSV).")
+    parser.add_argument("trace", help="fichier de trace .jsonl, .csv ou .tsv (éventuellement .gz), - pour l'entrée standard")
+    parser.add_argument("-o", "--out", help="fichier .drawio (défaut: <trace>.drawio)")
+    parser.add_argument("--since", help="début de la fenêtre (inclus): nombre ou date ISO")
+    parser.add_argument("--until", help="fin de la fenêtre (exclue): nombre ou date ISO")
+    parser.add_argument("--sample", type=float, default=1.0, help="proportion de messages gardés, dans ]0, 1] (défaut: 1)")
+    parser.add_argument("--sample-key", help="champ tiré au sort à la place de chaque message (ex.: session)")
+    parser.add_argument("--page-rows", type=int, default=PAGE_ROWS, help=f"rangées par page (défaut: {PAGE_ROWS})")
+    parser.add_argument("--max-pages", type=int, help="arrêter après ce nombre de pages")
+    parser.add_argument("--participants", help="ordre des lignes de vie, séparées par des virgules (ex.: Client,DAB,Banque)")
+    parser.add_argument("--no-loops", action="store_true", help="ne pas replier les répétitions en boucles")
+    parser.add_argument("--compressed", action="store_true", help="pages compressées (format par défaut de draw.io)")
+    parser.add_argument("--trace", dest="trace_out", help="trace d'exécution (instrument.py): trace.json ou trace.chrome.json")
+    args = parser.parse_args(argv)
+
+    if args.trace_out:
+        instrument.enable(interval=0.05, dump_to=args.trace_out)
+    for option in ("since", "until"):
+        value = getattr(args, option)
+        if value is not None and parse_time(value) is None:
+            parser.error(f"--{option}: date illisible {value!r}")
+    out = args.out or ("trace.drawio" if args.trace == "-" else f"{Path(args.trace).name.split('.')[0]}.drawio")
+    try:
+        stats = build_file(args.trace, out, args.since, args.until, args.sample, args.sample_key, args.page_rows,
+                           args.max_pages, not args.no_loops,
+                           [p.strip() for p in args.participants.split(",")] if args.participants else None,
+                           args.compressed)
+    except (OSError, TraceError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{args.trace} -> {out}: {stats}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+UML-semantic validation of generated diagrams.
+
+The id, parent and adjacency indexes of each page are built once from its
+CellTable, then every check is a linear pass over them:
+
+- dangling parent/source/target references (e.g. a misspelled state id);
+- exactly one initial node per region (page layer or composite state; partitions
+  and interruptible regions, which have no role, are transparent);
+- fork/join arity: a bar is either 1 -> n (fork) or n -> 1 (join);
+- no transitions out of final nodes, none into initial nodes;
+- nodes unreachable from the initial nodes;
+- a guard "[...]" on every branch leaving a decision.
+
+Node kinds come from the shared style registry (styles.STYLES): a cell styled
+with STYLES["decision"], or a variant of it, is a decision, and so on.
+
+    python validate.py diagrammes/*.drawio     # code de sortie 1 si erreur
+"""
+from __future__ import annotations
+
+import re
+import sys
+import xml.etree.ElementTree as ET
+import zlib
+from collections import deque
+
+from drawio_model import KIND_EDGE, KIND_MISSING, KIND_VERTEX, NO_REF, CellTable
+from drawio_reader import page_tables
+from styles import STYLES
+
+# Rôle sémantique de chaque style nommé; les styles absents (notes, titres, couloirs...) sont ignorés
+ROLES = {
+    "start": "initial", "initial": "initial",
+    "flow_final": "final", "flow_final_cross": "final", "final": "final",
+    "decision": "decision", "merge": "merge", "bar": "bar",
+    "action": "node", "object": "node", "signal": "node", "state": "node", "composite": "node",
+}
+FLOW_ROLES = {"initial", "final", "decision", "merge", "bar", "node"}
+GUARD = re.compile(r"\[[^\]]+\]")
+
+ERROR = "erreur"
+WARNING = "avertissement"
+
+class Issue:
+    __slots__ = ("level", "page", "cell", "code", "message")
+
+    def __init__(self, level: str, page: str, cell: str | None, code: str, message: str):
+        self.level = level
+        self.page = page
+        self.cell = cell
+        self.code = code
+        self.message = message
+
+    def __str__(self) -> str:
+        where = f" [{self.cell}]" if self.cell is not None else ""
+        return f"{self.level}: {self.page}{where}: {self.message} ({self.code})"
+
+class _StyleNames:
+    """Style id -> registered style name, resolved once per distinct style through the registry."""
+
+    def __init__(self, table: CellTable):
+        self.table = table
+        self.cache: dict[int, str | None] = {}
+
+    def __call__(self, r: int) -> str | None:
+        sid = self.table.style[r]
+        if sid in self.cache:
+            return self.cache[sid]
+        style = self.table.pool.strings[sid]
+        name = STYLES.name_of(style)
+        if name is None and style:
+            # Variante d'un style nommé (surcharges)
+            name = STYLES.variant_of(style)
+        self.cache[sid] = name
+        return name
+
+def cell_style_names(table: CellTable) -> list[str | None]:
+    """Registered style name (e.g. "decision", "object_flow") of every row, None if unknown."""
+    name_of = _StyleNames(table)
+    names: list[str | None] = [None] * len(table.ids)
+    for r in table.order:
+        names[r] = name_of(r)
+    return names
+
+def cell_roles(table: CellTable) -> list[str | None]:
+    """Role (see ROLES) of every row of `table`; None for edges and decorations."""
+    names = cell_style_names(table)
+    kind = table.kind
+    return [ROLES.get(names[r]) if kind[r] == KIND_VERTEX and names[r] is not None else None for r in range(len(names))]
+
+def validate_table(table: CellTable, page: str | None = None) -> list[Issue]:
+    page = table.name if page is None else page
+    issues: list[Issue] = []
+    ids, kind, parent, source, target = table.ids, table.kind, table.parent, table.source, table.target
+    n = len(ids)
+
+    def report(level, r, code, message):
+        issues.append(Issue(level, page, None if r is None else ids[r], code, message))
+
+    # Index: rôle des sommets, adjacence (sommets de flux seulement), enfants par région
+    role = cell_roles(table)
+    out_edges: list[list[int]] = [[] for _ in range(n)]
+    in_degree = [0] * n
+    region_initials: dict[int, list[int]] = {}
+    region_nodes: dict[int, int] = {}
+    region_of = [NO_REF] * n   # région de chaque nœud de flux: composite englobant le plus proche ou calque
+
+    for r in table.order:
+        k = kind[r]
+        p = parent[r]
+        if p != NO_REF and kind[p] == KIND_MISSING:
+            report(ERROR, r, "parent-inconnu", f"parent {ids[p]!r} inexistant")
+        if k == KIND_VERTEX:
+            if role[r] in FLOW_ROLES:
+                # Couloirs et régions interruptibles (sans rôle) ne délimitent pas de région
+                for _ in range(n):   # borné: un cycle de parents ne boucle pas
+                    if p == NO_REF or kind[p] != KIND_VERTEX or role[p] in FLOW_ROLES:
+                        break
+                    p = parent[p]
+                region_of[r] = p
+                region_nodes[p] = region_nodes.get(p, 0) + 1
+                if role[r] == "initial":
+                    region_initials.setdefault(p, []).append(r)
+        elif k == KIND_EDGE:
+            s, t = source[r], target[r]
+            bad = False
+            for end, label in ((s, "source"), (t, "cible")):
+                if end == NO_REF:
+                    report(WARNING, r, "arete-non-reliee", f"arête sans {label}")
+                    bad = True
+                elif kind[end] == KIND_MISSING:
+                    report(ERROR, r, "reference-inconnue", f"{label} {ids[end]!r} inexistante")
+                    bad = True
+                elif kind[end] != KIND_VERTEX:
+                    report(ERROR, r, "reference-invalide", f"{label} {ids[end]!r} n'est pas un sommet")
+                    bad = True
+            if not bad and role[s] in FLOW_ROLES and role[t] in FLOW_ROLES:
+                out_edges[s].append(r)
+                in_degree[t] += 1
+
+    # Un nœud initial par région
+    for region, count in region_nodes.items():
+        initials = region_initials.get(region, [])
+        container = region != NO_REF and kind[region] == KIND_VERTEX
+        name = f"région {ids[region]!r}" if container else "page"
+        if len(initials) > 1:
+            for r in initials[1:]:
+                report(ERROR, r, "initial-multiple", f"plusieurs nœuds initiaux dans la {name}")
+        elif not initials and count > 1:
+            report(WARNING, region if container else None, "initial-absent", f"aucun nœud initial dans la {name}")
+
+    for r in table.order:
+        rl = role[r]
+        if rl is None or rl not in FLOW_ROLES:
+            continue
+        outs = out_edges[r]
+        if rl == "final" and outs:
+            report(ERROR, r, "sortie-final", f"{len(outs)} transition(s) sortant d'un nœud final")
+        elif rl == "initial" and in_degree[r]:
+            report(ERROR, r, "entree-initial", "transition entrant dans un nœud initial")
+        elif rl == "bar":
+            fan_in, fan_out = in_degree[r], len(outs)
+            if not ((fan_in == 1 and fan_out >= 2) or (fan_in >= 2 and fan_out == 1)):
+                report(ERROR, r, "arite-barre", f"barre {fan_in} -> {fan_out}: attendu fork 1 -> n ou join n -> 1")
+        elif rl == "decision" and len(outs) > 1:
+            for e in outs:
+                if not GUARD.search(table.labels[e]):
+                    report(ERROR, e, "garde-absente", f"branche de la décision {ids[r]!r} sans garde [..]")
+
+    # Accessibilité depuis les nœuds initiaux; entrer dans un composite active son initial,
+    # être dans un sous-état active ses englobants (leurs transitions sortantes s'appliquent)
+    children_initials = {reg: inits for reg, inits in region_initials.items() if reg != NO_REF and kind[reg] == KIND_VERTEX}
+    starts = [r for reg, inits in region_initials.items() if reg not in children_initials for r in inits]
+    if starts:
+        seen = bytearray(n)
+        queue = deque(starts)
+        for r in starts:
+            seen[r] = 1
+        while queue:
+            v = queue.popleft()
+            nexts = [target[e] for e in out_edges[v]]
+            nexts.extend(children_initials.get(v, ()))
+            p = region_of[v]
+            if p != NO_REF and role[p] in FLOW_ROLES:
+                nexts.append(p)
+            for w in nexts:
+                if not seen[w]:
+                    seen[w] = 1
+                    queue.append(w)
+        for r in table.order:
+            if role[r] in FLOW_ROLES and not seen[r]:
+                report(WARNING, r, "inaccessible", f"{table.labels[r] or ids[r]!r} inaccessible depuis un nœud initial")
+    return issues
+
+def validate(source) -> list[Issue]:
+    """Issues of every page of `source` (anything accepted by drawio_reader.page_tables)."""
+    issues: list[Issue] = []
+    for table in page_tables(source):
+        issues.extend(validate_table(table))
+    return issues
+
+def report(issues: list[Issue], out=sys.stdout) -> int:
+    """Print `issues`; return 1 if any is an error."""
+    for issue in issues:
+        print(issue, file=out)
+    return 1 if any(i.level == ERROR for i in issues) else 0
+
+def main(paths: list[str]) -> int:
+    status = 0
+    for path in paths:
+        try:
+            issues = validate(path)
+        except (OSError, ET.ParseError, ValueError, zlib.error) as e:
+            print(f"{path}: illisible ({e})")
+            status = 1
+            continue
+        errors = sum(1 for i in issues if i.level == ERROR)
+        print(f"{path}: {errors} erreur(s), {len(issues) - errors} avertissement(s)")
+        status = max(status, report(issues))
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Les scripts sont des modules à plat de scripts/ (importés comme "act", "styles"...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
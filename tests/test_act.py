@@ -0,0 +1,42 @@
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from act import DrawIOBuilder, DrawIOStreamWriter
+from styles import STYLES
+
+def _fill(d):
+    for name in ("Retrait", "Dépôt"):
+        page = d.add_page(name)
+        a = d.add_vertex(page, 40, 40, 160, 60, "Insérer carte & <PIN>", STYLES["action"])
+        b = d.add_vertex(page, 40, 160, 160, 60, "Saisir \"code\"", STYLES["action"])
+        d.add_edge(page, a, b, "[ok]")
+
+def _canonical(path):
+    return ET.canonicalize(from_file=str(path), strip_text=True)
+
+@pytest.mark.parametrize("indent", ["  ", None])
+def test_stream_writer_matches_builder(tmp_path, indent):
+    tree = DrawIOBuilder()
+    _fill(tree)
+    expected = tree.save(str(tmp_path / "tree.drawio"))
+    with DrawIOStreamWriter(tmp_path / "stream.drawio", indent) as stream:
+        _fill(stream)
+    assert _canonical(tmp_path / "stream.drawio") == _canonical(expected)
+
+def test_save_returns_the_written_path(tmp_path):
+    stream = DrawIOStreamWriter(str(tmp_path / "a.drawio"))
+    _fill(stream)
+    assert stream.save(str(tmp_path / "ignored.drawio")) == str(tmp_path / "a.drawio")
+    assert not (tmp_path / "ignored.drawio").exists()
+
+def test_cells_only_go_to_the_current_page():
+    buf = io.StringIO()
+    stream = DrawIOStreamWriter(buf)
+    first = stream.add_page("Un")
+    stream.add_page("Deux")
+    with pytest.raises(ValueError):
+        stream.add_vertex(first, 0, 0, 10, 10, "x", STYLES["action"])
+    stream.close()
+    assert len(ET.fromstring(buf.getvalue()).findall("diagram")) == 2
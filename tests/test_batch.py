@@ -0,0 +1,39 @@
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import batch
+import model_loader
+
+MODELS = Path(__file__).resolve().parent.parent / "scripts" / "models"
+
+def test_builds_every_model_in_parallel(tmp_path, capsys):
+    inputs = batch.expand_inputs([str(MODELS), str(MODELS / "*.yaml")])
+    assert [p.name for p in inputs] == ["atm_parallelisme.yaml", "atm_states.jsonl"]
+    assert batch.run(inputs, tmp_path, workers=2) == 0
+    for p in inputs:
+        assert ET.parse(tmp_path / f"{p.stem}.drawio").getroot().findall("diagram")
+    assert "2/2 diagramme(s)" in capsys.readouterr().out
+
+def test_failures_are_reported_without_stopping(tmp_path, capsys):
+    bad = tmp_path / "bad.json"
+    bad.write_text('{"type": "inconnu"}', encoding="utf-8")
+    assert batch.run([bad, MODELS / "atm_states.jsonl"], tmp_path / "out", workers=1) == 1
+    out = capsys.readouterr().out
+    assert "ÉCHEC" in out and "1/2 diagramme(s)" in out
+    assert (tmp_path / "out" / "atm_states.drawio").exists()
+
+def test_unexpected_error_shows_innermost_frame(tmp_path, monkeypatch, capsys):
+    def deep_failure():
+        raise RuntimeError("boum")
+
+    monkeypatch.setattr(model_loader, "build_file", lambda model, out: deep_failure())
+    assert batch.run([MODELS / "atm_states.jsonl"], tmp_path, workers=1) == 1
+    out = capsys.readouterr().out
+    assert "in deep_failure" in out and "RuntimeError: boum" in out
+
+def test_output_name_conflict(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    for d in ("a", "b"):
+        (tmp_path / d / "m.json").write_text("{}", encoding="utf-8")
+    assert batch.main([str(tmp_path), "-o", str(tmp_path / "out")]) == 2
@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+
+from build_cache import BuildCache, LRUCache
+
+def _built(cache, path, data):
+    with cache.output(path) as tmp:
+        Path(tmp).write_bytes(data)
+
+def test_fingerprint_follows_content(tmp_path):
+    src = tmp_path / "a.txt"
+    src.write_text("un")
+    cache = BuildCache(tmp_path / "m.json")
+    key = cache.fingerprint(src, 150, ["*.png"])
+    assert cache.fingerprint(src, 150, ["*.png"]) == key
+    assert cache.fingerprint(src, 300, ["*.png"]) != key
+    src.write_text("deux")
+    assert cache.fingerprint(src, 150, ["*.png"]) != key
+
+def test_fresh_until_output_touched(tmp_path):
+    out = tmp_path / "out" / "f.txt"
+    cache = BuildCache(tmp_path / "m.json")
+    _built(cache, out, b"x")
+    cache.record("t", "k", [out])
+    reloaded = BuildCache(tmp_path / "m.json")
+    assert reloaded.is_fresh("t", "k")
+    assert not reloaded.is_fresh("t", "autre")
+    out.write_bytes(b"modifie")
+    assert not reloaded.is_fresh("t", "k")
+
+def test_publish_keeps_unchanged_file(tmp_path):
+    out = tmp_path / "f.txt"
+    cache = BuildCache(tmp_path / "m.json")
+    _built(cache, out, b"x")
+    os.utime(out, ns=(1, 1))
+    _built(cache, out, b"x")
+    assert out.stat().st_mtime_ns == 1
+    assert list(tmp_path.iterdir()) == [out]
+    _built(cache, out, b"y")
+    assert out.read_bytes() == b"y"
+
+def test_file_modes(tmp_path):
+    umask = os.umask(0o022)
+    try:
+        cache = BuildCache(tmp_path / "m.json")
+        out = tmp_path / "f.txt"
+        _built(cache, out, b"x")
+        assert out.stat().st_mode & 0o777 == 0o644
+        cache.record("t", "k", [out])
+        assert (tmp_path / "m.json").stat().st_mode & 0o777 == 0o644
+        os.chmod(out, 0o600)
+        _built(cache, out, b"y")
+        assert out.stat().st_mode & 0o777 == 0o600
+    finally:
+        os.umask(umask)
+
+def test_record_removes_dropped_outputs(tmp_path):
+    cache = BuildCache(tmp_path / "m.json")
+    a, b, c = (tmp_path / n for n in ("a.png", "b.png", "c.png"))
+    for p in (a, b, c):
+        _built(cache, p, p.name.encode())
+    cache.record("t", "k1", [a, b, c])
+    c.write_bytes(b"edite a la main")
+    cache = BuildCache(tmp_path / "m.json")
+    cache.record("t", "k2", [a])
+    assert a.exists() and not b.exists()
+    assert c.exists()
+
+def test_lru_evicts_least_recent():
+    lru = LRUCache(2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1
+    lru.put("c", 3)
+    assert "b" not in lru and "a" in lru
+    assert lru.stats() == {"entries": 2, "maxsize": 2, "hits": 1, "misses": 0}
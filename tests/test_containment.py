@@ -0,0 +1,49 @@
+import pytest
+
+from act import DrawIOBuilder
+from containment import contain, main
+from drawio_model import CompactDrawIOBuilder
+from drawio_reader import page_tables
+from styles import STYLES
+
+def _page(d, overlap=False):
+    page = d.add_page("Couloirs")
+    lane = d.add_vertex(page, 100, 50, 300, 400, "Client", STYLES["swimlane"])
+    inner = d.add_vertex(page, 140, 100, 160, 60, "Insérer carte", STYLES["action"])
+    outer = d.add_vertex(page, 600, 100, 160, 60, "Hors couloir", STYLES["action"])
+    if overlap:
+        d.add_vertex(page, 320, 200, 160, 60, "Déborde", STYLES["action"])
+        d.add_vertex(page, 180, 130, 160, 60, "Chevauche", STYLES["action"])
+    d.add_edge(page, inner, outer)
+    return d, lane, inner, outer
+
+@pytest.mark.parametrize("builder", [DrawIOBuilder, CompactDrawIOBuilder])
+def test_vertices_move_into_their_lane(builder):
+    d, lane, inner, outer = _page(builder())
+    moved, issues = contain(d)
+    assert (moved, issues) == (1, [])
+    [t] = page_tables(d)
+    assert t.ref_id(t.parent[t.index[inner]]) == lane
+    assert t.geometry(t.index[inner]) == (40, 50, 160, 60)   # relatif au couloir
+    assert t.ref_id(t.parent[t.index[outer]]) == "1"
+    ax, ay = t.absolute()
+    assert (ax[t.index[inner]], ay[t.index[inner]]) == (140, 100)
+    assert contain(d)[0] == 0
+
+def test_overlaps_are_reported():
+    d, *_ = _page(CompactDrawIOBuilder(), overlap=True)
+    _, issues = contain(d)
+    t = d.pages[0]
+    assert sorted((i.code, t.labels[t.index[i.cell]]) for i in issues) == [
+        ("chevauchement", "Insérer carte"), ("debordement", "Déborde")]
+
+def test_check_leaves_the_file_alone(tmp_path, capsys):
+    path = tmp_path / "c.drawio"
+    _page(CompactDrawIOBuilder())[0].save(str(path))
+    before = path.read_bytes()
+    assert main([str(path), "--check"]) == 0
+    assert path.read_bytes() == before
+    assert "1 cellule(s) à rattacher" in capsys.readouterr().out
+    assert main([str(path), "-o", str(tmp_path / "out.drawio")]) == 0
+    [t] = page_tables(tmp_path / "out.drawio")
+    assert t.ref_id(t.parent[t.index["4"]]) == "3"
@@ -0,0 +1,59 @@
+import pytest
+
+from demarche_uml import FIGURE_PATTERNS, _caption_keys, _caption_regex, extract_figure_pages, index_figure_captions
+
+def test_overlapping_patterns_are_all_reported():
+    patterns = {"Fig 9.1": r"Figure\s*9\.?1", "Diag": r"Figure\s*9\.1 Diagramme"}
+    regex = _caption_regex(patterns)
+    assert _caption_keys(regex, list(patterns), "voir Figure 9.1 Diagramme de cas") == {"Fig 9.1", "Diag"}
+
+def test_figure_9_1_does_not_match_inside_9_10():
+    keys = list(FIGURE_PATTERNS)
+    regex = _caption_regex(FIGURE_PATTERNS)
+    assert _caption_keys(regex, keys, "Figure 9.10 Diagramme") == {"Figure 9.10"}
+    assert _caption_keys(regex, keys, "Figure 9.1. puis figure 93") == {"Figure 9.1", "Figure 9.3"}
+
+def _pdf(path):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for text in ("Introduction", "Figure 9.2 Diagramme d'activités", "Suite; voir la Figure 9.10 ci-dessous"):
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+    return path
+
+def test_caption_index_is_cached(tmp_path):
+    pdf = _pdf(tmp_path / "doc.pdf")
+    pages = extract_figure_pages(pdf, FIGURE_PATTERNS)
+    assert pages["Figure 9.2"] == 1 and pages["Figure 9.10"] == 2 and pages["Figure 9.1"] is None
+    cache = tmp_path / "doc.pdf.figindex.json"
+    assert cache.exists()
+    assert index_figure_captions(pdf, FIGURE_PATTERNS) == {1: ["Figure 9.2"], 2: ["Figure 9.10"]}
+
+def test_unwritable_cache_is_not_fatal(tmp_path, capsys):
+    pdf = _pdf(tmp_path / "doc.pdf")
+    cache = tmp_path / "absent" / "doc.figindex.json"
+    assert index_figure_captions(pdf, FIGURE_PATTERNS, cache) == {1: ["Figure 9.2"], 2: ["Figure 9.10"]}
+    assert not cache.exists()
+    assert "non enregistré" in capsys.readouterr().out
+
+def test_clip_uses_the_caption_not_the_cross_reference():
+    fitz = pytest.importorskip("fitz")
+    from demarche_uml import _figure_clip
+    doc = fitz.open()
+    page = doc.new_page(width=450, height=650)
+    page.insert_textbox(fitz.Rect(50, 50, 400, 100), "Comme le montre la Figure 9.1, le diagramme présente le cas.", fontsize=10)
+    page.draw_rect(fitz.Rect(100, 150, 350, 450), color=(0, 0, 0))
+    page.insert_textbox(fitz.Rect(50, 470, 400, 500), "Figure 9.1 Diagramme de cas", fontsize=10)
+    clip, xref = _figure_clip(page, _caption_regex({"F": FIGURE_PATTERNS["Figure 9.1"]}))
+    assert xref == 0
+    assert 100 < clip.y0 < 150      # sans le paragraphe au-dessus
+    assert clip.y1 > 480            # légende réelle incluse
+
+def test_figure_without_pattern_renders_the_full_page(tmp_path):
+    pytest.importorskip("fitz")
+    from demarche_uml import _render_jobs
+    pdf = _pdf(tmp_path / "doc.pdf")
+    out = tmp_path / "fig.png"
+    _render_jobs(str(pdf), [(1, [("Sans motif", str(out))])], 36, crop_patterns={})
+    assert out.read_bytes().startswith(b"\x89PNG")
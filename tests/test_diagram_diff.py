@@ -0,0 +1,154 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+import act
+from diagram_diff import apply_patch, diff, update_file
+from drawio_reader import page_tables
+from drawio_model import CompactDrawIOBuilder
+from styles import STYLES
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def _model(path, label="Insérer carte", extra=False, move=0):
+    d = CompactDrawIOBuilder(stable_ids=True)
+    page = d.add_page("Retrait")
+    a = d.add_vertex(page, 40 + move, 40, 160, 60, label, STYLES["action"])
+    b = d.add_vertex(page, 40, 160, 160, 60, "Saisir PIN", STYLES["action"])
+    d.add_edge(page, a, b)
+    if extra:
+        c = d.add_vertex(page, 40, 280, 160, 60, "Retirer billets", STYLES["action"])
+        d.add_edge(page, b, c, "[PIN valide]")
+    d.save(str(path))
+    return path
+
+@pytest.mark.parametrize("change", [
+    {"label": "Insérer la carte"},
+    {"extra": True},
+    {"move": 25},
+])
+def test_diff_then_apply_reproduces_new_version(tmp_path, change):
+    old = _model(tmp_path / "old.drawio")
+    new = _model(tmp_path / "new.drawio", **change)
+    ops = diff(old, new)
+    assert ops
+    assert apply_patch(old, ops, tmp_path / "patched.drawio")
+    assert diff(tmp_path / "patched.drawio", new) == []
+    # Patch en place: même résultat
+    assert update_file(old, new) == ops
+    assert diff(old, new) == []
+
+def test_empty_patch_writes_nothing(tmp_path):
+    old = _model(tmp_path / "old.drawio")
+    before = old.read_bytes()
+    assert diff(old, old) == []
+    assert not apply_patch(old, [], tmp_path / "out.drawio")
+    assert not (tmp_path / "out.drawio").exists()
+    assert old.read_bytes() == before
+
+def test_unchanged_pages_keep_their_bytes(tmp_path):
+    src = tmp_path / "act.drawio"
+    act.build_pages(act.DrawIOBuilder(stable_ids=True), str(src))
+    new = CompactDrawIOBuilder(stable_ids=True)
+    act.build_pages(new, str(tmp_path / "unused.drawio"))
+    first = new.pages[0]
+    first.labels[first.index[first.ids[first.order[2]]]] = "Libellé modifié"
+    ops = diff(src, new)
+    assert {op["page"] for op in ops} == {first.name}
+    out = tmp_path / "patched.drawio"
+    apply_patch(src, ops, out)
+    assert diff(out, new) == []
+    # Les autres pages sont recopiées telles quelles
+    old_text, new_text = src.read_text(encoding="utf-8"), out.read_text(encoding="utf-8")
+    assert old_text[old_text.index("<diagram", 10 + old_text.index("</diagram>")):] == \
+        new_text[new_text.index("<diagram", 10 + new_text.index("</diagram>")):]
+
+@pytest.mark.skipif(os.name != "posix", reason="droits POSIX")
+def test_new_output_keeps_source_mode(tmp_path):
+    old = _model(tmp_path / "old.drawio")
+    os.chmod(old, 0o644)
+    new = _model(tmp_path / "new.drawio", extra=True)
+    out = tmp_path / "out.drawio"
+    apply_patch(old, diff(old, new), out)
+    assert out.stat().st_mode & 0o777 == 0o644
+
+@pytest.mark.skipif(os.name != "posix", reason="droits POSIX")
+def test_existing_output_keeps_its_mode(tmp_path):
+    old = _model(tmp_path / "old.drawio")
+    new = _model(tmp_path / "new.drawio", extra=True)
+    out = tmp_path / "out.drawio"
+    shutil.copyfile(old, out)
+    os.chmod(out, 0o640)
+    apply_patch(old, diff(old, new), out)
+    assert out.stat().st_mode & 0o777 == 0o640
+
+def test_repository_diagrams_diff_to_nothing():
+    for path in sorted((ROOT / "diagrammes").glob("*.drawio")):
+        assert diff(path, path) == []
+
+def _pages(path, titles, compressed=False):
+    d = CompactDrawIOBuilder(stable_ids=True)
+    for title in titles:
+        page = d.add_page(title, compressed=compressed)
+        a = d.add_vertex(page, 40, 40, 160, 60, f"{title} A", STYLES["action"])
+        b = d.add_vertex(page, 40, 160, 160, 60, "B", STYLES["action"])
+        d.add_edge(page, a, b)
+    d.save(str(path))
+    return path
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_inserted_page_does_not_rewrite_the_following_ones(tmp_path, compressed):
+    old = _pages(tmp_path / "old.drawio", ["Un", "Deux", "Trois"], compressed)
+    new = _pages(tmp_path / "new.drawio", ["Zéro", "Un", "Deux", "Trois"], compressed)
+    ops = diff(old, new)
+    kinds = [op["op"] for op in ops]
+    assert "remove_page" not in kinds
+    assert kinds.count("add_page") == 1 and kinds.count("rename_page") == 3
+    # Seules les cellules de la nouvelle page sont ajoutées
+    assert {op["page"] for op in ops if op["op"] == "add"} == {"01 - Zéro"}
+    out = tmp_path / "patched.drawio"
+    apply_patch(old, ops, out)
+    assert diff(out, new) == []
+    assert [t.name for t in page_tables(out)] == [t.name for t in page_tables(new)]
+
+def test_reordered_pages_keep_their_cells(tmp_path):
+    old = _pages(tmp_path / "old.drawio", ["Un", "Deux", "Trois"])
+    new = _pages(tmp_path / "new.drawio", ["Trois", "Un", "Deux"])
+    ops = diff(old, new)
+    assert {op["op"] for op in ops} == {"rename_page", "order_pages"}
+    out = tmp_path / "patched.drawio"
+    apply_patch(old, ops, out)
+    assert diff(out, new) == []
+    assert [t.name for t in page_tables(out)] == ["01 - Trois", "02 - Un", "03 - Deux"]
+
+def test_removed_page(tmp_path):
+    old = _pages(tmp_path / "old.drawio", ["Un", "Deux", "Trois"])
+    new = _pages(tmp_path / "new.drawio", ["Un", "Trois"])
+    ops = diff(old, new)
+    assert [op["op"] for op in ops] == ["rename_page", "remove_page"]
+    apply_patch(old, ops)
+    assert diff(old, new) == []
+
+def test_patch_keeps_and_writes_wrappers(tmp_path):
+    old = _model(tmp_path / "old.drawio")
+    new = tmp_path / "new.drawio"
+    [table] = page_tables(_model(tmp_path / "base.drawio", extra=True))
+    ids = [table.ids[r] for r in table.order if table.kind[r] == 1]
+    table.wrappers[table.index[ids[0]]] = ("UserObject", {"tooltip": "début"})
+    table.wrappers[table.index[ids[2]]] = ("object", {"lien": "#fin"})
+    with act.DrawIOStreamWriter(str(new)) as writer:
+        table.write(writer)
+    assert update_file(old, new)
+    assert diff(old, new) == []
+    [patched] = page_tables(old)
+    assert patched.wrappers == {patched.index[ids[0]]: ("UserObject", {"tooltip": "début"}),
+                                patched.index[ids[2]]: ("object", {"lien": "#fin"})}
+    # Retrait de l'enveloppe: la cellule redevient un simple mxCell
+    [table] = page_tables(new)
+    table.wrappers.clear()
+    with act.DrawIOStreamWriter(str(new)) as writer:
+        table.write(writer)
+    assert update_file(old, new)
+    assert diff(old, new) == [] and page_tables(old)[0].wrappers == {}
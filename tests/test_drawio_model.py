@@ -0,0 +1,47 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from act import DrawIOBuilder, DrawIOStreamWriter
+from drawio_model import KIND_VERTEX, CellTable, CompactDrawIOBuilder
+from styles import STYLES
+
+def _fill(d):
+    for name in ("Retrait", "Dépôt"):
+        page = d.add_page(name)
+        lane = d.add_vertex(page, 0, 0, 400, 300, "Client", STYLES["action"])
+        a = d.add_vertex(page, 40, 40, 160, 60, "Insérer carte", STYLES["action"], parent=lane)
+        b = d.add_vertex(page, 40, 160, 160, 60, "Saisir PIN", STYLES["action"], parent=lane)
+        d.add_edge(page, a, b, "[ok]")
+
+def _canonical(path):
+    return ET.canonicalize(from_file=str(path), strip_text=True)
+
+def test_compact_builder_matches_builder(tmp_path):
+    tree, compact = DrawIOBuilder(), CompactDrawIOBuilder()
+    _fill(tree)
+    _fill(compact)
+    assert _canonical(compact.save(str(tmp_path / "c.drawio"))) == _canonical(tree.save(str(tmp_path / "t.drawio")))
+
+def test_flush_keeps_ids_counting(tmp_path):
+    d = CompactDrawIOBuilder()
+    with DrawIOStreamWriter(tmp_path / "f.drawio") as writer:
+        d.add_vertex(d.add_page("Un"), 0, 0, 10, 10, "a", STYLES["action"])
+        d.flush(writer)
+        assert d.pages == []
+        d.add_vertex(d.add_page("Deux"), 0, 0, 10, 10, "b", STYLES["action"])
+        d.flush(writer)
+    ids = [c.get("id") for c in ET.parse(tmp_path / "f.drawio").iter("mxCell") if c.get("vertex")]
+    assert ids == ["3", "4"]
+
+def test_forward_references_and_duplicates():
+    t = CellTable("p")
+    t.add("e", 2, source="a", target="b")
+    assert t.missing() == ["a", "b"]
+    t.add("a", KIND_VERTEX, geometry=(10, 20, 30, 40))
+    t.add("b", KIND_VERTEX, parent="a", geometry=(5, 5, 10, 10))
+    assert t.missing() == []
+    ax, ay = t.absolute()
+    assert (ax[t.index["b"]], ay[t.index["b"]]) == (15, 25)
+    with pytest.raises(ValueError):
+        t.add("a", KIND_VERTEX)
@@ -0,0 +1,85 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from act import DrawIOBuilder, DrawIOStreamWriter
+from diagram_diff import diff
+from drawio_reader import decompress_diagram, read_drawio
+from styles import STYLES
+
+WRAPPED = """<mxfile host="app.diagrams.net">
+  <diagram name="01 - Retrait" id="p1">
+    <mxGraphModel>
+      <root>
+        <mxCell id="0" />
+        <mxCell id="1" parent="0" />
+        <UserObject label="Insérer carte" tooltip="étape 1" link="#p2" id="a">
+          <mxCell style="rounded=1;" vertex="1" parent="1">
+            <mxGeometry x="40" y="40" width="160" height="60" as="geometry" />
+          </mxCell>
+        </UserObject>
+        <object label="" placeholders="1" id="e">
+          <mxCell edge="1" parent="1" source="a" target="a">
+            <mxGeometry relative="1" as="geometry" />
+          </mxCell>
+        </object>
+      </root>
+    </mxGraphModel>
+  </diagram>
+</mxfile>
+"""
+
+def _rewrite(src, dst, compressed):
+    with DrawIOStreamWriter(str(dst), "  ", compressed=compressed) as writer:
+        for page in read_drawio(src):
+            page.cells.write(writer)
+    return dst
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_wrappers_survive_a_rewrite(tmp_path, compressed):
+    src = tmp_path / "in.drawio"
+    src.write_text(WRAPPED, encoding="utf-8")
+    out = _rewrite(src, tmp_path / "out.drawio", compressed)
+    [page] = read_drawio(out)
+    assert page.compressed is compressed
+    t = page.cells
+    a, e = t.index["a"], t.index["e"]
+    assert t.wrappers == {a: ("UserObject", {"tooltip": "étape 1", "link": "#p2"}), e: ("object", {"placeholders": "1"})}
+    assert t.labels[a] == "Insérer carte"
+    assert t.geometry(a) == (40, 40, 160, 60)
+    assert t.ref_id(t.source[e]) == "a"
+
+def test_wrapper_is_written_around_the_cell(tmp_path):
+    src = tmp_path / "in.drawio"
+    src.write_text(WRAPPED, encoding="utf-8")
+    root = ET.parse(_rewrite(src, tmp_path / "out.drawio", False)).getroot().find(".//root")
+    user = root.find("UserObject")
+    assert user.attrib == {"label": "Insérer carte", "tooltip": "étape 1", "link": "#p2", "id": "a"}
+    cell = user.find("mxCell")
+    assert "id" not in cell.attrib and "value" not in cell.attrib
+    assert cell.find("mxGeometry").get("width") == "160"
+
+def _builder(**kwargs):
+    d = DrawIOBuilder(**kwargs)
+    for name, compressed in (("Retrait", None), ("Dépôt", False), ("Erreur", None)):
+        page = d.add_page(name, compressed)
+        a = d.add_vertex(page, 40, 40, 160, 60, "Insérer carte & <PIN> 100 %", STYLES["action"])
+        b = d.add_vertex(page, 40, 160, 160, 60, "Saisir « code »", STYLES["action"])
+        d.add_edge(page, a, b, "[ok]")
+    return d
+
+def test_compressed_output_reads_back_equal(tmp_path):
+    plain = _builder().save(str(tmp_path / "plain.drawio"))
+    packed = _builder().save(str(tmp_path / "packed.drawio"), compressed=True)
+    pages = read_drawio(packed)
+    assert [p.compressed for p in pages] == [True, False, True]
+    assert diff(packed, plain) == []
+    assert pages[0].cells.labels[pages[0].cells.index["3"]] == "Insérer carte & <PIN> 100 %"
+
+def test_compressed_payload_is_drawio_encoding(tmp_path):
+    packed = _builder(compressed=True).save(str(tmp_path / "packed.drawio"))
+    diagram = ET.parse(packed).getroot().find("diagram")
+    model = ET.fromstring(decompress_diagram(diagram.text))
+    assert model.tag == "mxGraphModel"
+    assert [c.get("value") for c in model.iter("mxCell") if c.get("vertex")] == [
+        "Insérer carte & <PIN> 100 %", "Saisir « code »"]
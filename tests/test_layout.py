@@ -0,0 +1,84 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+from layout import LayoutGraph, layered_layout
+
+def _overlaps(layout, ids):
+    """Pairs of `ids` whose boxes intersect (same rank = same centre along the rank axis)."""
+    by_rank = defaultdict(list)
+    for id_ in ids:
+        x, y, w, h = layout.positions[id_]
+        by_rank[x + w / 2].append((y, y + h, id_))
+    found = []
+    for boxes in by_rank.values():
+        boxes.sort()
+        for (y0, y1, a), (z0, _, b) in zip(boxes, boxes[1:]):
+            if z0 < y1 - 1e-6:
+                found.append((a, b))
+    return found
+
+def _outside_lane(layout, graph):
+    bad = []
+    for v, id_ in enumerate(graph.ids):
+        lane = graph.lane[v]
+        if lane is None:
+            continue
+        _, y, _, h = layout.positions[id_]
+        _, ly, _, lh = layout.lanes[lane]
+        if y < ly - 1e-6 or y + h > ly + lh + 1e-6:
+            bad.append(id_)
+    return bad
+
+def test_pulled_node_leaves_room_for_the_rest_of_its_lane():
+    g = LayoutGraph()
+    for n, lane in zip("abcdef", "AAAABB"):
+        g.add_node(n, 120, 40, lane=lane)
+    for s, t in ("bc", "bd", "ef"):
+        g.add_edge(s, t)
+    result = layered_layout(g)
+    assert _overlaps(result, g.ids) == []
+    assert _outside_lane(result, g) == []
+
+def test_height_covers_every_node():
+    g = LayoutGraph()
+    for n in "abcd":
+        g.add_node(n, 120, 40)
+    g.add_edge("b", "c")
+    g.add_edge("b", "d")
+    result = layered_layout(g)
+    assert max(y + h for _, y, _, h in result.positions.values()) <= result.height
+
+@pytest.mark.parametrize("direction", ["LR", "TB"])
+def test_random_graph_has_no_overlap_and_respects_lanes(direction):
+    rng = random.Random(7)
+    g = LayoutGraph()
+    n = 2000
+    for i in range(n):
+        g.add_node(f"n{i}", rng.choice((60, 120, 160)), rng.choice((30, 40, 80)), lane=f"L{rng.randrange(4)}")
+    for _ in range(2 * n):
+        g.add_edge(f"n{rng.randrange(n)}", f"n{rng.randrange(n)}")
+    result = layered_layout(g, direction)
+    if direction == "TB":
+        # Même contrôle, axes échangés
+        result.positions = {k: (y, x, h, w) for k, (x, y, w, h) in result.positions.items()}
+        result.lanes = {k: (y, x, h, w) for k, (x, y, w, h) in result.lanes.items()}
+    assert _overlaps(result, g.ids) == []
+    assert _outside_lane(result, g) == []
+
+def test_composite_is_grown_around_its_children():
+    g = LayoutGraph()
+    g.add_node("P", 40, 40)
+    for c in "abcd":
+        g.add_node(c, 100, 40, parent="P")
+    g.add_edge("b", "c")
+    g.add_edge("b", "d")
+    g.add_node("Q", 80, 40)
+    g.add_edge("P", "Q")
+    result = layered_layout(g)
+    _, _, pw, ph = result.positions["P"]
+    for c in "abcd":
+        x, y, w, h = result.positions[c]      # relatif au parent
+        assert 0 <= x and x + w <= pw and 0 <= y and y + h <= ph
+    assert _overlaps(result, list("abcd")) == []
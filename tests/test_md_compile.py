@@ -0,0 +1,69 @@
+import os
+
+from build_cache import BuildCache
+from drawio_reader import read_drawio
+from md_compile import BlockCache, compile_file, iter_markdown_blocks, parse
+
+DOC = """# Distributeur
+
+## États
+
+```mermaid
+stateDiagram-v2
+    [*] --> Attente
+    Attente --> Lecture : carte insérée
+    Lecture --> [*]
+```
+
+## Classes
+
+```mermaid
+classDiagram
+    Compte <|-- CompteEpargne
+    Compte : +solde
+```
+
+```python
+print("ignoré")
+```
+
+## Échanges
+
+```plantuml
+@startuml
+Client -> DAB : insérer carte
+DAB --> Client : demander PIN
+@enduml
+```
+"""
+
+def _labels(page):
+    t = page.cells
+    return {t.labels[r] for r in t.order if t.labels[r]}
+
+def test_blocks_are_named_after_headings(tmp_path):
+    md = tmp_path / "doc.md"
+    md.write_text(DOC, encoding="utf-8")
+    blocks = list(iter_markdown_blocks(md))
+    assert [(b.name, b.dialect) for b in blocks] == [("États", "mermaid"), ("Classes", "mermaid"), ("Échanges", "plantuml")]
+    assert [parse(b.text, b.dialect).kind for b in blocks] == ["state", "class", "sequence"]
+
+def test_compile_then_reuse_the_cache(tmp_path, capsys):
+    md = tmp_path / "doc.md"
+    md.write_text(DOC, encoding="utf-8")
+    out = tmp_path / "out" / "doc.drawio"
+    cache = BlockCache(tmp_path / "cache")
+    build_cache = BuildCache(tmp_path / "manifest.json")
+    assert compile_file(md, out, cache, build_cache) == str(out)
+    pages = read_drawio(out)
+    assert [p.name for p in pages] == ["01 - États", "02 - Classes", "03 - Échanges"]
+    assert {"Attente", "Lecture"} <= _labels(pages[0])
+    assert {"insérer carte", "demander PIN"} <= _labels(pages[2])
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    before = out.read_bytes()
+    os.utime(out, ns=(1, 1))
+    cache = BlockCache(tmp_path / "cache")
+    compile_file(md, out, cache, build_cache)
+    assert (cache.hits, cache.misses) == (3, 0)
+    assert out.read_bytes() == before and out.stat().st_mtime_ns == 1
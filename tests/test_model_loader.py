@@ -0,0 +1,59 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import validate
+from model_loader import ModelError, build_file, build_state, load_model, parse_model
+
+MODELS = Path(__file__).resolve().parent.parent / "scripts" / "models"
+
+def _state_doc(states, transitions):
+    return json.dumps({"type": "state", "name": "M", "states": states, "transitions": transitions})
+
+def _cell_ids(mxfile):
+    return [c.get("id") for c in mxfile.iter("mxCell")]
+
+def test_unnamed_transitions_do_not_reuse_node_ids():
+    model = parse_model(_state_doc(
+        [{"id": "t0"}, {"id": "t1"}, {"id": "B"}],
+        [{"source": "t0", "target": "B"}, {"source": "B", "target": "t1"}, {"source": "t1", "target": "t0", "id": "t2"}],
+    ))
+    mxfile = build_state(model)
+    ids = _cell_ids(mxfile)
+    assert len(ids) == len(set(ids))
+    # validate lève ValueError sur un identifiant de cellule en double
+    assert [i for i in validate.validate(mxfile) if i.level == validate.ERROR] == []
+
+def test_duplicate_node_id_is_rejected():
+    with pytest.raises(ModelError, match="id en double"):
+        parse_model(_state_doc([{"id": "A"}, {"id": "A"}], []))
+
+def test_unknown_reference_is_reported():
+    with pytest.raises(ModelError, match="inconnu"):
+        parse_model(_state_doc([{"id": "A"}], [{"source": "A", "target": "Z"}]))
+
+@pytest.mark.parametrize("text", ["- 1\n- 2\n", "42\n", "pages\n", "type: state\n---\n[a, b]\n"])
+def test_yaml_document_must_be_a_mapping(text):
+    pytest.importorskip("yaml")
+    with pytest.raises(ModelError, match="mapping"):
+        parse_model(text, "yaml")
+
+@pytest.mark.parametrize("text, fmt", [("[1, 2]", "json"), ('{"type": "state"}\n[1]\n', "jsonl")])
+def test_json_record_must_be_an_object(text, fmt):
+    with pytest.raises(ModelError):
+        parse_model(text, fmt)
+
+def test_unsupported_format():
+    with pytest.raises(ModelError, match="format non supporté"):
+        parse_model("{}", "xml")
+
+@pytest.mark.parametrize("name", sorted(p.name for p in MODELS.iterdir()))
+def test_repository_models_build(tmp_path, name):
+    if name.endswith((".yaml", ".yml")):
+        pytest.importorskip("yaml")
+    model = load_model(MODELS / name)
+    assert model.pages and model.pages[0].nodes
+    out = build_file(MODELS / name, tmp_path / "out.drawio")
+    errors = [i for i in validate.validate(out) if i.level == validate.ERROR]
+    assert errors == []
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from render_service import RenderService
+
+MODELS = Path(__file__).resolve().parent.parent / "scripts" / "models"
+
+async def _exchange(port, requests):
+    """Send `requests` (method, target, body) on one keep-alive connection; return (status, headers, body) each."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    responses = []
+    for method, target, body in requests:
+        writer.write(f"{method} {target} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while (line := await reader.readline()) != b"\r\n":
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        responses.append((status, headers, await reader.readexactly(int(headers["content-length"]))))
+    writer.close()
+    return responses
+
+def _serve(requests):
+    async def run():
+        service = RenderService(workers=1)
+        server = await asyncio.start_server(service.serve_connection, "127.0.0.1", 0)
+        try:
+            return await _exchange(server.sockets[0].getsockname()[1], requests), service
+        finally:
+            server.close()
+            service.close()
+    return asyncio.run(run())
+
+def test_model_compile_and_render():
+    model = (MODELS / "atm_states.jsonl").read_bytes()
+    block = b"stateDiagram-v2\n    [*] --> Attente\n    Attente --> Lecture : carte\n"
+    responses, service = _serve([
+        ("POST", "/model?format=jsonl&output=svg", model),
+        ("POST", "/model?format=jsonl&output=svg", model),
+        ("POST", "/compile?dialect=mermaid", block),
+    ])
+    (s1, h1, svg), (s2, h2, again), (s3, h3, drawio) = responses
+    assert (s1, s2, s3) == (200, 200, 200)
+    assert h1["content-type"].startswith("image/svg+xml") and b"<svg" in svg[:200]
+    assert (h1["x-cache"], h2["x-cache"]) == ("miss", "hit") and again == svg
+    assert b"Lecture" in drawio and h3["content-type"].startswith("application/xml")
+    assert service.builds == 2
+
+    [(status, _, rendered)] = _serve([("POST", "/render?page=1", drawio)])[0]
+    assert status == 200 and b"Lecture" in rendered
+
+def test_errors_are_plain_text():
+    responses, _ = _serve([
+        ("GET", "/model", b""),
+        ("GET", "/inconnue", b""),
+        ("POST", "/model?format=json", b'{"type": "inconnu"}'),
+        ("POST", "/render?page=9", b"<mxfile><diagram name='p'><mxGraphModel><root/></mxGraphModel></diagram></mxfile>"),
+        ("GET", "/figures", b""),
+        ("GET", "/stats", b""),
+    ])
+    assert [r[0] for r in responses] == [405, 404, 400, 400, 400, 200]
+    assert json.loads(responses[-1][2])["requests"] == 6
+
+def test_figures_of_a_read_only_directory(tmp_path):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Figure 9.2 Diagramme d'activités")
+    doc.save(tmp_path / "doc.pdf")
+    doc.close()
+    os.chmod(tmp_path, 0o555)
+    try:
+        responses, _ = _serve([("GET", f"/figures?pdf={tmp_path / 'doc.pdf'}", b"")] * 2)
+    finally:
+        os.chmod(tmp_path, 0o755)
+    (s1, h1, body), (s2, h2, _) = responses
+    assert (s1, s2) == (200, 200) and json.loads(body)["Figure 9.2"] == 0
+    assert (h1["x-cache"], h2["x-cache"]) == ("miss", "hit")
@@ -0,0 +1,25 @@
+from drawio_model import CompactDrawIOBuilder
+from drawio_reader import page_tables
+from render_svg import _resolve, render_page
+from styles import STYLES
+
+def test_third_party_base_tokens_are_not_expanded():
+    assert _resolve("swimlane;html=1;") == {"swimlane": None, "html": "1"}
+    assert _resolve("note;whiteSpace=wrap;", named=True) == {"note": None, "whiteSpace": "wrap"}
+    # Sans marqueur, un nom du registre reste un jeton nu
+    assert _resolve("action;") == {"action": None}
+
+def test_named_style_file_renders_like_full_styles(tmp_path):
+    svgs = []
+    for named in (False, True):
+        d = CompactDrawIOBuilder()
+        page = d.add_page("Page")
+        a = d.add_vertex(page, 20, 20, 120, 40, "A", STYLES["action"])
+        b = d.add_vertex(page, 20, 120, 120, 40, "B", STYLES.get("action", fillColor="#ffffff"))
+        d.add_edge(page, a, b)
+        path = tmp_path / f"named_{named}.drawio"
+        d.save(str(path), named_styles=named)
+        table = page_tables(path)[0]
+        assert table.named_styles is named
+        svgs.append(render_page(table))
+    assert svgs[0] == svgs[1]
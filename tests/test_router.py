@@ -0,0 +1,60 @@
+import pytest
+
+from act import DrawIOBuilder
+from drawio_model import KIND_EDGE, CompactDrawIOBuilder
+from drawio_reader import page_tables
+from router import GridIndex, _cuts, main, route
+from styles import STYLES
+
+BOXES = {"A": (0, 100, 80, 40), "Mur": (160, 40, 80, 160), "B": (320, 100, 80, 40), "C": (160, 300, 80, 40)}
+
+def _page(d):
+    page = d.add_page("Routage")
+    ids = {label: d.add_vertex(page, x, y, w, h, label, STYLES["action"]) for label, (x, y, w, h) in BOXES.items()}
+    d.add_edge(page, ids["A"], ids["B"])
+    d.add_edge(page, ids["A"], ids["C"])
+    return d
+
+def _full_routes(table):
+    """Edge id -> absolute polyline, from the fixed exit/entry points and the waypoints."""
+    routes = {}
+    for r in table.order:
+        if table.kind[r] != KIND_EDGE:
+            continue
+        style = STYLES.parsed(table.style_of(r))
+        s, t = table.source[r], table.target[r]
+        sx, sy, sw, sh = table.geometry(s)
+        tx, ty, tw, th = table.geometry(t)
+        start = (sx + float(style["exitX"]) * sw, sy + float(style["exitY"]) * sh)
+        end = (tx + float(style["entryX"]) * tw, ty + float(style["entryY"]) * th)
+        routes[table.ids[r]] = [start, *table.points.get(r, []), end]
+    return routes
+
+@pytest.mark.parametrize("builder", [DrawIOBuilder, CompactDrawIOBuilder])
+def test_routes_avoid_obstacles(builder):
+    d = _page(builder())
+    stats = route(d)
+    assert (stats.routed, stats.failed) == (2, 0)
+    [table] = page_tables(d)
+    x, y, w, h = BOXES["Mur"]
+    wall = (x, y, x + w, y + h)
+    for points in _full_routes(table).values():
+        assert all(a[0] == b[0] or a[1] == b[1] for a, b in zip(points, points[1:]))   # orthogonale
+        assert not any(_cuts(wall, a, b) for a, b in zip(points, points[1:]))
+
+def test_route_file_writes_the_output_only(tmp_path, capsys):
+    src = tmp_path / "in.drawio"
+    _page(CompactDrawIOBuilder()).save(str(src))
+    before = src.read_bytes()
+    assert main([str(src), "-o", str(tmp_path / "out.drawio")]) == 0
+    assert src.read_bytes() == before
+    [table] = page_tables(tmp_path / "out.drawio")
+    assert len(_full_routes(table)) == 2
+    assert "2 arête(s) routée(s)" in capsys.readouterr().out
+
+def test_grid_index_query_finds_overlapping_boxes():
+    grid = GridIndex(50)
+    near = grid.insert(0, 0, 40, 40)
+    grid.insert(500, 500, 540, 540)
+    assert near in grid.query(30, 30, 60, 60)
+    assert grid.query(200, 200, 210, 210) == set()
@@ -0,0 +1,88 @@
+import pytest
+
+import act
+from simulate import FlowGraph, compile_activity, simulate
+
+def _graph(nodes, edges):
+    """FlowGraph from (id, kind) nodes and (source, target) edges."""
+    g = FlowGraph("test")
+    for id_, kind in nodes:
+        g.ids.append(id_)
+        g.labels.append(id_)
+        g.kinds.append(kind)
+        g.out.append([])
+        g.inc.append([])
+    for source, target in edges:
+        e = len(g.src)
+        s, t = g.ids.index(source), g.ids.index(target)
+        g.edge_ids.append(f"e{e}")
+        g.edge_labels.append("")
+        g.src.append(s)
+        g.dst.append(t)
+        g.exception.append(False)
+        g.out[s].append(e)
+        g.inc[t].append(e)
+    g.region_of = [()] * len(g.ids)
+    return g
+
+FORK_JOIN = _graph(
+    [("i", "initial"), ("F", "fork"), ("X", "action"), ("Y", "action"), ("Z", "action"),
+     ("M", "merge"), ("J", "join"), ("f", "activity_final")],
+    [("i", "F"), ("F", "X"), ("F", "Y"), ("F", "Z"), ("X", "M"), ("Y", "M"), ("M", "J"), ("Z", "J"), ("J", "f")],
+)
+
+def test_join_waits_for_every_incoming_edge():
+    # Deux jetons arrivent par M->J (t=1 et t=2) avant celui de Z->J (t=10)
+    report = simulate(FORK_JOIN, 20, {"durations": {"X": 1, "Y": 2, "Z": 10}}, seed=1, engine="events")
+    assert report.completed == 20
+    assert report.summary()["latency"]["max"] == pytest.approx(10.0)
+    assert report.summary()["latency"]["p50"] == pytest.approx(10.0)
+
+def test_join_in_a_cycle_waits_for_the_other_branch():
+    # Chaque tour de boucle de A envoie un jeton à J par la même arête F2->J;
+    # B (t=50) reste nécessaire
+    g = _graph(
+        [("i", "initial"), ("F", "fork"), ("A", "action"), ("F2", "fork"), ("D", "decision"),
+         ("B", "action"), ("J", "join"), ("f", "activity_final"), ("x", "flow_final")],
+        [("i", "F"), ("F", "A"), ("F", "B"), ("A", "F2"), ("F2", "J"), ("F2", "D"),
+         ("D", "A"), ("D", "x"), ("B", "J"), ("J", "f")],
+    )
+    config = {"durations": {"A": 1, "B": 50}, "branches": {"e6": 0.9, "e7": 0.1}}
+    report = simulate(g, 200, config, seed=0, engine="events")
+    assert report.completed == 200
+    latency = report.summary()["latency"]
+    assert latency["p50"] == pytest.approx(50.0)
+    assert latency["max"] == pytest.approx(50.0)
+    assert min(report.latencies) == pytest.approx(50.0)
+
+def test_engines_agree_on_the_fork_join_page(tmp_path):
+    pytest.importorskip("numpy")
+    d = act.DrawIOBuilder()
+    act.build_pages(d, str(tmp_path / "act.drawio"))
+    graph = compile_activity(d, page=1)
+    config = {"durations": {"*": "const:1"}}
+    vector = simulate(graph, 2000, config, seed=3, engine="vector").summary()
+    events = simulate(graph, 2000, config, seed=3, engine="events").summary()
+    assert vector["completed"] == events["completed"] == 2000
+    assert vector["latency"]["mean"] == pytest.approx(events["latency"]["mean"])
+    assert vector["throughput"] == pytest.approx(events["throughput"])
+
+@pytest.mark.parametrize("engine", ["events", "vector"])
+def test_throughput_does_not_depend_on_session_count(engine):
+    if engine == "vector":
+        pytest.importorskip("numpy")
+    config = {"durations": {"X": 1, "Y": 2, "Z": 4}}
+    small = simulate(FORK_JOIN, 500, config, seed=0, engine=engine).summary()
+    large = simulate(FORK_JOIN, 5000, config, seed=0, engine=engine).summary()
+    # Sans taux d'arrivée, toutes les sessions partent à 0: pas de débit mesurable
+    assert small["throughput"] is None and large["throughput"] is None
+    config["arrival_rate"] = 2.0
+    small = simulate(FORK_JOIN, 2000, config, seed=0, engine=engine).summary()
+    large = simulate(FORK_JOIN, 20000, config, seed=0, engine=engine).summary()
+    assert small["throughput"] == pytest.approx(2.0, rel=0.1)
+    assert large["throughput"] == pytest.approx(2.0, rel=0.1)
+
+def test_bottleneck_throughput_from_capacity():
+    config = {"durations": {"X": 1, "Y": 2, "Z": 4}, "capacity": {"Z": 2}, "arrival_rate": 0.2}
+    summary = simulate(FORK_JOIN, 1000, config, seed=0, engine="events").summary()
+    assert summary["bottleneck"] == {"node": "Z", "max_throughput": pytest.approx(0.5)}
@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import pytest
+
+import state
+import statemachine
+from model_loader import build_state, parse_model
+from statemachine import AsyncStateMachine, compile_machine, parse_label, replay, replay_file
+
+@pytest.fixture(scope="module")
+def atm():
+    return compile_machine(state.build_drawio())
+
+@pytest.mark.parametrize("label, expected", [
+    ("pinInvalide / incTentatives()", ("pinInvalide", None, ["incTentatives()"])),
+    ("tentatives&gt;3 / aspirerCarte()", (None, "tentatives>3", ["aspirerCarte()"])),
+    ("annuler [solde>0] / a(); b()", ("annuler", "solde>0", ["a()", "b()"])),
+    ("", (None, None, [])),
+])
+def test_parse_label(label, expected):
+    assert parse_label(label) == expected
+
+def test_initial_state_enters_nested_initial(atm):
+    sm = atm.instance()
+    assert sm.configuration() == ["AttenteCarte"]
+    sm.dispatch("carteInsérée")
+    sm.dispatch("carteValide")
+    assert sm.configuration() == ["AttentePIN", "Saisie"]
+
+def test_counter_actions_and_completion_guard(atm):
+    sm = atm.instance()
+    for event in ("carteInsérée", "carteValide", "pinInvalide", "pinInvalide", "pinInvalide"):
+        assert sm.dispatch(event)
+    assert sm.context == {"tentatives": 3}
+    assert sm.state_name == "Saisie"
+    # [tentatives>3]: transition automatique dès le quatrième échec
+    assert sm.dispatch("pinInvalide")
+    assert sm.configuration() == ["AttentePIN", "RetenirCarte"]
+
+def test_full_withdrawal_reaches_the_final_state(atm):
+    sm = atm.instance()
+    events = ["carteInsérée", "carteValide", "pinValide", "afficherMenu", "choisirRetrait(montant)",
+              "aprèsDébit", "billetsRemis"]
+    for event in events:
+        assert sm.dispatch(event), event
+    assert sm.state_name == "FinSession"
+    assert sm.done
+
+def test_refused_event_keeps_the_state(atm):
+    sm = atm.instance()
+    assert not sm.dispatch("billetsRemis")
+    assert sm.state_name == "AttenteCarte"
+
+def test_custom_action_handlers(atm):
+    calls = []
+    sm = atm.instance(actions={"lirePiste": lambda ctx: calls.append("lire")})
+    sm.dispatch("carteInsérée")
+    assert calls == ["lire"]
+
+def test_replay_reports_the_first_divergence(atm, tmp_path):
+    trace = tmp_path / "traces.jsonl"
+    lines = [
+        {"session": 1, "event": "carteInsérée", "state": "LectureCarte"},
+        {"session": 1, "event": "carteInvalide"},
+        {"session": 2, "event": "carteInsérée"},
+        {"session": 2, "event": "carteValide", "state": "LectureCarte"},
+        {"session": 2, "event": "annuler"},
+    ]
+    trace.write_text("\n".join(json.dumps(line, ensure_ascii=False) for line in lines), encoding="utf-8")
+    result = replay_file(atm, trace)
+    assert (result.sessions, result.events) == (2, 4)
+    assert [(session, n) for session, n, _ in result.failures] == [(2, 1)]
+
+def test_replay_accepts_plain_event_names(atm):
+    result = replay(atm.instance(), ["carteInsérée", "carteInvalide"])
+    assert result.failures == []
+
+def test_timer_fires_on_the_loop():
+    model = parse_model(json.dumps({
+        "type": "state",
+        "states": [{"id": "init", "kind": "initial"}, {"id": "A"}, {"id": "B"}],
+        "transitions": [{"source": "init", "target": "A"}, {"source": "A", "target": "B", "event": "after(10ms)"}],
+    }))
+    machine = compile_machine(build_state(model))
+
+    async def run():
+        asm = AsyncStateMachine(machine)
+        assert asm.sm.state_name == "A"
+        await asyncio.sleep(0.05)
+        asm.stop()
+        return asm.sm.state_name
+
+    assert asyncio.run(run()) == "B"
+
+def test_completion_loop_is_detected():
+    model = parse_model(json.dumps({
+        "type": "state",
+        "states": [{"id": "init", "kind": "initial"}, {"id": "A"}, {"id": "B"}],
+        "transitions": [{"source": "init", "target": "A"}, {"source": "A", "target": "B", "event": "go"},
+                        {"source": "B", "target": "A", "guard": "toujours"}, {"source": "A", "target": "B", "guard": "toujours"}],
+    }))
+    sm = compile_machine(build_state(model)).instance()
+    sm.context["toujours"] = True
+    with pytest.raises(RuntimeError, match="boucle"):
+        sm.dispatch("go")
+    assert statemachine.MAX_STEPS > 1
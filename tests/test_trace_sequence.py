@@ -0,0 +1,65 @@
+import gzip
+import json
+
+import pytest
+
+from drawio_reader import read_drawio
+from trace_sequence import TraceError, TraceStats, build_file, collapse_loops, iter_messages, iter_records
+
+def _trace(path, polls=5):
+    records = [{"from": "Client", "to": "DAB", "message": "insérer carte", "ts": 1}]
+    for i in range(polls):
+        records.append({"from": "DAB", "to": "Banque", "message": "état ?", "ts": 2 + i})
+        records.append({"from": "Banque", "to": "DAB", "message": "en attente", "kind": "reply", "ts": 2 + i})
+    records.append({"from": "DAB", "to": "Client", "message": "carte rendue", "kind": "async", "ts": 50})
+    lines = [json.dumps(r, ensure_ascii=False) for r in records]
+    lines.insert(2, "{pas du json")
+    lines.insert(3, '{"to": "DAB"}')
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+def _labels(page):
+    t = page.cells
+    return [t.labels[r] for r in t.order if t.labels[r]]
+
+def test_repeated_polling_becomes_one_loop(tmp_path):
+    out = tmp_path / "trace.drawio"
+    stats = build_file(_trace(tmp_path / "trace.jsonl"), out)
+    assert (stats.read, stats.malformed, stats.messages) == (14, 2, 4)
+    assert (stats.loops, stats.collapsed, stats.pages) == (1, 8, 1)
+    [page] = read_drawio(out)
+    labels = _labels(page)
+    assert labels.count("état ?") == 1 and "loop [×5]" in labels
+    assert {"Client", "DAB", "Banque", "insérer carte", "carte rendue"} <= set(labels)
+
+def test_pages_and_time_window(tmp_path):
+    out = tmp_path / "trace.drawio"
+    stats = build_file(_trace(tmp_path / "trace.jsonl"), out, until=4, loops=False, page_rows=2)
+    assert (stats.outside, stats.messages, stats.pages) == (7, 5, 3)
+    pages = read_drawio(out)
+    assert [p.name for p in pages] == [f"0{i} - trace.jsonl {i}" for i in (1, 2, 3)]
+    assert "insérer carte" in _labels(pages[0])
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_gzipped_csv_and_session_sampling(tmp_path):
+    path = tmp_path / "trace.csv.gz"
+    rows = ["session,from,to,message"] + [f"s{i % 10},Client,DAB,m{i}" for i in range(200)]
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write("\n".join(rows) + "\n")
+    stats = TraceStats()
+    kept = list(iter_messages(iter_records(path, stats), stats, sample=0.5, sample_key="session"))
+    sessions = {int(m.label[1:]) % 10 for m in kept}
+    assert len(kept) == 20 * len(sessions) and 0 < len(sessions) < 10
+    assert stats.sampled_out == 200 - len(kept)
+
+def test_csv_without_participants_is_rejected(tmp_path):
+    path = tmp_path / "bad.csv"
+    path.write_text("a,b\n1,2\n", encoding="utf-8")
+    with pytest.raises(TraceError):
+        list(iter_records(path))
+
+def test_short_repetition_stays_plain():
+    stats = TraceStats()
+    records = [{"from": "A", "to": "B", "message": "x"}, {"from": "A", "to": "B", "message": "y"}]
+    items = list(collapse_loops(iter_messages(records, stats)))
+    assert [it[0] for it in items] == ["message", "message"]
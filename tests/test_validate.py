@@ -0,0 +1,60 @@
+import pytest
+
+from drawio_model import CompactDrawIOBuilder
+from styles import STYLES
+from validate import ERROR, WARNING, main, validate
+
+def _flow(bar_outs=2, guards=("[ok]", "[ko]"), extra=None):
+    d = CompactDrawIOBuilder()
+    page = d.add_page("Retrait")
+
+    def v(label, style):
+        return d.add_vertex(page, 0, 0, 40, 40, label, STYLES[style])
+
+    start, check = v("", "start"), v("", "decision")
+    bar, join, end = v("", "bar"), v("", "bar"), v("", "flow_final")
+    d.add_edge(page, start, check)
+    d.add_edge(page, check, bar, guards[0])
+    d.add_edge(page, check, end, guards[1])
+    for i in range(bar_outs):
+        a = v(f"Action {i}", "action")
+        d.add_edge(page, bar, a)
+        d.add_edge(page, a, join)
+    d.add_edge(page, join, end)
+    if extra:
+        extra(d, page, v)
+    return d
+
+def _codes(d):
+    return sorted((i.level, i.code) for i in validate(d))
+
+def test_valid_flow_has_no_issue():
+    assert validate(_flow()) == []
+
+def test_fork_and_join_arity():
+    assert _codes(_flow(bar_outs=1)) == [(ERROR, "arite-barre"), (ERROR, "arite-barre")]
+
+def test_decision_branches_need_guards():
+    issues = validate(_flow(guards=("[ok]", "")))
+    assert [(i.level, i.code) for i in issues] == [(ERROR, "garde-absente")]
+
+def test_references_and_reachability():
+    def extra(d, page, v):
+        lost = v("Perdu", "action")
+        d.add_edge(page, lost, "inexistant")
+        d.add_edge(page, v("", "start"), lost)
+    assert _codes(_flow(extra=extra)) == [(ERROR, "initial-multiple"), (ERROR, "reference-inconnue")]
+
+    def unreachable(d, page, v):
+        v("Isolée", "action")
+    assert _codes(_flow(extra=unreachable)) == [(WARNING, "inaccessible")]
+
+def test_duplicate_id_makes_the_file_unreadable(tmp_path, capsys):
+    path = tmp_path / "dup.drawio"
+    _flow().save(str(path))
+    text = path.read_text(encoding="utf-8").replace('id="4"', 'id="3"', 1)
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ValueError):
+        validate(path)
+    assert main([str(path)]) == 1
+    assert "illisible" in capsys.readouterr().out